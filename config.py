@@ -4,24 +4,122 @@
 Конфигурационный файл для Ozon Seller API Telegram Bot
 """
 
+import functools
+import logging
 import os
+import sys
+from types import MappingProxyType
 from typing import Optional
 
-class Config:
-    """Класс конфигурации бота"""
+# Переменные окружения и их значения по умолчанию
+_ENV_DEFAULTS = {
+    "BOT_TOKEN": "YOUR_BOT_TOKEN_HERE",
+    "ADMIN_CHAT_ID": "",
+    "OZON_API_KEY": "YOUR_OZON_API_KEY_HERE",
+    "OZON_CLIENT_ID": "YOUR_OZON_CLIENT_ID_HERE",
+    "WEBHOOK_URL": "",  # Пусто - long polling
+    "WEBHOOK_LISTEN": "0.0.0.0",
+    "WEBHOOK_PORT": "8443",
+    "WEBHOOK_SECRET": "",
+}
+
+# Проверки настроек: (атрибут, бит обязательной настройки, сообщение если не задана, сообщение если задана)
+# Бит 0 означает необязательную настройку: выводится только предупреждение
+_CHECKS = (
+    ("BOT_TOKEN", 1, "❌ Ошибка: BOT_TOKEN не настроен", None),
+    ("ADMIN_CHAT_ID", 0, "⚠️ Предупреждение: ADMIN_CHAT_ID не настроен, уведомления недоступны",
+     "✅ ADMIN_CHAT_ID настроен, уведомления доступны"),
+    ("OZON_API_KEY", 2, "❌ Ошибка: OZON_API_KEY не настроен", None),
+    ("OZON_CLIENT_ID", 4, "❌ Ошибка: OZON_CLIENT_ID не настроен", None),
+)
+
+def _write_lines(lines):
+    """Вывод строк в stdout одной записью"""
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+
+class _FrozenConfigMeta(type):
+    """Метакласс, запрещающий изменение настроек после загрузки модуля
+    
+    Настройки из окружения читаются лениво при первом обращении и запоминаются в классе.
+    """
+    
+    def __getattr__(cls, name):
+        if name not in _ENV_DEFAULTS:
+            raise AttributeError(f"type object {cls.__name__!r} has no attribute {name!r}")
+        value = os.environ.get(name, _ENV_DEFAULTS[name])
+        type.__setattr__(cls, name, value)
+        return value
     
-    # Telegram Bot настройки
-    BOT_TOKEN: str = os.environ.get("BOT_TOKEN", "YOUR_BOT_TOKEN_HERE")
-    ADMIN_CHAT_ID: str = os.getenv("ADMIN_CHAT_ID", "")
+    def __setattr__(cls, name, value):
+        raise AttributeError(f"Настройка {cls.__name__}.{name} доступна только для чтения")
     
-    # Ozon Seller API настройки
-    OZON_API_KEY: str = os.environ.get("OZON_API_KEY", "YOUR_OZON_API_KEY_HERE")
-    OZON_CLIENT_ID: str = os.environ.get("OZON_CLIENT_ID", "YOUR_OZON_CLIENT_ID_HERE")
+    def __delattr__(cls, name):
+        raise AttributeError(f"Настройка {cls.__name__}.{name} доступна только для чтения")
+
+class Config(metaclass=_FrozenConfigMeta):
+    """Класс конфигурации бота (неизменяемый)"""
+    
+    # Telegram Bot настройки (из окружения, см. _ENV_DEFAULTS)
+    BOT_TOKEN: str
+    ADMIN_CHAT_ID: str
+    BOT_NUM_THREADS: int = 4  # Потоков для обработки обновлений
+    TG_GLOBAL_RATE: float = 30  # Не больше сообщений в секунду на весь бот (лимит Telegram)
+    TG_CHAT_BURST: int = 20  # Сообщений в один чат подряд без паузы
+    TG_CHAT_RATE: float = 20 / 60  # Скорость восполнения лимита чата (сообщений в секунду)
+    TG_MAX_RETRIES: int = 3  # Повторы отправки после ответа 429 Too Many Requests
+    TG_POLL_TIMEOUT: int = 20  # Таймаут HTTP-запроса getUpdates в секундах
+    TG_LONG_POLL_TIMEOUT: int = 25  # Сколько Telegram держит getUpdates в ожидании обновлений (секунды)
+    
+    # Вебхук (из окружения, см. _ENV_DEFAULTS); если WEBHOOK_URL пуст, используется long polling
+    WEBHOOK_URL: str
+    WEBHOOK_LISTEN: str
+    WEBHOOK_PORT: str
+    WEBHOOK_SECRET: str
+    
+    # Ozon Seller API настройки (из окружения, см. _ENV_DEFAULTS)
+    OZON_API_KEY: str
+    OZON_CLIENT_ID: str
     OZON_BASE_URL: str = "https://api-seller.ozon.ru"
     
+    # Настройки HTTP-клиента Ozon API
+    HTTP_CONNECT_TIMEOUT: float = 5  # Таймаут соединения в секундах
+    HTTP_READ_TIMEOUT: float = 30  # Таймаут чтения ответа в секундах
+    HTTP_MAX_RETRIES: int = 5  # Повторы при сетевых ошибках и ответах 429/5xx
+    HTTP_BACKOFF_FACTOR: float = 0.5  # Экспоненциальная пауза между повторами (если нет Retry-After)
+    HTTP_POOL_MAXSIZE: int = 16  # Размер пула соединений
+    STOCKS_BATCH_WINDOW: float = 0.03  # Сколько ждать попутные запросы остатков FBS для одного пакета (секунды)
+    STOCKS_BATCH_SIZE: int = 100  # Максимум SKU в одном запросе остатков FBS
+    USE_ORJSON: bool = True  # Использовать orjson для JSON, если он установлен
+    
+    # Настройки кешей
+    LABEL_CACHE_SIZE: int = 32  # Сколько этикеток хранить в памяти
+    LABEL_CACHE_TTL: int = 600  # Время жизни этикетки в кеше в секундах
+    CATALOG_CACHE_TTL: int = 120  # Время жизни списка товаров в кеше в секундах
+    IMAGES_CACHE_TTL: int = 600  # Время жизни изображений товаров в кеше в секундах
+    PRODUCT_CACHE_SIZE: int = 5000  # Сколько карточек товаров (по SKU и product_id) хранить в памяти
+    PRODUCT_CACHE_TTL: int = 300  # Время жизни карточки товара в кеше в секундах
+    BARCODE_CACHE_SIZE: int = 256  # Сколько готовых PNG штрихкодов хранить в памяти
+    BARCODE_CACHE_TTL: int = 3600  # Время жизни PNG штрихкода в кеше в секундах
+    ORDER_STATE_CACHE_SIZE: int = 2048  # Сколько заказов с товарами хранить для экранов штрихкодов
+    ORDER_STATE_CACHE_TTL: int = 120  # Время жизни заказа с товарами в кеше в секундах
+    FILE_ID_CACHE_SIZE: int = 1024  # Сколько file_id отправленных штрихкодов хранить
+    FILE_ID_CACHE_TTL: int = 86400  # Время жизни file_id в кеше в секундах
+    OFFER_ID_CACHE_TTL: int = 300  # Сколько помнить offer_id товара из меню изменения остатка (секунды)
+    
+    # Рендер этикеток (PDF -> PNG) в отдельных процессах
+    LABEL_RENDER_WORKERS: int = min(os.cpu_count() or 2, 4)  # 0 - рендерить в потоке обработчика
+    LABEL_RENDER_TIMEOUT: float = 30  # Сколько ждать результат рендера в секундах
+    COMBINED_IMAGE_MAX_BYTES: int = 4 * 1024 * 1024  # Комбинированный файл больше этого размера уменьшается
+    COMBINED_IMAGE_MAX_SIDE: int = 2400  # До скольких пикселей по большей стороне уменьшать
+    BARCODE_PNG_COMPRESS_LEVEL: int = 1  # Уровень zlib для PNG штрихкодов (1 - быстрее всего, 9 - меньше всего)
+    LABEL_PNG_COMPRESS_LEVEL: int = 1  # Уровень zlib для PNG умной этикетки (комбинированный файл сжимается сильнее)
+    
     # Настройки мониторинга
     MONITORING_INTERVAL: int = 300  # Интервал проверки в секундах (5 минут)
     MAX_ORDERS_PER_REQUEST: int = 100  # Максимальное количество заказов за запрос
+    PROCESSED_ORDERS_MAX: int = 50000  # Сколько последних обработанных заказов помнить
     
     # Настройки логирования
     LOG_LEVEL: str = "DEBUG"
@@ -32,41 +130,38 @@ class Config:
     NOTIFICATION_BATCH_SIZE: int = 5  # Количество заказов в одном уведомлении
     
     @classmethod
+    @functools.lru_cache(maxsize=1)
     def validate(cls) -> bool:
-        """Проверка корректности конфигурации"""
-        if cls.BOT_TOKEN == "YOUR_BOT_TOKEN":
-            print("❌ Ошибка: BOT_TOKEN не настроен")
-            return False
-        
-        if cls.ADMIN_CHAT_ID == "YOUR_ADMIN_CHAT_ID":
-            print("⚠️ Предупреждение: ADMIN_CHAT_ID не настроен, уведомления недоступны")
-        else:
-            print("✅ ADMIN_CHAT_ID настроен, уведомления доступны")
+        """Проверка корректности конфигурации (настройки неизменяемы, результат кешируется)"""
+        missing = 0
+        lines = []
+        for attr, bit, missing_message, ok_message in _CHECKS:
+            value = getattr(cls, attr)
+            if not value or value == _ENV_DEFAULTS[attr]:
+                lines.append(missing_message)
+                missing |= bit
+            elif ok_message:
+                lines.append(ok_message)
         
-        if cls.OZON_API_KEY == "YOUR_OZON_API_KEY":
-            print("❌ Ошибка: OZON_API_KEY не настроен")
-            return False
-        
-        if cls.OZON_CLIENT_ID == "YOUR_OZON_CLIENT_ID":
-            print("❌ Ошибка: OZON_CLIENT_ID не настроен")
-            return False
-        
-        return True
+        _write_lines(lines)
+        return missing == 0
     
     @classmethod
     def print_config(cls):
         """Вывод текущей конфигурации"""
-        print("🔧 Конфигурация бота:")
-        print(f"  Bot Token: {cls.BOT_TOKEN[:10]}...")
-        print(f"  Admin Chat ID: {cls.ADMIN_CHAT_ID}")
-        print(f"  Ozon API Key: {cls.OZON_API_KEY[:10]}...")
-        print(f"  Ozon Client ID: {cls.OZON_CLIENT_ID}")
-        print(f"  Monitoring Interval: {cls.MONITORING_INTERVAL}s")
-        print(f"  Max Orders Per Request: {cls.MAX_ORDERS_PER_REQUEST}")
-        print(f"  Notifications Enabled: {cls.ENABLE_NOTIFICATIONS}")
+        _write_lines([
+            "🔧 Конфигурация бота:",
+            f"  Bot Token: {cls.BOT_TOKEN[:10]}...",
+            f"  Admin Chat ID: {cls.ADMIN_CHAT_ID}",
+            f"  Ozon API Key: {cls.OZON_API_KEY[:10]}...",
+            f"  Ozon Client ID: {cls.OZON_CLIENT_ID}",
+            f"  Monitoring Interval: {cls.MONITORING_INTERVAL}s",
+            f"  Max Orders Per Request: {cls.MAX_ORDERS_PER_REQUEST}",
+            f"  Notifications Enabled: {cls.ENABLE_NOTIFICATIONS}",
+        ])
 
-# Статусы заказов FBS
-FBS_STATUSES = {
+# Статусы заказов FBS (только для чтения)
+FBS_STATUSES = MappingProxyType({
     "awaiting_registration": "Ожидает регистрации",
     "acceptance_in_progress": "Идёт приёмка", 
     "awaiting_approve": "Ожидает подтверждения",
@@ -78,10 +173,10 @@ FBS_STATUSES = {
     "driver_pickup": "У водителя",
     "cancelled": "Отменено",
     "not_accepted": "Не принят на СЦ"
-}
+})
 
-# Эмодзи для интерфейса
-EMOJIS = {
+# Эмодзи для интерфейса (только для чтения)
+EMOJIS = MappingProxyType({
     "bot": "🤖",
     "orders": "📦",
     "all_orders": "📋",
@@ -98,4 +193,43 @@ EMOJIS = {
     "summary": "📈",
     "start": "▶️",
     "stop": "⏹️"
+})
+
+# Эндпоинты Ozon Seller API, используемые ботом
+_OZON_ENDPOINTS = {
+    "fbs_list": "/v3/posting/fbs/list",
+    "fbs_get": "/v3/posting/fbs/get",
+    "fbs_ship": "/v4/posting/fbs/ship",
+    "package_label": "/v2/posting/fbs/package-label",
+    "fbs_barcode": "/v2/posting/fbs/barcode",
+    "product_pictures": "/v2/product/pictures/info",
+    "product_list": "/v3/product/list",
+    "product_info_list": "/v3/product/info/list",
+    "product_barcode": "/v2/product/barcode",
+    "products_stocks": "/v2/products/stocks",
+    "fbs_stocks": "/v1/product/info/stocks-by-warehouse/fbs",
 }
+
+# Полные URL эндпоинтов, собранные один раз при импорте
+OZON_URLS = MappingProxyType({
+    name: Config.OZON_BASE_URL + path for name, path in _OZON_ENDPOINTS.items()
+})
+
+def __getattr__(name):
+    """Ленивый доступ к настройкам окружения на уровне модуля (config.BOT_TOKEN и т.п.)"""
+    if name in _ENV_DEFAULTS:
+        value = getattr(Config, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Форматтер логов, общий для всех обработчиков
+LOG_FORMATTER = logging.Formatter(Config.LOG_FORMAT)
+
+# Шаблоны уведомлений (собираются один раз при импорте)
+NOTIFICATION_TEMPLATES = MappingProxyType({
+    "new_orders_header": EMOJIS["notifications"] + " <b>Новые заказы на сборку ({count})</b>\n\n",
+    "new_order_item": EMOJIS["orders"] + " <b>{posting_number}</b>\nДата отгрузки: {shipment_date}\n\n",
+    "more_orders": "... и еще {count} заказов\n\n",
+    "new_orders_footer": "Используйте /orders для просмотра всех заказов",
+})
@@ -5,26 +5,510 @@ Ozon Seller API Telegram Bot на pyTelegramBotAPI (telebot)
 Улучшенный бот для управления заказами FBS с детальной информацией и фото товаров
 """
 
+import functools
+import html
 import logging
 import threading
 import time
 import json
 import os
+import queue
+import re
+import multiprocessing
+import operator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from collections import OrderedDict, defaultdict
+from types import MappingProxyType
+from itertools import islice
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 import requests
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from urllib3.util.retry import Retry
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
 import telebot
 from telebot import types
+from io import BytesIO
 import fitz  # PyMuPDF
-from config import Config, FBS_STATUSES, EMOJIS
+try:
+    import orjson
+except ImportError:  # orjson необязателен, используется стандартный json
+    orjson = None
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # без PIL изображения не генерируются, бот работает текстом
+    Image = ImageDraw = ImageFont = None
+try:
+    from barcode import Code128
+    from barcode.writer import ImageWriter
+except ImportError:  # без python-barcode изображения штрихкодов не генерируются
+    Code128 = ImageWriter = None
+from config import Config, FBS_STATUSES, EMOJIS, LOG_FORMATTER, NOTIFICATION_TEMPLATES, OZON_URLS
 
 # Настройка логирования
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(LOG_FORMATTER)
 logging.basicConfig(
-    format=Config.LOG_FORMAT,
-    level=getattr(logging, Config.LOG_LEVEL)
+    level=getattr(logging, Config.LOG_LEVEL),
+    handlers=[_log_handler]
 )
 logger = logging.getLogger(__name__)
 
+def _std_json_dumps(obj: Any) -> bytes:
+    """Сериализация тела запроса стандартным json (запасной вариант без orjson)"""
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+# Кодек JSON для API: orjson работает с bytes напрямую, json.loads тоже принимает bytes
+if orjson is not None and Config.USE_ORJSON:
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+else:
+    _json_loads = json.loads
+    _json_dumps = _std_json_dumps
+
+# Формат времени в фильтрах API и глубина выборки заказов
+_API_TIME_FORMAT = "%Y-%m-%dT%H:%M:00Z"
+_ORDERS_WINDOW_SECONDS = 30 * 86400
+
+# Общий пул потоков для независимых запросов к API (requests.Session потокобезопасна для post)
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ozon-api")
+
+# Пул процессов для рендера этикеток создаётся при первой этикетке
+_render_pool: Optional[ProcessPoolExecutor] = None
+_render_pool_lock = threading.Lock()
+
+def _get_render_pool() -> Optional[ProcessPoolExecutor]:
+    """Пул процессов рендера; forkserver не копирует потоки и блокировки бота в дочерние процессы"""
+    global _render_pool
+    if Config.LABEL_RENDER_WORKERS <= 0:
+        return None
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(
+                max_workers=Config.LABEL_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        return _render_pool
+
+# Ширина штрихкода в комбинированном изображении (по ширине этикетки)
+_COMBINED_BARCODE_MAX_WIDTH = 1202
+
+# Настройки штрихкода для отдельного изображения - большой штрихкод как на этикетке
+_BARCODE_OPTIONS = (
+    ('module_width', 0.8),  # Значительно увеличиваем для размера как на этикетке
+    ('module_height', 40.0),  # Увеличиваем высоту в 2 раза
+    ('quiet_zone', 6.0),  # Большие тихие зоны
+    ('font_size', 0),  # Убираем встроенный текст, будем добавлять свой
+    ('text_distance', 0),  # Убираем расстояние до текста
+    ('background', 'white'),
+    ('foreground', 'black'),
+    ('write_text', False),  # Не показываем встроенный текст
+)
+
+# Настройки для качественного штрихкода комбинированного изображения с хорошей контрастностью
+_COMBINED_BARCODE_OPTIONS = (
+    ('module_width', 1.0),  # Увеличенный размер модуля для лучшей читаемости
+    ('module_height', 50.0),  # Увеличенная высота штрихкода
+    ('quiet_zone', 4.0),  # Нормальные тихие зоны для контрастности
+    ('font_size', 0),  # Убираем встроенный текст, будем добавлять свой
+    ('text_distance', 0),  # Убираем расстояние до текста
+    ('background', 'white'),
+    ('foreground', 'black'),
+    ('write_text', False),  # Не показываем встроенный текст
+)
+
+@functools.lru_cache(maxsize=256)
+def _render_code128(barcode: str, options: tuple):
+    """
+    Изображение штрихкода Code128 с настройками writer (кортеж пар); кешируется по значению и настройкам
+    Результат общий для всех вызовов: его только читают (paste, resize), не изменяют
+    Штрихкод черно-белый, поэтому хранится в оттенках серого ('L'): байт на пиксель вместо трех
+    """
+    return Code128(barcode, writer=ImageWriter()).render(writer_options=dict(options)).convert('L')
+
+@functools.lru_cache(maxsize=256)
+def _combined_barcode_strip(barcode: str):
+    """
+    Полоса штрихов Code128 для комбинированного изображения (без текста, не шире 1202 пикселей)
+    Кешируется по значению штрихкода; изображение только читается (paste), не изменяется
+    """
+    # Создаем штрихкод Code128 с автоподгонкой под ширину 1202 пикселя
+    barcode_img = _render_code128(barcode, _COMBINED_BARCODE_OPTIONS)
+    width, height = barcode_img.size
+    
+    # Если штрихкод все еще слишком широкий, масштабируем его с сохранением качества
+    if width > _COMBINED_BARCODE_MAX_WIDTH:
+        new_height = int(height * _COMBINED_BARCODE_MAX_WIDTH / width)
+        # Билинейное масштабирование заметно быстрее LANCZOS и сохраняет контраст штрихов при уменьшении
+        barcode_img = barcode_img.resize((_COMBINED_BARCODE_MAX_WIDTH, new_height), Image.Resampling.BILINEAR)
+    return barcode_img
+
+@functools.lru_cache(maxsize=128)
+def _char_widths(font) -> Dict[str, float]:
+    """Таблица ширин символов шрифта (заполняется по мере встречи символов)"""
+    return {}
+
+def _text_width(font, text: str) -> float:
+    """Ширина текста как сумма ширин символов: один вызов getlength на символ за всё время жизни шрифта"""
+    widths = _char_widths(font)
+    total = 0.0
+    for char in text:
+        width = widths.get(char)
+        if width is None:
+            width = widths[char] = font.getlength(char)
+        total += width
+    return total
+
+def _wrap_text_lines(text: str, font, limit: float, truncate: bool = True,
+                     max_lines: Optional[int] = None) -> List[str]:
+    """
+    Перенос текста по словам в ширину limit
+    Ширины считаются по таблице символов шрифта (_text_width), ширина строки - сумма слов и пробелов
+    Слишком длинное первое слово строки обрезается с "..." (truncate) или занимает строку целиком
+    Перенос прекращается, как только строк больше max_lines (такой вариант всё равно не подойдёт)
+    """
+    words = text.split()
+    if not words:
+        return []
+    
+    # Частый случай: весь текст помещается в одну строку - обходимся одним измерением
+    single_line = " ".join(words)
+    if _text_width(font, single_line) <= limit:
+        return [single_line]
+    
+    space_width = _text_width(font, " ")
+    lines = []
+    current = []
+    current_width = 0.0
+    
+    for word in words:
+        word_width = _text_width(font, word)
+        test_width = current_width + space_width + word_width if current else word_width
+        
+        if test_width <= limit:
+            current.append(word)
+            current_width = test_width
+            continue
+        
+        if current:
+            lines.append(" ".join(current))
+            current = [word]
+            current_width = word_width
+        elif truncate:
+            # Самый длинный префикс слова (не короче 3 символов), который помещается вместе с "..."
+            lo, hi = min(3, len(word)), len(word)
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if _text_width(font, word[:mid] + "...") <= limit:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            lines.append(word[:lo] + "...")
+        else:
+            lines.append(word)
+        
+        if max_lines is not None and len(lines) > max_lines:
+            return lines
+    
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+def _fit_text_lines(text: str, font_family: str, font_sizes: List[int], limit: float,
+                    max_height: float, truncate: bool = True, max_lines: int = 3):
+    """
+    Самый крупный размер из font_sizes (по убыванию), при котором текст помещается в max_lines строк и max_height
+    Чем крупнее шрифт, тем больше строк и высота, поэтому размер ищется бинарным поиском
+    Возвращает (размер, шрифт, строки) или None, если не подошёл ни один размер
+    """
+    best = None
+    lo, hi = 0, len(font_sizes) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        font_size = font_sizes[mid]
+        font = _get_font(font_family, font_size)
+        lines = _wrap_text_lines(text, font, limit, truncate=truncate, max_lines=max_lines)
+        if len(lines) <= max_lines and len(lines) * font_size <= max_height:
+            best = (font_size, font, lines)
+            hi = mid - 1
+        else:
+            lo = mid + 1
+    return best
+
+def _draw_text_with_smart_fit(draw, text: str, x: int, y: int, max_width: int, max_height: int,
+                              font_sizes: Tuple[int, ...], margin: int = 0, truncate: bool = True,
+                              max_lines: int = 3, fallback_size: int = 18, fallback_margin: int = 0,
+                              fallback_truncate: bool = False, fallback_lines: int = 2,
+                              font_family: str = "arial", color='black') -> bool:
+    """
+    Нарисовать текст по центру блока самым крупным подходящим шрифтом из font_sizes
+    Ширина строк ограничена max_width - margin; если не подошёл ни один размер,
+    рисуем шрифтом fallback_size не больше fallback_lines строк
+    """
+    # Самый крупный размер, при котором текст помещается в max_lines строк по высоте
+    fitted = _fit_text_lines(text, font_family, font_sizes, max_width - margin, max_height,
+                             truncate=truncate, max_lines=max_lines)
+    
+    # Если помещается - рисуем СРАЗУ
+    if fitted is not None:
+        font_size, font, lines = fitted
+    else:
+        # Если ничего не подошло - рисуем запасным шрифтом
+        font_size = fallback_size
+        font = _get_font(font_family, font_size)
+        lines = _wrap_text_lines(text, font, max_width - fallback_margin, truncate=fallback_truncate)[:fallback_lines]
+    
+    for i, line in enumerate(lines):
+        line_width = _text_width(font, line)
+        # Центрируем БЕЗ отступов
+        line_x = x + (max_width - line_width) // 2
+        line_y = y + i * font_size  # БЕЗ отступов!
+        draw.text((line_x, line_y), line, fill=color, font=font)
+    return True
+
+# Подгонка текста под ОГРОМНЫЙ штрихкод комбинированного изображения (запас 20 пикселей по ширине)
+_draw_combined_barcode_text = functools.partial(
+    _draw_text_with_smart_fit, font_sizes=(35, 30, 25, 20, 18, 16, 14, 12, 10), margin=20, fallback_size=16
+)
+
+# Подгонка текста под отдельный штрихкод (вся ширина, слова не обрезаются)
+_draw_barcode_text = functools.partial(
+    _draw_text_with_smart_fit, font_sizes=(40, 35, 30, 25, 20, 18, 16, 14, 12, 10), truncate=False, fallback_size=18
+)
+
+# Подгонка названия товара и номера заказа под умную этикетку (до 4 строк, запас 20 пикселей)
+_draw_label_text = functools.partial(
+    _draw_text_with_smart_fit, font_sizes=(50, 45, 40, 35, 30, 25, 20, 18, 16, 14, 12), margin=20,
+    max_lines=4, fallback_size=20, fallback_margin=10, fallback_truncate=True, fallback_lines=3
+)
+
+# Запасной шрифт, если запрошенного нет в системе
+_FALLBACK_FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+@functools.lru_cache(maxsize=16)
+def _font_path(family: str) -> Optional[str]:
+    """
+    Какой шрифт реально загружается для family: сам family, DejaVuSans или None (встроенный)
+    Определяется один раз на семейство, а не на каждый размер
+    """
+    for path in (family, _FALLBACK_FONT_PATH):
+        try:
+            ImageFont.truetype(path, 10)
+        except OSError:
+            continue
+        return path
+    return None
+
+@functools.lru_cache(maxsize=128)
+def _get_font(family: str, size: int):
+    """Шрифт нужного размера (TTF разбирается один раз): family, затем DejaVuSans, затем встроенный"""
+    path = _font_path(family)
+    if path is None:
+        return ImageFont.load_default()
+    return ImageFont.truetype(path, size)
+
+# Переиспользуемые холсты по размеру: свои в каждом потоке (и процессе пула), чтобы обойтись без блокировок
+_canvas_local = threading.local()
+_CANVAS_POOL_SIZE = 8
+
+def _blank_canvas(width: int, height: int):
+    """
+    Белый холст в оттенках серого ('L') заданного размера из пула текущего потока вместо нового Image.new
+    Холст принадлежит вызывающему только до следующего вызова в этом потоке: наружу его не отдаём
+    """
+    pool = getattr(_canvas_local, 'pool', None)
+    if pool is None:
+        pool = _canvas_local.pool = {}
+    key = (width, height)
+    canvas = pool.get(key)
+    if canvas is None:
+        if len(pool) >= _CANVAS_POOL_SIZE:
+            pool.clear()
+        canvas = pool[key] = Image.new('L', key, 255)
+    else:
+        canvas.paste(255, (0, 0, width, height))
+    return canvas
+
+@functools.lru_cache(maxsize=1)
+def _window_strings(minute_bucket: int) -> Tuple[str, str]:
+    """
+    Границы фильтра заказов за последние 30 дней (UTC) для заданной минуты
+    Пересчитываются не чаще раза в минуту; верхняя граница округляется вверх
+    """
+    to_ts = (minute_bucket + 1) * 60
+    return (
+        time.strftime(_API_TIME_FORMAT, time.gmtime(to_ts - _ORDERS_WINDOW_SECONDS)),
+        time.strftime(_API_TIME_FORMAT, time.gmtime(to_ts)),
+    )
+
+# Остаток на складе из элемента stocks карточки товара
+_GET_PRESENT = operator.itemgetter('present')
+
+# Популярные значения остатка в меню изменения остатка
+_STOCK_PRESETS = (0, 1, 5, 10, 20, 50, 100)
+
+# Таблица для Image.point: пиксели темнее 250 считаются содержимым при умной обрезке
+_CONTENT_MASK_LUT = [255] * 250 + [0] * 6
+
+# Очистка названий товаров от эмодзи и спецсимволов (для штрихкода дефис сохраняется)
+_CLEAN_NAME_RE = re.compile(r'[^\w\s]')
+_CLEAN_NAME_DASH_RE = re.compile(r'[^\w\s\-]')
+
+# Цвета, которые стараемся сохранить в сокращенном названии товара
+_COLOR_WORDS = frozenset(['красный', 'синий', 'голубой', 'зеленый', 'желтый', 'оранжевый',
+                          'фиолетовый', 'розовый', 'фуксия', 'коричневый', 'черный', 'белый',
+                          'серый', 'золотой', 'серебряный', 'радужный', 'разноцветный'])
+
+def _trunc(text: str, limit: int, keep: Optional[int] = None, tail: str = "…") -> str:
+    """
+    Обрезать строку длиннее limit до keep (по умолчанию limit) символов с многоточием
+    Один символ "…" вместо "..." оставляет больше места под текст кнопки
+    """
+    if len(text) <= limit:
+        return text
+    return text[:limit if keep is None else keep] + tail
+
+def _response_excerpt(response, limit: int = 512) -> str:
+    """Начало тела ответа для логов (без определения кодировки всего тела)"""
+    if response is None:
+        return "No response"
+    return response.content[:limit].decode("utf-8", "replace")
+
+class TTLCache:
+    """Потокобезопасный LRU-кеш с ограничением размера и временем жизни записей"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        """Получить значение, если оно есть и не устарело"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        """Сохранить значение, вытесняя самые старые записи"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def pop(self, key):
+        """Удалить значение из кеша и вернуть его (None, если не было)"""
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[1] if item is not None else None
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+class MicroBatcher:
+    """
+    Объединяет запросы по отдельным ключам из разных потоков в один пакетный вызов
+    fn(keys) -> {key: value}; пакет уходит через window секунд после первого ключа или при max_batch ключах
+    """
+    
+    def __init__(self, fn, window: float, max_batch: int):
+        self._fn = fn
+        self._window = window
+        self._max_batch = max_batch
+        self._pending: Dict[Any, Future] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+    
+    def submit(self, key) -> Future:
+        """Поставить ключ в ближайший пакет (повторный ключ получает тот же Future)"""
+        flush_now = False
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = Future()
+                if len(self._pending) >= self._max_batch:
+                    flush_now = True
+                elif self._timer is None:
+                    self._timer = threading.Timer(self._window, self._flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if flush_now:
+            self._flush()
+        return future
+    
+    def _flush(self):
+        """Выполнить накопленный пакет и раздать результаты"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not batch:
+            return
+        try:
+            results = self._fn(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+            return
+        for key, future in batch.items():
+            future.set_result(results.get(key))
+
+class _TokenBucket:
+    """Потокобезопасный «бакет токенов»: rate токенов в секунду, не больше capacity подряд"""
+    
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+    
+    def delay(self, now: float) -> float:
+        """Сколько ждать до следующего токена (0 - токен есть)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+class TelegramRateLimiter:
+    """Лимиты Telegram на отправку: общий на бот и отдельный на каждый чат"""
+    
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: int):
+        self._global = _TokenBucket(global_rate, global_rate)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._chats: Dict[Any, _TokenBucket] = {}
+        self._lock = threading.Lock()
+    
+    def acquire(self, chat_id=None):
+        """Дождаться права отправить одно сообщение в chat_id"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                buckets = [self._global]
+                if chat_id is not None:
+                    bucket = self._chats.get(chat_id)
+                    if bucket is None:
+                        bucket = self._chats[chat_id] = _TokenBucket(self._chat_rate, self._chat_burst)
+                    buckets.append(bucket)
+                wait = max(b.delay(now) for b in buckets)
+                if not wait:
+                    for b in buckets:
+                        b.tokens -= 1
+                    return
+            time.sleep(wait)
+
 class OzonAPI:
     """Класс для работы с Ozon Seller API"""
     
@@ -37,138 +521,226 @@ class OzonAPI:
             "Api-Key": self.api_key,
             "Content-Type": "application/json"
         }
+        self.timeout = (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT)
+        
+        # Общая сессия: keep-alive и пул соединений вместо нового TLS-рукопожатия на каждый запрос
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        retry = Retry(
+            total=Config.HTTP_MAX_RETRIES,
+            backoff_factor=Config.HTTP_BACKOFF_FACTOR,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["POST"],
+            # При 429 Ozon сообщает, сколько ждать - ждём ровно столько, а не по своей схеме
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=Config.HTTP_POOL_MAXSIZE, max_retries=retry)
+        self.session.mount("https://", adapter)
+        
+        # Кеш этикеток: этикетка собранного отправления не меняется
+        self._label_cache = TTLCache(Config.LABEL_CACHE_SIZE, Config.LABEL_CACHE_TTL)
+        # Каталог и изображения меняются редко: короткий TTL снимает повторные запросы при пагинации
+        self._catalog_cache = TTLCache(64, Config.CATALOG_CACHE_TTL)
+        self._images_cache = TTLCache(64, Config.IMAGES_CACHE_TTL)
+        # Карточки товаров: ключи ("sku", id) и ("product_id", id) указывают на одну карточку
+        self._product_info_cache = TTLCache(Config.PRODUCT_CACHE_SIZE, Config.PRODUCT_CACHE_TTL)
+        # Одновременные запросы остатков FBS по одному SKU уходят одним запросом
+        self._fbs_stock_batcher = MicroBatcher(
+            self._fbs_stocks_by_sku, Config.STOCKS_BATCH_WINDOW, Config.STOCKS_BATCH_SIZE
+        )
+        
+        # Общий блок "with" для запросов заказов (только сериализуется, не изменяется)
+        self._default_with = {
+            "analytics_data": True,
+            "barcodes": True,
+            "financial_data": True,
+            "translit": True
+        }
     
-    def get_orders_for_packaging(self, limit: int = 100) -> Dict[str, Any]:
+    def _post(self, endpoint: str, payload: Dict[str, Any], error_message: str) -> Dict[str, Any]:
         """
-        Получить заказы готовые к сборке (awaiting_packaging)
-        POST /v3/posting/fbs/list
+        Выполнить POST-запрос к API и вернуть разобранный JSON
+        При ошибке возвращает {"error": ...}
         """
-        url = f"{self.base_url}/v3/posting/fbs/list"
-        
-        # Фильтр по времени (последние 30 дней)
-        cutoff_to = datetime.now()
-        cutoff_from = cutoff_to - timedelta(days=30)
-        
-        payload = {
-            "dir": "ASC",
-            "filter": {
-                "since": cutoff_from.isoformat() + "Z",
-                "to": cutoff_to.isoformat() + "Z",
-                "status": "awaiting_packaging"
-            },
-            "limit": limit,
-            "offset": 0,
-            "with": {
-                "analytics_data": True,
-                "barcodes": True,
-                "financial_data": True,
-                "translit": True
-            }
-        }
+        url = OZON_URLS[endpoint]
+        response = None
         
         try:
-            logger.debug(f"Отправка запроса на {url} с payload: {payload}")
-            response = requests.post(url, headers=self.headers, json=payload)
-            logger.debug(f"Ответ API: {response.status_code}")
+            logger.debug("Отправка запроса на %s с payload: %s", url, payload)
+            response = self.session.post(url, data=_json_dumps(payload), timeout=self.timeout)
+            logger.debug("Ответ API %s: %s", url, response.status_code)
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при получении заказов на сборку: {e}")
-            logger.error(f"URL: {url}")
-            logger.error(f"Payload: {payload}")
-            logger.error(f"Response: {response.text if 'response' in locals() else 'No response'}")
+            return _json_loads(response.content)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error("%s: %s", error_message, e)
+            logger.error("URL: %s", url)
+            logger.error("Payload: %s", payload)
+            logger.error("Response: %s", _response_excerpt(response))
             return {"error": str(e)}
     
-    def get_orders_awaiting_deliver(self, limit: int = 100) -> Dict[str, Any]:
+    def _post_file(self, endpoint: str, payload: Dict[str, Any], error_message: str,
+                   file_type: str, file_name: str) -> Dict[str, Any]:
         """
-        Получить заказы готовые к отгрузке (awaiting_deliver)
-        POST /v3/posting/fbs/list
+        Выполнить POST-запрос к API, который возвращает файл (PDF, изображение) или JSON
+        Тело файла читается потоком одним буфером, без промежуточного списка чанков
         """
-        url = f"{self.base_url}/v3/posting/fbs/list"
-        
-        cutoff_to = datetime.now()
-        cutoff_from = cutoff_to - timedelta(days=30)
+        url = OZON_URLS[endpoint]
+        response = None
         
+        try:
+            logger.debug("Отправка запроса на %s с payload: %s", url, payload)
+            response = self.session.post(url, data=_json_dumps(payload), timeout=self.timeout, stream=True)
+            logger.debug("Ответ API %s: %s", url, response.status_code)
+            
+            if response.status_code == 200:
+                # Проверяем content-type
+                content_type = response.headers.get('content-type', '')
+                if file_type in content_type:
+                    return {
+                        "file_content": response.raw.read(decode_content=True),
+                        "file_name": file_name,
+                        "content_type": content_type
+                    }
+                elif 'application/json' in content_type:
+                    # Это JSON ответ
+                    return _json_loads(response.content)
+                else:
+                    logger.error("Неожиданный content-type: %s", content_type)
+                    return {"error": f"Неожиданный content-type: {content_type}"}
+            else:
+                response.raise_for_status()
+                
+        except (requests.exceptions.RequestException, Urllib3HTTPError, ValueError) as e:
+            logger.error("%s: %s", error_message, e)
+            logger.error("URL: %s", url)
+            logger.error("Payload: %s", payload)
+            logger.error("Response: %s", _response_excerpt(response))
+            return {"error": str(e)}
+        finally:
+            # При stream=True соединение возвращается в пул только после закрытия ответа
+            if response is not None:
+                response.close()
+    
+    def _list_postings(self, status: str, limit: int, error_message: str) -> Dict[str, Any]:
+        """
+        Получить заказы FBS с заданным статусом за последние 30 дней
+        POST /v3/posting/fbs/list
+        """
+        since, to = _window_strings(int(time.time() // 60))
         payload = {
             "dir": "ASC",
             "filter": {
-                "since": cutoff_from.isoformat() + "Z",
-                "to": cutoff_to.isoformat() + "Z",
-                "status": "awaiting_deliver"
+                "since": since,
+                "to": to,
+                "status": status
             },
             "limit": limit,
             "offset": 0,
-            "with": {
-                "analytics_data": True,
-                "barcodes": True,
-                "financial_data": True,
-                "translit": True
-            }
+            "with": self._default_with
         }
-        
-        try:
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при получении заказов к отгрузке: {e}")
-            return {"error": str(e)}
+        return self._post("fbs_list", payload, error_message)
+    
+    def get_orders_for_packaging(self, limit: int = 100) -> Dict[str, Any]:
+        """
+        Получить заказы готовые к сборке (awaiting_packaging)
+        POST /v3/posting/fbs/list
+        """
+        return self._list_postings("awaiting_packaging", limit, "Ошибка при получении заказов на сборку")
+    
+    def get_orders_awaiting_deliver(self, limit: int = 100) -> Dict[str, Any]:
+        """
+        Получить заказы готовые к отгрузке (awaiting_deliver)
+        POST /v3/posting/fbs/list
+        """
+        return self._list_postings("awaiting_deliver", limit, "Ошибка при получении заказов к отгрузке")
     
     def get_order_details(self, posting_number: str) -> Dict[str, Any]:
         """
         Получить детальную информацию о заказе
         POST /v3/posting/fbs/get
         """
-        url = f"{self.base_url}/v3/posting/fbs/get"
         payload = {
             "posting_number": posting_number,
-            "with": {
-                "analytics_data": True,
-                "barcodes": True,
-                "financial_data": True,
-                "translit": True
-            }
+            "with": self._default_with
         }
-        
-        try:
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при получении деталей заказа: {e}")
-            return {"error": str(e)}
+        return self._post("fbs_get", payload, "Ошибка при получении деталей заказа")
     
     def get_product_images(self, product_ids: List[str]) -> Dict[str, Any]:
         """
         Получить изображения товаров
         POST /v2/product/pictures/info
         """
-        url = f"{self.base_url}/v2/product/pictures/info"
+        cache_key = tuple(sorted(product_ids))
+        cached = self._images_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         payload = {
             "product_id": product_ids
         }
+        result = self._post("product_pictures", payload, "Ошибка при получении изображений товаров")
+        if "error" not in result:
+            self._images_cache.set(cache_key, result)
+        return result
+    
+    def get_product_info_list(self, sku: Optional[List] = None,
+                              product_id: Optional[List] = None) -> Dict[str, Any]:
+        """
+        Получить карточки товаров по SKU или по product_id (с кешем)
+        POST /v3/product/info/list
+        Запрашиваются только отсутствующие в кеше id, не более 1000 за запрос
+        Возвращает {"items": [...]} в порядке запроса или {"error": ...}, если ничего не получено
+        """
+        field, ids = ("sku", sku) if sku is not None else ("product_id", product_id or [])
+        # В ответе product_id приходит в поле "id"
+        item_field = "sku" if field == "sku" else "id"
+        
+        requested = [item_id for item_id in dict.fromkeys(str(i) for i in ids) if item_id]
+        found = {}
+        missing = []
+        for item_id in requested:
+            cached = self._product_info_cache.get((field, item_id))
+            if cached is not None:
+                found[item_id] = cached
+            else:
+                missing.append(item_id)
         
-        try:
-            logger.debug(f"Отправка запроса на получение изображений: {url} с payload: {payload}")
-            response = requests.post(url, headers=self.headers, json=payload)
-            logger.debug(f"Ответ API изображений: {response.status_code}")
-            response.raise_for_status()
-            result = response.json()
-            logger.debug(f"Результат изображений: {result}")
-            return result
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при получении изображений товаров: {e}")
-            logger.error(f"URL: {url}")
-            logger.error(f"Payload: {payload}")
-            logger.error(f"Response: {response.text if 'response' in locals() else 'No response'}")
-            return {"error": str(e)}
+        error = None
+        for start in range(0, len(missing), 1000):
+            result = self._post(
+                "product_info_list", {field: missing[start:start + 1000]},
+                "Ошибка при получении информации о товарах"
+            )
+            if "error" in result:
+                error = result
+                continue
+            for item in result.get("items", []):
+                self._remember_product_info(item)
+                found[str(item.get(item_field, ''))] = item
+        
+        if error is not None and not found:
+            return error
+        return {"items": [found[item_id] for item_id in requested if item_id in found]}
+    
+    def _remember_product_info(self, item: Dict[str, Any]):
+        """Положить карточку в кеш под её SKU и product_id"""
+        if item.get("sku"):
+            self._product_info_cache.set(("sku", str(item["sku"])), item)
+        if item.get("id"):
+            self._product_info_cache.set(("product_id", str(item["id"])), item)
+    
+    def invalidate_product_info(self, product_id: str):
+        """Сбросить кеш карточки товара (после изменения остатка)"""
+        item = self._product_info_cache.pop(("product_id", str(product_id)))
+        if item and item.get("sku"):
+            self._product_info_cache.pop(("sku", str(item["sku"])))
     
     def ship_order(self, posting_number: str, packages: List[Dict]) -> Dict[str, Any]:
         """
         Собрать заказ
         POST /v4/posting/fbs/ship
         """
-        url = f"{self.base_url}/v4/posting/fbs/ship"
         payload = {
             "posting_number": posting_number,
             "packages": packages,
@@ -176,103 +748,48 @@ class OzonAPI:
                 "additional_data": True
             }
         }
-        
-        try:
-            response = requests.post(url, headers=self.headers, json=payload)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при сборке заказа: {e}")
-            return {"error": str(e)}
+        return self._post("fbs_ship", payload, "Ошибка при сборке заказа")
     
     def get_package_label(self, posting_numbers: List[str]) -> Dict[str, Any]:
         """
         Получить этикетки для печати
         POST /v2/posting/fbs/package-label
+        Успешно полученные PDF кешируются по набору номеров отправлений
         """
-        url = f"{self.base_url}/v2/posting/fbs/package-label"
+        cache_key = tuple(sorted(posting_numbers))
+        cached = self._label_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         payload = {
             "posting_number": posting_numbers
         }
-        
-        try:
-            logger.debug(f"Отправка запроса на получение этикеток: {url} с payload: {payload}")
-            response = requests.post(url, headers=self.headers, json=payload)
-            logger.debug(f"Ответ API для этикеток: {response.status_code}")
-            
-            if response.status_code == 200:
-                # Проверяем content-type
-                content_type = response.headers.get('content-type', '')
-                if 'application/pdf' in content_type:
-                    # Это PDF файл
-                    return {
-                        "file_content": response.content,
-                        "file_name": f"label_{'-'.join(posting_numbers)}.pdf",
-                        "content_type": "application/pdf"
-                    }
-                elif 'application/json' in content_type:
-                    # Это JSON ответ
-                    return response.json()
-                else:
-                    logger.error(f"Неожиданный content-type: {content_type}")
-                    return {"error": f"Неожиданный content-type: {content_type}"}
-            else:
-                response.raise_for_status()
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при получении этикеток: {e}")
-            logger.error(f"URL: {url}")
-            logger.error(f"Payload: {payload}")
-            logger.error(f"Response: {response.text if 'response' in locals() else 'No response'}")
-            return {"error": str(e)}
+        result = self._post_file(
+            "package_label", payload, "Ошибка при получении этикеток",
+            "application/pdf", f"label_{'-'.join(posting_numbers)}.pdf"
+        )
+        if result and "file_content" in result:
+            self._label_cache.set(cache_key, result)
+        return result
     
     def get_barcode(self, posting_number: str) -> Dict[str, Any]:
         """
         Получить штрихкод для заказа
         POST /v2/posting/fbs/barcode
         """
-        url = f"{self.base_url}/v2/posting/fbs/barcode"
         payload = {
             "posting_number": posting_number
         }
-        
-        try:
-            logger.debug(f"Отправка запроса на получение штрихкода: {url} с payload: {payload}")
-            response = requests.post(url, headers=self.headers, json=payload)
-            logger.debug(f"Ответ API для штрихкода: {response.status_code}")
-            
-            if response.status_code == 200:
-                # Проверяем content-type
-                content_type = response.headers.get('content-type', '')
-                if 'image/' in content_type:
-                    # Это изображение штрихкода
-                    return {
-                        "file_content": response.content,
-                        "file_name": f"barcode_{posting_number}.png",
-                        "content_type": content_type
-                    }
-                elif 'application/json' in content_type:
-                    # Это JSON ответ
-                    return response.json()
-                else:
-                    logger.error(f"Неожиданный content-type: {content_type}")
-                    return {"error": f"Неожиданный content-type: {content_type}"}
-            else:
-                response.raise_for_status()
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при получении штрихкода: {e}")
-            logger.error(f"URL: {url}")
-            logger.error(f"Payload: {payload}")
-            logger.error(f"Response: {response.text if 'response' in locals() else 'No response'}")
-            return {"error": str(e)}
+        return self._post_file(
+            "fbs_barcode", payload, "Ошибка при получении штрихкода",
+            "image/", f"barcode_{posting_number}.png"
+        )
     
     def get_all_products(self, limit: int = 100) -> Dict[str, Any]:
         """
         Получить все товары на продаже через API списка товаров
         POST /v3/product/list
         """
-        url = f"{self.base_url}/v3/product/list"
         payload = {
             "filter": {
                 "visibility": "ALL"  # Все товары, кроме архивных
@@ -280,53 +797,30 @@ class OzonAPI:
             "limit": limit,
             "last_id": ""
         }
-
-        try:
-            logger.debug(f"Отправка запроса на получение всех товаров: {url} с payload: {payload}")
-            response = requests.post(url, headers=self.headers, json=payload)
-            logger.debug(f"Ответ API товаров: {response.status_code}")
-            response.raise_for_status()
-            result = response.json()
-            logger.debug(f"Результат товаров: {result}")
-            return result
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при получении товаров: {e}")
-            logger.error(f"URL: {url}")
-            logger.error(f"Payload: {payload}")
-            logger.error(f"Response: {response.text if 'response' in locals() else 'No response'}")
-            return {"error": str(e)}
+        cached = self._catalog_cache.get(limit)
+        if cached is not None:
+            return cached
+        
+        result = self._post("product_list", payload, "Ошибка при получении товаров")
+        if "error" not in result:
+            self._catalog_cache.set(limit, result)
+        return result
     
     def get_product_barcode(self, item_id: str) -> Dict[str, Any]:
         """
         Получить штрихкод товара
         POST /v2/product/barcode
         """
-        url = f"{self.base_url}/v2/product/barcode"
         payload = {
             "item_id": [item_id]
         }
-        
-        try:
-            logger.debug(f"Отправка запроса на получение штрихкода товара: {url} с payload: {payload}")
-            response = requests.post(url, headers=self.headers, json=payload)
-            logger.debug(f"Ответ API штрихкода товара: {response.status_code}")
-            response.raise_for_status()
-            result = response.json()
-            logger.debug(f"Результат штрихкода товара: {result}")
-            return result
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при получении штрихкода товара: {e}")
-            logger.error(f"URL: {url}")
-            logger.error(f"Payload: {payload}")
-            logger.error(f"Response: {response.text if 'response' in locals() else 'No response'}")
-            return {"error": str(e)}
+        return self._post("product_barcode", payload, "Ошибка при получении штрихкода товара")
     
     def update_product_stocks(self, offer_id: str, warehouse_id: int, stock: int) -> Dict[str, Any]:
         """
         Обновить количество товара на складе FBS
         POST /v2/products/stocks
         """
-        url = f"{self.base_url}/v2/products/stocks"
         payload = {
             "stocks": [
                 {
@@ -336,46 +830,32 @@ class OzonAPI:
                 }
             ]
         }
-        
-        try:
-            logger.debug(f"Отправка запроса на обновление остатков: {url} с payload: {payload}")
-            response = requests.post(url, headers=self.headers, json=payload)
-            logger.debug(f"Ответ API обновления остатков: {response.status_code}")
-            response.raise_for_status()
-            result = response.json()
-            logger.debug(f"Результат обновления остатков: {result}")
-            return result
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при обновлении остатков: {e}")
-            logger.error(f"URL: {url}")
-            logger.error(f"Payload: {payload}")
-            logger.error(f"Response: {response.text if 'response' in locals() else 'No response'}")
-            return {"error": str(e)}
+        return self._post("products_stocks", payload, "Ошибка при обновлении остатков")
     
     def get_fbs_stocks(self, sku_list: List[str]) -> Dict[str, Any]:
         """
         Получить информацию об остатках FBS товаров
         POST /v1/product/info/stocks-by-warehouse/fbs
         """
-        url = f"{self.base_url}/v1/product/info/stocks-by-warehouse/fbs"
         payload = {
             "sku": sku_list
         }
-        
-        try:
-            logger.debug(f"Отправка запроса на получение остатков FBS: {url} с payload: {payload}")
-            response = requests.post(url, headers=self.headers, json=payload)
-            logger.debug(f"Ответ API остатков FBS: {response.status_code}")
-            response.raise_for_status()
-            result = response.json()
-            logger.debug(f"Результат остатков FBS: {result}")
-            return result
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при получении остатков FBS: {e}")
-            logger.error(f"URL: {url}")
-            logger.error(f"Payload: {payload}")
-            logger.error(f"Response: {response.text if 'response' in locals() else 'No response'}")
-            return {"error": str(e)}
+        return self._post("fbs_stocks", payload, "Ошибка при получении остатков FBS")
+    
+    def get_fbs_stock(self, sku: str) -> Dict[str, Any]:
+        """
+        Остаток FBS одного SKU (элемент result ответа, пустой dict - SKU нет в ответе) или {"error": ...}
+        Запросы из разных обработчиков за STOCKS_BATCH_WINDOW объединяются в один POST
+        """
+        return self._fbs_stock_batcher.submit(str(sku)).result()
+    
+    def _fbs_stocks_by_sku(self, skus: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Пакетный запрос остатков FBS для MicroBatcher: SKU -> элемент ответа (или ошибка)"""
+        result = self.get_fbs_stocks(skus)
+        if "error" in result:
+            return dict.fromkeys(skus, result)
+        stocks = {str(stock_info.get('sku', '')): stock_info for stock_info in result.get("result") or []}
+        return {sku: stocks.get(sku, {}) for sku in skus}
 
 class OrderMonitor:
     """Класс для мониторинга новых заказов"""
@@ -384,9 +864,15 @@ class OrderMonitor:
         self.ozon_api = ozon_api
         self.bot = bot
         self.admin_chat_id = admin_chat_id
-        self.processed_orders: set = set()
+        # Ограниченный LRU обработанных заказов (значения не используются)
+        self.processed_orders: OrderedDict = OrderedDict()
         self.is_running = False
-        self.monitor_thread = None
+        self.check_interval = Config.MONITORING_INTERVAL
+        self.last_check_at: Optional[datetime] = None
+        self.next_check_at: Optional[datetime] = None
+        self._timer: Optional[threading.Timer] = None
+        self._timer_lock = threading.Lock()
+        self._backoff = 0
         
     def start_monitoring(self, check_interval: int = None):
         """Запуск мониторинга новых заказов"""
@@ -397,74 +883,108 @@ class OrderMonitor:
             return
             
         self.is_running = True
-        self.monitor_thread = threading.Thread(target=self._monitor_loop, args=(check_interval,))
-        self.monitor_thread.daemon = True
-        self.monitor_thread.start()
-        logger.info(f"Запуск мониторинга заказов с интервалом {check_interval} секунд")
+        self.check_interval = check_interval
+        self._backoff = 0
+        self._schedule_next(0)
+        logger.info("Запуск мониторинга заказов с интервалом %s секунд", check_interval)
     
     def stop_monitoring(self):
         """Остановка мониторинга"""
         self.is_running = False
-        if self.monitor_thread:
-            self.monitor_thread.join()
+        with self._timer_lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+        self.next_check_at = None
         logger.info("Мониторинг заказов остановлен")
     
-    def _monitor_loop(self, check_interval: int):
-        """Основной цикл мониторинга"""
-        while self.is_running:
-            try:
-                self.check_new_orders()
-                time.sleep(check_interval)
-            except Exception as e:
-                logger.error(f"Ошибка в мониторинге заказов: {e}")
-                time.sleep(60)
+    def _schedule_next(self, delay: float):
+        """Запланировать следующую проверку через delay секунд"""
+        with self._timer_lock:
+            if not self.is_running:
+                return
+            self._timer = threading.Timer(delay, self._tick)
+            self._timer.daemon = True
+            self.next_check_at = datetime.fromtimestamp(time.time() + delay)
+            self._timer.start()
+    
+    def _tick(self):
+        """Одна проверка по таймеру; после ошибки повтор с экспоненциальной задержкой"""
+        try:
+            ok = self.check_new_orders()
+        except Exception as e:
+            logger.error("Ошибка в мониторинге заказов: %s", e)
+            ok = False
+        
+        self.last_check_at = datetime.now()
+        if ok:
+            self._backoff = 0
+            delay = self.check_interval
+        else:
+            self._backoff = min(self._backoff * 2 or 5, 300, self.check_interval)
+            delay = self._backoff
+        self._schedule_next(delay)
     
-    def check_new_orders(self):
-        """Проверка новых заказов на сборку"""
+    def check_new_orders(self) -> bool:
+        """Проверка новых заказов на сборку. Возвращает False, если API недоступно"""
         try:
             result = self.ozon_api.get_orders_for_packaging(limit=Config.MAX_ORDERS_PER_REQUEST)
             
             if "error" in result:
-                logger.error(f"Ошибка при получении заказов: {result['error']}")
-                return
+                logger.error("Ошибка при получении заказов: %s", result['error'])
+                return False
             
             orders = result.get("result", {}).get("postings", [])
             if not orders:
                 logger.info("Нет новых заказов на сборку")
-                return
+                return True
                 
             new_orders = []
+            processed = self.processed_orders
             
             for order in orders:
                 posting_number = order.get("posting_number")
-                if posting_number and posting_number not in self.processed_orders:
+                if not posting_number:
+                    continue
+                if posting_number in processed:
+                    # Заказ всё ещё в выдаче - не даём ему вытесниться
+                    processed.move_to_end(posting_number)
+                else:
                     new_orders.append(order)
-                    self.processed_orders.add(posting_number)
+                    processed[posting_number] = None
+            
+            while len(processed) > Config.PROCESSED_ORDERS_MAX:
+                processed.popitem(last=False)
             
             if new_orders:
                 self.send_new_orders_notification(new_orders)
             else:
                 logger.info("Все заказы уже обработаны")
+            return True
                 
         except Exception as e:
-            logger.error(f"Ошибка при проверке новых заказов: {e}")
+            logger.error("Ошибка при проверке новых заказов: %s", e)
+            return False
     
     def send_new_orders_notification(self, orders: List[Dict[str, Any]]):
         """Отправка уведомления о новых заказах на сборку"""
         try:
-            text = f"🔔 <b>Новые заказы на сборку ({len(orders)})</b>\n\n"
+            item_template = NOTIFICATION_TEMPLATES["new_order_item"]
+            parts = [NOTIFICATION_TEMPLATES["new_orders_header"].format(count=len(orders))]
             
             for order in orders[:Config.NOTIFICATION_BATCH_SIZE]:
-                posting_number = order.get("posting_number", "N/A")
-                shipment_date = order.get("shipment_date", "N/A")
-                
-                text += f"📦 <b>{posting_number}</b>\n"
-                text += f"Дата отгрузки: {shipment_date}\n\n"
+                parts.append(item_template.format(
+                    posting_number=order.get("posting_number", "N/A"),
+                    shipment_date=order.get("shipment_date", "N/A")
+                ))
             
             if len(orders) > Config.NOTIFICATION_BATCH_SIZE:
-                text += f"... и еще {len(orders) - Config.NOTIFICATION_BATCH_SIZE} заказов\n\n"
+                parts.append(NOTIFICATION_TEMPLATES["more_orders"].format(
+                    count=len(orders) - Config.NOTIFICATION_BATCH_SIZE
+                ))
             
-            text += "Используйте /orders для просмотра всех заказов"
+            parts.append(NOTIFICATION_TEMPLATES["new_orders_footer"])
+            text = "".join(parts)
             
             self.bot.send_message(
                 chat_id=self.admin_chat_id,
@@ -472,38 +992,515 @@ class OrderMonitor:
                 parse_mode="HTML"
             )
             
-            logger.info(f"Отправлено уведомление о {len(orders)} новых заказах")
+            logger.info("Отправлено уведомление о %s новых заказах", len(orders))
             
         except Exception as e:
-            logger.error(f"Ошибка при отправке уведомления: {e}")
+            logger.error("Ошибка при отправке уведомления: %s", e)
+    
+    def get_processed_orders_count(self) -> int:
+        """Получить количество обработанных заказов"""
+        return len(self.processed_orders)
+
+# Словарь типов товаров и их эмодзи
+_PRODUCT_TYPE_EMOJIS = MappingProxyType({
+    # Чехлы и аксессуары для телефонов
+    'чехол': '📱', 'чехлы': '📱', 'case': '📱', 'cover': '📱',
+    'защитн': '🛡️', 'защита': '🛡️', 'protection': '🛡️',
+    'стекло': '🪟', 'стекла': '🪟', 'glass': '🪟',
+    'пленка': '🎞️', 'пленки': '🎞️', 'film': '🎞️',
+
+    # Игрушки
+    'игрушка': '🧸', 'игрушки': '🧸', 'toy': '🧸', 'toys': '🧸',
+    'кукла': '👸', 'куклы': '👸', 'doll': '👸', 'dolls': '👸',
+    'машинка': '🚗', 'машинки': '🚗', 'car': '🚗', 'cars': '🚗',
+    'мяч': '⚽', 'мячи': '⚽', 'ball': '⚽', 'balls': '⚽',
+    'конструктор': '🧱', 'конструкторы': '🧱', 'constructor': '🧱',
+    'пазл': '🧩', 'пазлы': '🧩', 'puzzle': '🧩', 'puzzles': '🧩',
+
+    # Одежда
+    'футболка': '👕', 'футболки': '👕', 't-shirt': '👕', 'tshirt': '👕',
+    'рубашка': '👔', 'рубашки': '👔', 'shirt': '👔', 'shirts': '👔',
+    'платье': '👗', 'платья': '👗', 'dress': '👗', 'dresses': '👗',
+    'брюки': '👖', 'брюк': '👖', 'pants': '👖', 'trousers': '👖',
+    'куртка': '🧥', 'куртки': '🧥', 'jacket': '🧥', 'jackets': '🧥',
+    'кроссовки': '👟', 'кроссовок': '👟', 'sneakers': '👟', 'shoes': '👟',
+    'ботинки': '👢', 'ботинок': '👢', 'boots': '👢',
+    'шапка': '🧢', 'шапки': '🧢', 'hat': '🧢', 'cap': '🧢',
+
+    # Электроника
+    'наушники': '🎧', 'наушник': '🎧', 'headphones': '🎧', 'earphones': '🎧',
+    'зарядка': '🔌', 'зарядки': '🔌', 'charger': '🔌', 'charging': '🔌',
+    'кабель': '🔌', 'кабели': '🔌', 'cable': '🔌', 'cables': '🔌',
+    'аккумулятор': '🔋', 'аккумуляторы': '🔋', 'battery': '🔋', 'batteries': '🔋',
+    'динамик': '🔊', 'динамики': '🔊', 'speaker': '🔊', 'speakers': '🔊',
+    'микрофон': '🎤', 'микрофоны': '🎤', 'microphone': '🎤', 'mic': '🎤',
+
+    # Дом и сад
+    'лампа': '💡', 'лампы': '💡', 'lamp': '💡', 'light': '💡',
+    'свеча': '🕯️', 'свечи': '🕯️', 'candle': '🕯️', 'candles': '🕯️',
+    'ваза': '🏺', 'вазы': '🏺', 'vase': '🏺', 'vases': '🏺',
+    'горшок': '🪴', 'горшки': '🪴', 'pot': '🪴', 'pots': '🪴',
+    'ковер': '🪞', 'ковры': '🪞', 'carpet': '🪞', 'rug': '🪞',
+
+    # Спорт
+    'гантели': '🏋️', 'гантель': '🏋️', 'dumbbell': '🏋️', 'weights': '🏋️',
+    'скакалка': '🪢', 'скакалки': '🪢', 'rope': '🪢', 'jump rope': '🪢',
+    'велосипед': '🚲', 'велосипеды': '🚲', 'bicycle': '🚲', 'bike': '🚲',
+    'ролики': '🛼', 'ролик': '🛼', 'skates': '🛼', 'skate': '🛼',
+
+    # Книги и канцелярия
+    'книга': '📚', 'книги': '📚', 'book': '📚', 'books': '📚',
+    'тетрадь': '📓', 'тетради': '📓', 'notebook': '📓', 'notebooks': '📓',
+    'ручка': '✏️', 'ручки': '✏️', 'pen': '✏️', 'pens': '✏️',
+    'карандаш': '✏️', 'карандаши': '✏️', 'pencil': '✏️', 'pencils': '✏️',
+    'маркер': '🖍️', 'маркеры': '🖍️', 'marker': '🖍️', 'markers': '🖍️',
+
+    # Красота и здоровье
+    'крем': '🧴', 'кремы': '🧴', 'cream': '🧴', 'creams': '🧴',
+    'шампунь': '🧴', 'шампуни': '🧴', 'shampoo': '🧴', 'shampoos': '🧴',
+    'мыло': '🧼', 'мыла': '🧼', 'soap': '🧼', 'soaps': '🧼',
+    'зубная': '🦷', 'зубной': '🦷', 'tooth': '🦷', 'dental': '🦷',
+    'щетка': '🪥', 'щетки': '🪥', 'brush': '🪥', 'brushes': '🪥',
+
+    # Кухня
+    'тарелка': '🍽️', 'тарелки': '🍽️', 'plate': '🍽️', 'plates': '🍽️',
+    'чашка': '☕', 'чашки': '☕', 'cup': '☕', 'cups': '☕',
+    'ложка': '🥄', 'ложки': '🥄', 'spoon': '🥄', 'spoons': '🥄',
+    'вилка': '🍴', 'вилки': '🍴', 'fork': '🍴', 'forks': '🍴',
+    'нож': '🔪', 'ножи': '🔪', 'knife': '🔪', 'knives': '🔪',
+
+    # Автомобиль
+    'автомобиль': '🚗', 'автомобили': '🚗', 'car': '🚗', 'cars': '🚗',
+    'машина': '🚗', 'машины': '🚗', 'auto': '🚗', 'vehicle': '🚗',
+    'шина': '🛞', 'шины': '🛞', 'tire': '🛞', 'tyre': '🛞',
+    'диск': '🛞', 'диски': '🛞', 'wheel': '🛞', 'rim': '🛞',
+})
+
+# Эмодзи цветов товаров
+_COLOR_EMOJIS = MappingProxyType({
+    'красный': '🔴', 'red': '🔴',
+    'синий': '🔵', 'blue': '🔵',
+    'зеленый': '🟢', 'green': '🟢',
+    'желтый': '🟡', 'yellow': '🟡',
+    'оранжевый': '🟠', 'orange': '🟠',
+    'фиолетовый': '🟣', 'purple': '🟣',
+    'розовый': '🩷', 'pink': '🩷',
+    'фуксия': '🟣', 'fuchsia': '🟣',
+    'коричневый': '🟤', 'brown': '🟤',
+    'черный': '⚫', 'black': '⚫',
+    'белый': '⚪', 'white': '⚪',
+    'серый': '🔘', 'gray': '🔘', 'grey': '🔘',
+    'золотой': '🟨', 'gold': '🟨',
+    'серебряный': '⚪', 'silver': '⚪',
+    'радужный': '🌈', 'радужная': '🌈', 'радужное': '🌈', 'rainbow': '🌈',
+    'разноцветный': '🌈', 'разноцветная': '🌈', 'разноцветное': '🌈', 'multicolor': '🌈'
+})
+
+# Список цветов для поиска (учитываем е/ё, й/и)
+_COLOR_PATTERNS = MappingProxyType({
+    'красн': 'красный',
+    'син': 'синий', 
+    'голуб': 'голубой',
+    'зелен': 'зеленый',
+    'желт': 'желтый',
+    'оранж': 'оранжевый',
+    'фиолет': 'фиолетовый',
+    'розов': 'розовый',
+    'фукси': 'фуксия',
+    'коричнев': 'коричневый',
+    'черн': 'черный',
+    'бел': 'белый',
+    'сер': 'серый',
+    'золот': 'золотой',
+    'серебр': 'серебряный',
+    'радужн': 'радужный',
+    'разноцветн': 'разноцветный',
+    'multicolor': 'разноцветный',
+    'rainbow': 'радужный',
+    'red': 'красный',
+    'blue': 'синий',
+    'green': 'зеленый',
+    'yellow': 'желтый',
+    'orange': 'оранжевый',
+    'purple': 'фиолетовый',
+    'pink': 'розовый',
+    'fuchsia': 'фуксия',
+    'brown': 'коричневый',
+    'black': 'черный',
+    'white': 'белый',
+    'gray': 'серый',
+    'grey': 'серый',
+    'gold': 'золотой',
+    'silver': 'серебряный'
+})
+
+class _KeywordMatcher:
+    """
+    Поиск первого (в порядке словаря) ключевого слова, входящего в строку, за один проход regex
+    Просмотр вперёд (?=(...)) находит совпадения во всех позициях, включая перекрывающиеся;
+    в каждой позиции альтернатива выбирает слово с наименьшим номером, итог - минимум по позициям
+    """
+    
+    def __init__(self, keywords):
+        self._keywords = tuple(keywords)
+        self._rank = {keyword: index for index, keyword in enumerate(self._keywords)}
+        self._pattern = re.compile("(?=(" + "|".join(map(re.escape, self._keywords)) + "))")
+    
+    def first(self, text: str) -> Optional[str]:
+        ranks = [self._rank[match.group(1)] for match in self._pattern.finditer(text)]
+        return self._keywords[min(ranks)] if ranks else None
+
+_TYPE_KEYWORDS = _KeywordMatcher(_PRODUCT_TYPE_EMOJIS)
+_COLOR_KEYWORDS = _KeywordMatcher(_COLOR_PATTERNS)
+
+@functools.lru_cache(maxsize=4096)
+def _type_emoji(product_name: str) -> str:
+    """
+    Эмодзи типа товара по названию (названия повторяются между заказами и обновлениями)
+    lower() выполняется только при промахе кеша
+    """
+    if not product_name or product_name == 'N/A':
+        return '📦'
+    
+    name_lower = product_name.lower()
+    
+    # Ищем совпадения в названии товара
+    keyword = _TYPE_KEYWORDS.first(name_lower)
+    return _PRODUCT_TYPE_EMOJIS[keyword] if keyword else '📦'  # По умолчанию коробка
+
+# Шаблоны цветов записаны через е/и: "чёрный", "жёлтый", "зелёный" приводятся к ним
+_CYR_NORM = str.maketrans('ёй', 'еи')
+
+@functools.lru_cache(maxsize=4096)
+def _extract_color_from_name(product_name: str) -> str:
+    """Цвет по названию товара или 'N/A' (нормализация выполняется только при промахе кеша)"""
+    pattern = _COLOR_KEYWORDS.first(product_name.lower().translate(_CYR_NORM))
+    return _COLOR_PATTERNS[pattern] if pattern else 'N/A'
+
+@functools.lru_cache(maxsize=4096)
+def _color_emoji(color: str) -> str:
+    """Эмодзи цвета; пустая строка, если цвет не найден"""
+    return _COLOR_EMOJIS.get(color, '')
+
+@functools.lru_cache(maxsize=4096)
+def _shorten_name_for_barcode(product_name: str, max_length: int) -> str:
+    """Сокращенное название товара для штрихкода и этикетки с сохранением цвета (кешируется по названию и длине)"""
+    if not product_name or product_name == 'N/A':
+        return 'Товар'
+    
+    # Убираем эмодзи, но сохраняем все остальное включая цвета
+    clean_name = _CLEAN_NAME_DASH_RE.sub('', product_name)
+    
+    # Если название короткое, возвращаем как есть
+    if len(clean_name) <= max_length:
+        return clean_name
+    
+    # Разбиваем на слова
+    words = clean_name.split()
+    
+    if not words:
+        return clean_name[:max_length]
+    
+    # Сначала пытаемся найти цвет в названии (слова приводим к нижнему регистру один раз)
+    words_lower = [w.lower() for w in words]
+    color_found = None
+    if not _COLOR_WORDS.isdisjoint(words_lower):
+        color_index = next(i for i, w in enumerate(words_lower) if w in _COLOR_WORDS)
+        color_found = words[color_index]
+    
+    # Если цвет найден, стараемся его сохранить
+    if color_found:
+        # Убираем цвет из списка слов
+        color_lower = words_lower[color_index]
+        words_without_color = [w for w, w_lower in zip(words, words_lower) if w_lower != color_lower]
+        
+        # Берем слова по порядку, пока не достигнем максимальной длины минус цвет
+        result = ""
+        color_length = len(color_found) + 1  # +1 для пробела
+        
+        for word in words_without_color:
+            test_result = result + (" " if result else "") + word
+            if len(test_result) + color_length <= max_length:
+                result = test_result
+            else:
+                break
+        
+        # Добавляем цвет в конец
+        if result:
+            return f"{result} {color_found}"
+        else:
+            return color_found
+    
+    # Если цвет не найден, используем старую логику с улучшенными сокращениями
+    result = ""
+    for word in words:
+        test_result = result + (" " if result else "") + word
+        if len(test_result) <= max_length:
+            result = test_result
+        else:
+            break
+    
+    # Если ничего не получилось, создаем сокращения с точками
+    if not result:
+        # Создаем сокращения слов с точками
+        shortened_words = []
+        current_length = 0
+        
+        for word in words:
+            if len(word) > 4:  # Сокращаем только длинные слова
+                # Берем первые 3-4 символа + точка
+                short_word = word[:3] + "."
+                if current_length + len(short_word) + 1 <= max_length:
+                    shortened_words.append(short_word)
+                    current_length += len(short_word) + 1
+                else:
+                    break
+            else:
+                # Короткие слова оставляем как есть
+                if current_length + len(word) + 1 <= max_length:
+                    shortened_words.append(word)
+                    current_length += len(word) + 1
+                else:
+                    break
+        
+        result = " ".join(shortened_words)
     
-    def get_processed_orders_count(self) -> int:
-        """Получить количество обработанных заказов"""
-        return len(self.processed_orders)
+    # Если все еще ничего не получилось, берем первые символы
+    if not result:
+        result = clean_name[:max_length]
+    
+    return result
+
+@functools.lru_cache(maxsize=64)
+def _color_strip_re(color: str):
+    """Скомпилированный шаблон цвета без учета регистра (один на цвет) для удаления его из названия"""
+    return re.compile(re.escape(color), re.IGNORECASE)
+
+@functools.lru_cache(maxsize=4096)
+def _label_display_name(full_name: str, short_length: int, plain_length: int) -> str:
+    """
+    Короткое название товара с цветом словами для умной этикетки
+    Если цвет есть в названии - название без цвета до short_length символов и цвет в конце,
+    иначе название до plain_length символов; цвет удаляется из названия без учета регистра
+    """
+    # Извлекаем цвет из названия товара
+    color = _extract_color_from_name(full_name) if full_name and full_name != 'N/A' else 'N/A'
+    
+    if color != 'N/A' and color.lower() in full_name.lower():
+        # Если цвет найден в названии, создаем короткое название
+        short_name = _shorten_name_for_barcode(_color_strip_re(color).sub('', full_name), short_length).strip()
+        return f"{short_name} {color}" if short_name else color
+    return _shorten_name_for_barcode(full_name, plain_length)
+
+# Типы обновлений, для которых есть обработчики (остальные Telegram не присылает)
+_ALLOWED_UPDATES = ["message", "callback_query"]
+
+@functools.lru_cache(maxsize=1024)
+def _order_back_kb(posting_number: str) -> str:
+    """Клавиатура «К заказу» + «Главное меню» (готовый JSON, собирается один раз на заказ)"""
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.row(types.InlineKeyboardButton("🔙 К заказу", callback_data=f"order_{posting_number}"))
+    keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+    return keyboard.to_json()
 
 class OzonBot:
     """Основной класс Telegram бота на telebot"""
     
     def __init__(self):
         self.ozon_api = OzonAPI(Config.OZON_API_KEY, Config.OZON_CLIENT_ID)
-        self.bot = telebot.TeleBot(Config.BOT_TOKEN)
+        self.bot = telebot.TeleBot(Config.BOT_TOKEN, num_threads=Config.BOT_NUM_THREADS)
         self.order_monitor = OrderMonitor(self.ozon_api, self.bot, Config.ADMIN_CHAT_ID)
+        
+        # Список администраторов (собирается один раз)
+        admin_ids = (
+            Config.ADMIN_CHAT_ID,  # Основной администратор
+            "669994046"  # Дополнительный администратор
+        )
+        self._admin_ids = frozenset(
+            int(admin_id) for admin_id in (str(a).strip() for a in admin_ids)
+            if admin_id.lstrip("-").isdigit()
+        )
+        # Готовые эмодзи товаров экранов заказов ((sku, название) -> эмодзи)
+        self._emoji_cache: Dict[Tuple[str, str], str] = {}
+        # Готовые PNG штрихкодов ((метод, аргументы генерации) -> bytes)
+        self._barcode_png_cache = TTLCache(Config.BARCODE_CACHE_SIZE, Config.BARCODE_CACHE_TTL)
+        # file_id Telegram для уже загруженных PNG штрихкодов (ключ кеша PNG -> file_id)
+        self._file_id_cache = TTLCache(Config.FILE_ID_CACHE_SIZE, Config.FILE_ID_CACHE_TTL)
+        # Offer ID товаров для обновления остатка (product_id -> offer_id)
+        self._offer_ids = TTLCache(Config.PRODUCT_CACHE_SIZE, Config.OFFER_ID_CACHE_TTL)
+        # Заказ и карточки его товаров для экранов штрихкодов (номер отправления -> (заказ, товары по SKU))
+        self._order_state = TTLCache(Config.ORDER_STATE_CACHE_SIZE, Config.ORDER_STATE_CACHE_TTL)
+        self._build_static_keyboards()
+        self._build_callback_routes()
+        
+        # Очередь исходящих сообщений: обработчик не ждёт ответа Telegram
+        self._tx_q: queue.Queue = queue.Queue()
+        self._tx_limiter = TelegramRateLimiter(Config.TG_GLOBAL_RATE, Config.TG_CHAT_RATE, Config.TG_CHAT_BURST)
+        self._tx_thread = threading.Thread(target=self._tx_worker, name="telegram-tx", daemon=True)
+        self._tx_thread.start()
         self.setup_handlers()
     
+    def _tx_worker(self):
+        """Фоновая отправка сообщений из очереди (по одному, в порядке постановки, с учётом лимитов Telegram)"""
+        while True:
+            fn, args, kwargs = self._tx_q.get()
+            chat_id = kwargs.get("chat_id", args[0] if args else None)
+            try:
+                for attempt in range(Config.TG_MAX_RETRIES + 1):
+                    self._tx_limiter.acquire(chat_id)
+                    try:
+                        fn(*args, **kwargs)
+                        break
+                    except telebot.apihelper.ApiTelegramException as e:
+                        if e.error_code != 429 or attempt == Config.TG_MAX_RETRIES:
+                            raise
+                        retry_after = (e.result_json or {}).get("parameters", {}).get("retry_after", 1)
+                        logger.warning(f"Telegram ограничил отправку в чат {chat_id}, повтор через {retry_after} с")
+                        # Документ из BytesIO перечитываем с начала
+                        for value in (*args, *kwargs.values()):
+                            if hasattr(value, "seek"):
+                                value.seek(0)
+                        time.sleep(retry_after)
+            except Exception as e:
+                logger.error(f"Ошибка при отправке сообщения: {e}")
+            finally:
+                self._tx_q.task_done()
+    
+    def _send(self, *args, **kwargs):
+        """Поставить send_message в очередь отправки"""
+        self._tx_q.put((self.bot.send_message, args, kwargs))
+    
+    def _send_doc(self, *args, **kwargs):
+        """Поставить send_document в очередь отправки"""
+        self._tx_q.put((self.bot.send_document, args, kwargs))
+    
+    def _send_barcode_doc(self, cache_key: tuple, *args, **kwargs):
+        """Поставить в очередь документ со штрихкодом; повторно тот же PNG отправляется по file_id без загрузки"""
+        self._tx_q.put((self._send_document_by_file_id, args, {"cache_key": cache_key, **kwargs}))
+    
+    def _send_document_by_file_id(self, chat_id, document, cache_key: tuple, **kwargs):
+        """Отправить документ по сохранённому file_id, а при его отсутствии (или устаревании) - загрузить"""
+        file_id = self._file_id_cache.get(cache_key)
+        if file_id is not None:
+            try:
+                return self.bot.send_document(chat_id, file_id, **kwargs)
+            except telebot.apihelper.ApiTelegramException as e:
+                if e.error_code == 429:
+                    raise
+                logger.warning(f"file_id штрихкода не принят Telegram, загружаем файл заново: {e}")
+                self._file_id_cache.pop(cache_key)
+        message = self.bot.send_document(chat_id, document, **kwargs)
+        if message is not None and message.document is not None:
+            self._file_id_cache.set(cache_key, message.document.file_id)
+        return message
+    
+    def _send_media_group_safe(self, chat_id: int, photos: List[str]):
+        """Отправить фото товаров одной медиагруппой, при ошибке — по одному"""
+        try:
+            logger.debug(f"Отправляем {len(photos)} фото товаров в одном сообщении")
+            self.bot.send_media_group(
+                chat_id=chat_id,
+                media=[types.InputMediaPhoto(photo) for photo in photos]
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при отправке группы фото: {e}")
+            # Если не удалось отправить группу, отправляем по одному
+            for photo in photos:
+                try:
+                    self.bot.send_photo(chat_id=chat_id, photo=photo)
+                except Exception as e:
+                    logger.error(f"Ошибка при отправке отдельного фото: {e}")
+    
+    def _send_document_group(self, chat_id: int, documents: List[Tuple[BytesIO, str]]):
+        """
+        Отправить документы (файл, подпись) медиагруппами по 10 - один запрос вместо запроса на каждый файл
+        Одиночный документ отправляется обычным send_document; при ошибке группы - по одному
+        """
+        for start in range(0, len(documents), 10):
+            chunk = documents[start:start + 10]
+            if len(chunk) == 1:
+                document, caption = chunk[0]
+                self.bot.send_document(chat_id=chat_id, document=document, caption=caption)
+                continue
+            try:
+                self.bot.send_media_group(
+                    chat_id=chat_id,
+                    media=[types.InputMediaDocument(document, caption=caption) for document, caption in chunk]
+                )
+            except Exception as e:
+                logger.error(f"Ошибка при отправке группы документов: {e}")
+                # Если не удалось отправить группу, отправляем по одному
+                for document, caption in chunk:
+                    try:
+                        document.seek(0)
+                        self.bot.send_document(chat_id=chat_id, document=document, caption=caption)
+                    except Exception as e:
+                        logger.error(f"Ошибка при отправке отдельного документа: {e}")
+    
+    def _send_product_gallery(self, chat_id: int, images: List[str], text: str, keyboard):
+        """Медиагруппа карточки товара (до 10 фото, подпись у первого) и клавиатура к ней"""
+        try:
+            # Первая фотография с текстом, остальные без подписей
+            media_group = [types.InputMediaPhoto(media=images[0], caption=text, parse_mode="HTML")]
+            media_group.extend(types.InputMediaPhoto(media=image_url) for image_url in images[1:10])
+            
+            sent_messages = self.bot.send_media_group(chat_id, media_group)
+            
+            # Добавляем клавиатуру к первому сообщению
+            if sent_messages:
+                try:
+                    self.bot.edit_message_reply_markup(
+                        chat_id=chat_id,
+                        message_id=sent_messages[0].message_id,
+                        reply_markup=keyboard
+                    )
+                except Exception as e:
+                    logger.error(f"Ошибка при добавлении клавиатуры: {e}")
+                    # Если не удалось добавить клавиатуру, отправляем отдельное сообщение с кнопками
+                    self.bot.send_message(chat_id, "Выберите действие:", reply_markup=keyboard)
+        except Exception as e:
+            logger.error(f"Ошибка при отправке медиагруппы: {e}")
+            # Если не удалось отправить медиагруппу, отправляем обычное сообщение
+            self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
+    
+    def _build_static_keyboards(self):
+        """
+        Неизменяемые клавиатуры собираются и сериализуются один раз
+        telebot передаёт готовую JSON-строку reply_markup без повторной сериализации
+        """
+        keyboard = types.InlineKeyboardMarkup()
+        keyboard.row(
+            types.InlineKeyboardButton("📦 Заказы на сборку", callback_data="packaging_orders"),
+            types.InlineKeyboardButton("🚚 Готовые к отгрузке", callback_data="delivery_orders")
+        )
+        keyboard.row(
+            types.InlineKeyboardButton("🔔 Уведомления", callback_data="notifications")
+        )
+        keyboard.row(
+            types.InlineKeyboardButton("📦 Товары", callback_data="all_products")
+        )
+        keyboard.row(
+            types.InlineKeyboardButton("📊 Статистика", callback_data="stats")
+        )
+        self._main_menu_kb = keyboard.to_json()
+        
+        keyboard = types.InlineKeyboardMarkup()
+        keyboard.row(
+            types.InlineKeyboardButton("📦 На сборку", callback_data="packaging_orders"),
+            types.InlineKeyboardButton("🚚 К отгрузке", callback_data="delivery_orders")
+        )
+        keyboard.row(
+            types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")
+        )
+        self._orders_kb = keyboard.to_json()
+        
+        keyboard = types.InlineKeyboardMarkup()
+        keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+        self._back_to_main_kb = keyboard.to_json()
+    
     def is_admin(self, user_id: int) -> bool:
         """Проверить, является ли пользователь администратором"""
-        # Список администраторов
-        admin_ids = [
-            str(Config.ADMIN_CHAT_ID),  # Основной администратор
-            "669994046"  # Дополнительный администратор
-        ]
-        return str(user_id) in admin_ids
-    
-    def check_admin_access(self, user_id: int) -> bool:
-        """Проверить права доступа администратора"""
-        if not self.is_admin(user_id):
-            return False
-        return True
+        return user_id in self._admin_ids
     
     def send_access_denied(self, chat_id: int):
         """Отправить сообщение об отказе в доступе"""
@@ -518,25 +1515,10 @@ class OzonBot:
     def show_main_menu(self, chat_id: int, user_id: int):
         """Показать главное меню (универсальная функция)"""
         # Проверяем права доступа
-        if not self.check_admin_access(user_id):
+        if not self.is_admin(user_id):
             self.send_access_denied(chat_id)
             return
         
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.row(
-            types.InlineKeyboardButton("📦 Заказы на сборку", callback_data="packaging_orders"),
-            types.InlineKeyboardButton("🚚 Готовые к отгрузке", callback_data="delivery_orders")
-        )
-        keyboard.row(
-            types.InlineKeyboardButton("🔔 Уведомления", callback_data="notifications")
-        )
-        keyboard.row(
-            types.InlineKeyboardButton("📦 Товары", callback_data="all_products")
-        )
-        keyboard.row(
-            types.InlineKeyboardButton("📊 Статистика", callback_data="stats")
-        )
-        
         welcome_text = (
             "🤖 <b>Ozon Seller Bot</b>\n\n"
             "Добро пожаловать! Этот бот поможет вам управлять заказами FBS:\n\n"
@@ -550,7 +1532,7 @@ class OzonBot:
         self.bot.send_message(
             chat_id,
             welcome_text,
-            reply_markup=keyboard,
+            reply_markup=self._main_menu_kb,
             parse_mode="HTML"
         )
     
@@ -566,7 +1548,7 @@ class OzonBot:
         def help_command(message):
             """Обработчик команды /help"""
             # Проверяем права доступа
-            if not self.check_admin_access(message.from_user.id):
+            if not self.is_admin(message.from_user.id):
                 self.send_access_denied(message.chat.id)
                 return
             
@@ -595,23 +1577,14 @@ class OzonBot:
         def orders_command(message):
             """Обработчик команды /orders"""
             # Проверяем права доступа
-            if not self.check_admin_access(message.from_user.id):
+            if not self.is_admin(message.from_user.id):
                 self.send_access_denied(message.chat.id)
                 return
             
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(
-                types.InlineKeyboardButton("📦 На сборку", callback_data="packaging_orders"),
-                types.InlineKeyboardButton("🚚 К отгрузке", callback_data="delivery_orders")
-            )
-            keyboard.row(
-                types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")
-            )
-            
             self.bot.send_message(
                 message.chat.id,
                 "📋 <b>Управление заказами</b>\n\nВыберите тип заказов:",
-                reply_markup=keyboard,
+                reply_markup=self._orders_kb,
                 parse_mode="HTML"
             )
         
@@ -619,7 +1592,7 @@ class OzonBot:
         def labels_command(message):
             """Обработчик команды /labels"""
             # Проверяем права доступа
-            if not self.check_admin_access(message.from_user.id):
+            if not self.is_admin(message.from_user.id):
                 self.send_access_denied(message.chat.id)
                 return
             
@@ -629,7 +1602,7 @@ class OzonBot:
         def monitor_command(message):
             """Обработчик команды /monitor"""
             # Проверяем права доступа
-            if not self.check_admin_access(message.from_user.id):
+            if not self.is_admin(message.from_user.id):
                 self.send_access_denied(message.chat.id)
                 return
             
@@ -647,7 +1620,7 @@ class OzonBot:
         def callback_handler(call):
             """Обработчик нажатий на inline кнопки"""
             # Проверяем права доступа
-            if not self.check_admin_access(call.from_user.id):
+            if not self.is_admin(call.from_user.id):
                 self.bot.answer_callback_query(call.id, "🚫 Доступ запрещен", show_alert=True)
                 self.send_access_denied(call.message.chat.id)
                 return
@@ -656,144 +1629,129 @@ class OzonBot:
             
             data = call.data
             
-            if data == "main_menu":
-                self.show_main_menu(call.message.chat.id, call.from_user.id)
-            elif data == "packaging_orders":
-                self.show_packaging_orders(call.message.chat.id)
-            elif data == "delivery_orders":
-                self.show_delivery_orders(call.message.chat.id)
-            elif data == "labels":
-                self.show_labels_menu(call.message.chat.id)
-            elif data == "notifications":
-                self.show_notifications_menu(call.message.chat.id)
-            elif data == "stats":
-                self.show_stats(call.message.chat.id)
-            elif data == "all_products":
-                self.show_all_products_menu(call.message.chat.id, 0)
-            elif data.startswith("products_page_"):
-                # Обработка пагинации товаров
-                page = int(data.replace("products_page_", ""))
-                self.show_all_products_menu(call.message.chat.id, page)
-            elif data == "products_packaging":
-                self.show_products_by_status(call.message.chat.id, "awaiting_packaging")
-            elif data == "products_delivery":
-                self.show_products_by_status(call.message.chat.id, "awaiting_deliver")
-            elif data.startswith("order_"):
-                posting_number = data.replace("order_", "")
-                self.show_order_details(call.message.chat.id, posting_number)
-            elif data.startswith("ship_"):
-                posting_number = data.replace("ship_", "")
-                self.ship_order(call.message.chat.id, posting_number, call.message.message_id)
-            elif data.startswith("label_"):
-                posting_number = data.replace("label_", "")
-                self.show_order_details(call.message.chat.id, posting_number)
-            elif data.startswith("download_label_"):
-                posting_number = data.replace("download_label_", "")
-                self.get_single_label(call.message.chat.id, posting_number)
-            elif data.startswith("download_barcode_"):
-                posting_number = data.replace("download_barcode_", "")
-                self.get_single_barcode(call.message.chat.id, posting_number)
-            elif data.startswith("products_"):
-                posting_number = data.replace("products_", "")
-                self.show_order_products(call.message.chat.id, posting_number)
-            elif data.startswith("barcodes_"):
-                posting_number = data.replace("barcodes_", "")
-                self.get_order_barcodes(call.message.chat.id, posting_number)
-            elif data.startswith("combined_"):
-                posting_number = data.replace("combined_", "")
-                self.get_combined_barcode_label(call.message.chat.id, posting_number)
-            elif data.startswith("product_"):
-                # Обработка кнопок товаров из заказов
-                parts = data.split("_")
-                if len(parts) >= 3:
-                    sku = parts[1]
-                    posting_number = parts[2]
-                    self.show_product_from_order(call.message.chat.id, sku, posting_number)
-            elif data.startswith("product_detail_"):
-                product_id = data.replace("product_detail_", "")
-                if product_id.isdigit():
-                    self.show_product_details(call.message.chat.id, product_id)
-                else:
-                    self.bot.send_message(call.message.chat.id, "❌ Неверный ID товара")
-            elif data.startswith("item_detail_"):
-                product_id = data.replace("item_detail_", "")
-                if product_id.isdigit():
-                    self.show_product_details(call.message.chat.id, product_id)
-                else:
-                    self.bot.send_message(call.message.chat.id, "❌ Неверный ID товара")
-            elif data.startswith("edit_stock_"):
-                product_id = data.replace("edit_stock_", "")
-                self.show_edit_stock_menu(call.message.chat.id, product_id)
-            elif data.startswith("update_stock_"):
-                # Формат: update_stock_{product_id}_{new_stock}
-                parts = data.replace("update_stock_", "").split("_")
-                if len(parts) >= 2:
-                    product_id = parts[0]
-                    new_stock = int(parts[1])
-                    self.update_product_stock(call.message.chat.id, product_id, new_stock)
-            elif data.startswith("barcode_"):
-                # Обработка получения штрихкода товара
-                product_id = data.replace("barcode_", "")
-                self.get_product_barcode_by_id(call.message.chat.id, product_id)
-            elif data == "start_monitoring":
-                self.start_monitoring(call.message.chat.id)
-            elif data == "stop_monitoring":
-                self.stop_monitoring(call.message.chat.id)
-            elif data == "monitoring_status":
-                self.show_monitoring_status(call.message.chat.id)
+            handler = self._callback_exact.get(data)
+            if handler is not None:
+                handler(call, "")
+                return
+            
+            # Первый сегмент до "_" выбирает короткий список кандидатов одним поиском в словаре
+            candidates = self._callback_by_head.get(data.partition("_")[0])
+            if candidates is None:
+                return
+            
+            for prefix, handler in candidates:
+                if data.startswith(prefix):
+                    handler(call, data[len(prefix):])
+                    return
     
-    def show_packaging_orders(self, chat_id: int):
-        """Показать заказы на сборку"""
-        self.bot.send_message(chat_id, "⏳ Загружаю заказы на сборку...")
+    def _build_callback_routes(self):
+        """
+        Таблицы маршрутизации callback_data: точные совпадения и префиксы
+        Префиксы группируются по первому сегменту и внутри группы проверяются
+        от длинного к короткому (product_detail_ раньше product_)
+        """
+        self._callback_exact = {
+            "main_menu": lambda call, arg: self.show_main_menu(call.message.chat.id, call.from_user.id),
+            "packaging_orders": lambda call, arg: self.show_packaging_orders(call.message.chat.id),
+            "delivery_orders": lambda call, arg: self.show_delivery_orders(call.message.chat.id),
+            "labels": lambda call, arg: self.show_labels_menu(call.message.chat.id),
+            "notifications": lambda call, arg: self.show_notifications_menu(call.message.chat.id),
+            "stats": lambda call, arg: self.show_stats(call.message.chat.id),
+            "all_products": lambda call, arg: self.show_all_products_menu(call.message.chat.id, 0),
+            "products_packaging": lambda call, arg: self.show_products_by_status(call.message.chat.id, "awaiting_packaging"),
+            "products_delivery": lambda call, arg: self.show_products_by_status(call.message.chat.id, "awaiting_deliver"),
+            "start_monitoring": lambda call, arg: self.start_monitoring(call.message.chat.id),
+            "stop_monitoring": lambda call, arg: self.stop_monitoring(call.message.chat.id),
+            "monitoring_status": lambda call, arg: self.show_monitoring_status(call.message.chat.id),
+        }
+        
+        prefixes = {
+            # Обработка пагинации товаров
+            "products_page_": lambda call, arg: self.show_all_products_menu(call.message.chat.id, int(arg)),
+            "order_": lambda call, arg: self.show_order_details(call.message.chat.id, arg),
+            "ship_": lambda call, arg: self.ship_order(call.message.chat.id, arg, call.message.message_id),
+            "label_": lambda call, arg: self.show_order_details(call.message.chat.id, arg),
+            "download_label_": lambda call, arg: self.get_single_label(call.message.chat.id, arg),
+            "download_barcode_": lambda call, arg: self.get_single_barcode(call.message.chat.id, arg),
+            "products_": lambda call, arg: self.show_order_products(call.message.chat.id, arg),
+            "barcodes_": lambda call, arg: self.get_order_barcodes(call.message.chat.id, arg),
+            "combined_": lambda call, arg: self.get_combined_barcode_label(call.message.chat.id, arg),
+            "product_": self._on_order_product,
+            "product_detail_": self._on_product_detail,
+            "item_detail_": self._on_product_detail,
+            "edit_stock_": lambda call, arg: self.show_edit_stock_menu(call.message.chat.id, arg),
+            "update_stock_": self._on_update_stock,
+            # Обработка получения штрихкода товара
+            "barcode_": lambda call, arg: self.get_product_barcode_by_id(call.message.chat.id, arg),
+        }
+        # Индекс по первому сегменту: "product" -> [product_detail_, product_], "order" -> [order_]
+        self._callback_by_head: Dict[str, List[Tuple[str, Any]]] = {}
+        for prefix, handler in sorted(prefixes.items(), key=lambda item: len(item[0]), reverse=True):
+            self._callback_by_head.setdefault(prefix.partition("_")[0], []).append((prefix, handler))
+    
+    def _on_order_product(self, call, arg: str):
+        """Кнопка товара из заказа. Формат: product_{sku}_{posting_number}"""
+        sku, sep, posting_number = arg.partition("_")
+        if sep:
+            self.show_product_from_order(call.message.chat.id, sku, posting_number)
+    
+    def _on_product_detail(self, call, product_id: str):
+        """Детали товара по ID"""
+        if product_id.isdigit():
+            self.show_product_details(call.message.chat.id, product_id)
+        else:
+            self.bot.send_message(call.message.chat.id, "❌ Неверный ID товара")
+    
+    def _on_update_stock(self, call, arg: str):
+        """Обновление остатка. Формат: update_stock_{product_id}_{new_stock}"""
+        product_id, sep, new_stock = arg.partition("_")
+        if sep:
+            self.update_product_stock(call.message.chat.id, product_id, int(new_stock))
+    
+    def _fetch_product_details(self, skus: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Получить детали товаров по SKU (/v3/product/info/list) с коротким кешем
+        Повторные и пустые SKU отбрасываются, запрашиваются только отсутствующие в кеше
+        """
+        result = self.ozon_api.get_product_info_list(sku=skus)
+        return {str(item.get('sku', '')): item for item in result.get("items", [])}
+
+    def _render_order_list(self, chat_id: int, fetcher, loading_text: str,
+                           header_emoji: str, title: str, empty_text: str):
+        """Общий экран списка заказов: загрузка, эмодзи товаров и кнопки заказов"""
+        self.bot.send_message(chat_id, loading_text)
         
-        result = self.ozon_api.get_orders_for_packaging(limit=20)
+        result = fetcher(limit=20)
         
         if "error" in result:
             error_text = f"❌ Ошибка при получении заказов: {result['error']}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
+            keyboard = self._back_to_main_kb
+            self._send(chat_id, error_text, reply_markup=keyboard)
             return
         
         orders = result.get("result", {}).get("postings", [])
         
         if not orders:
-            text = "✅ Заказов на сборку не найдено"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            self.bot.send_message(chat_id, text, reply_markup=keyboard)
+            keyboard = self._back_to_main_kb
+            self._send(chat_id, empty_text, reply_markup=keyboard)
             return
         
-        text = f"📦 <b>Заказы на сборку ({len(orders)})</b>\n\n"
-        keyboard = types.InlineKeyboardMarkup()
+        parts = [f"{header_emoji} <b>{title} ({len(orders)})</b>\n\n"]
+        # Строки клавиатуры собираются списком и передаются в разметку одним объектом
+        IKB = types.InlineKeyboardButton
+        rows = []
         
-        # Получаем информацию о товарах для всех заказов
-        all_skus = []
-        for order in orders[:10]:
-            products = order.get("products", [])
-            for product in products:
-                sku = str(product.get('sku', ''))
-                if sku and sku != 'N/A':
-                    all_skus.append(sku)
+        # Показываем первые 10 заказов; SKU собираются сразу без повторов
+        visible = orders[:10]
+        all_skus = list({
+            sku for order in visible for product in order.get("products", [])
+            for sku in (str(product.get('sku', '')),) if sku and sku != 'N/A'
+        })
         
         # Получаем детали товаров для эмодзи
-        product_details = {}
-        if all_skus:
-            try:
-                url = f"{self.ozon_api.base_url}/v3/product/info/list"
-                payload = {"sku": all_skus}
-                response = requests.post(url, headers=self.ozon_api.headers, json=payload)
-                response.raise_for_status()
-                detailed_result = response.json()
-                detailed_products = detailed_result.get("items", [])
-                
-                for product_detail in detailed_products:
-                    sku = str(product_detail.get('sku', ''))
-                    product_details[sku] = product_detail
-            except Exception as e:
-                logger.error(f"Ошибка при получении деталей товаров для списка заказов на сборку: {e}")
+        product_details = self._fetch_product_details(all_skus) if all_skus else {}
         
-        for order in orders[:10]:  # Показываем первые 10
+        for order in visible:
             posting_number = order.get("posting_number", "N/A")
             shipment_date = order.get("shipment_date", "N/A")
             
@@ -804,139 +1762,41 @@ class OzonBot:
                 sku = str(product.get('sku', ''))
                 product_name = product.get('name', 'N/A')
                 
-                if sku in product_details:
-                    detailed_product = product_details[sku]
-                    color = self.extract_color_from_product(detailed_product, product_name)
-                    color_emoji = self.get_color_emoji(color.lower())
-                    type_emoji = self.get_product_type_emoji(product_name)
-                    
-                    # Объединяем эмодзи (тип + цвет)
-                    main_emoji = type_emoji
-                    if color_emoji:
-                        main_emoji = f"{type_emoji}{color_emoji}"
-                    
-                    order_emojis.append(main_emoji)
-                else:
-                    # Если нет деталей, используем только тип товара
-                    type_emoji = self.get_product_type_emoji(product_name)
-                    order_emojis.append(type_emoji)
+                # Если нет деталей, используется только тип товара
+                order_emojis.append(self._emoji_for(sku, product_name, product_details.get(sku)))
             
             # Обрезаем номер заказа для кнопки
-            short_number = posting_number[:12] + "..." if len(posting_number) > 15 else posting_number
+            short_number = _trunc(posting_number, 15, 12)
             
             # Добавляем эмодзи товаров в текст и кнопку
             emojis_text = "".join(order_emojis[:3]) if order_emojis else "📦"  # Максимум 3 эмодзи
             
-            text += f"{emojis_text} <b>{posting_number}</b>\n"
-            text += f"📅 {shipment_date}\n\n"
+            parts.append(f"{emojis_text} <b>{posting_number}</b>\n📅 {shipment_date}\n\n")
             
             # Кнопка для деталей заказа с эмодзи
-            keyboard.row(types.InlineKeyboardButton(
+            rows.append([IKB(
                 f"{emojis_text} {short_number}", 
                 callback_data=f"order_{posting_number}"
-            ))
+            )])
         
-        keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+        rows.append([IKB("🔙 Главное меню", callback_data="main_menu")])
+        keyboard = types.InlineKeyboardMarkup(keyboard=rows)
         
-        self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
+        self._send(chat_id, "".join(parts), reply_markup=keyboard, parse_mode="HTML")
+    
+    def show_packaging_orders(self, chat_id: int):
+        """Показать заказы на сборку"""
+        self._render_order_list(
+            chat_id, self.ozon_api.get_orders_for_packaging, "⏳ Загружаю заказы на сборку...",
+            "📦", "Заказы на сборку", "✅ Заказов на сборку не найдено"
+        )
     
     def show_delivery_orders(self, chat_id: int):
         """Показать заказы готовые к отгрузке"""
-        self.bot.send_message(chat_id, "⏳ Загружаю заказы готовые к отгрузке...")
-        
-        result = self.ozon_api.get_orders_awaiting_deliver(limit=20)
-        
-        if "error" in result:
-            error_text = f"❌ Ошибка при получении заказов: {result['error']}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
-            return
-        
-        orders = result.get("result", {}).get("postings", [])
-        
-        if not orders:
-            text = "✅ Заказов готовых к отгрузке не найдено"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            self.bot.send_message(chat_id, text, reply_markup=keyboard)
-            return
-        
-        text = f"🚚 <b>Готовые к отгрузке ({len(orders)})</b>\n\n"
-        keyboard = types.InlineKeyboardMarkup()
-        
-        # Получаем информацию о товарах для всех заказов
-        all_skus = []
-        for order in orders[:10]:
-            products = order.get("products", [])
-            for product in products:
-                sku = str(product.get('sku', ''))
-                if sku and sku != 'N/A':
-                    all_skus.append(sku)
-        
-        # Получаем детали товаров для эмодзи
-        product_details = {}
-        if all_skus:
-            try:
-                url = f"{self.ozon_api.base_url}/v3/product/info/list"
-                payload = {"sku": all_skus}
-                response = requests.post(url, headers=self.ozon_api.headers, json=payload)
-                response.raise_for_status()
-                detailed_result = response.json()
-                detailed_products = detailed_result.get("items", [])
-                
-                for product_detail in detailed_products:
-                    sku = str(product_detail.get('sku', ''))
-                    product_details[sku] = product_detail
-            except Exception as e:
-                logger.error(f"Ошибка при получении деталей товаров для списка заказов: {e}")
-        
-        for order in orders[:10]:  # Показываем первые 10
-            posting_number = order.get("posting_number", "N/A")
-            shipment_date = order.get("shipment_date", "N/A")
-            
-            # Получаем эмодзи товаров для этого заказа
-            order_emojis = []
-            products = order.get("products", [])
-            for product in products:
-                sku = str(product.get('sku', ''))
-                product_name = product.get('name', 'N/A')
-                
-                if sku in product_details:
-                    detailed_product = product_details[sku]
-                    color = self.extract_color_from_product(detailed_product, product_name)
-                    color_emoji = self.get_color_emoji(color.lower())
-                    type_emoji = self.get_product_type_emoji(product_name)
-                    
-                    # Объединяем эмодзи (тип + цвет)
-                    main_emoji = type_emoji
-                    if color_emoji:
-                        main_emoji = f"{type_emoji}{color_emoji}"
-                    
-                    order_emojis.append(main_emoji)
-                else:
-                    # Если нет деталей, используем только тип товара
-                    type_emoji = self.get_product_type_emoji(product_name)
-                    order_emojis.append(type_emoji)
-            
-            # Обрезаем номер заказа для кнопки
-            short_number = posting_number[:12] + "..." if len(posting_number) > 15 else posting_number
-            
-            # Добавляем эмодзи товаров в текст и кнопку
-            emojis_text = "".join(order_emojis[:3]) if order_emojis else "📦"  # Максимум 3 эмодзи
-            
-            text += f"{emojis_text} <b>{posting_number}</b>\n"
-            text += f"📅 {shipment_date}\n\n"
-            
-            # Кнопка для просмотра деталей заказа с эмодзи
-            keyboard.row(types.InlineKeyboardButton(
-                f"{emojis_text} {short_number}", 
-                callback_data=f"order_{posting_number}"
-            ))
-        
-        keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-        
-        self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
+        self._render_order_list(
+            chat_id, self.ozon_api.get_orders_awaiting_deliver, "⏳ Загружаю заказы готовые к отгрузке...",
+            "🚚", "Готовые к отгрузке", "✅ Заказов готовых к отгрузке не найдено"
+        )
     
     def show_order_details(self, chat_id: int, posting_number: str):
         """Показать детали заказа с фото товаров"""
@@ -946,138 +1806,88 @@ class OzonBot:
         
         if "error" in result:
             error_text = f"❌ Ошибка при получении деталей заказа: {result['error']}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
+            keyboard = self._back_to_main_kb
+            self._send(chat_id, error_text, reply_markup=keyboard)
             return
         
         order = result.get("result", {})
         
-        # Основная информация
-        text = f"📋 <b>Заказ {posting_number}</b>\n\n"
-        text += f"<b>Статус:</b> {FBS_STATUSES.get(order.get('status', ''), order.get('status', 'N/A'))}\n"
-        text += f"<b>Дата отгрузки:</b> {order.get('shipment_date', 'N/A')}\n"
-        text += f"<b>Дата доставки:</b> {order.get('delivering_date', 'N/A')}\n"
-        text += f"<b>Склад:</b> {order.get('warehouse', {}).get('name', 'N/A')}\n\n"
+        status = order.get("status", "")
+        
+        # Основная информация; строки из API экранируются, иначе Telegram отклонит HTML-разметку
+        parts = [f"📋 <b>Заказ {posting_number}</b>\n\n"]
+        parts.append(f"<b>Статус:</b> {FBS_STATUSES.get(status, status or 'N/A')}\n")
+        parts.append(f"<b>Дата отгрузки:</b> {order.get('shipment_date', 'N/A')}\n")
+        parts.append(f"<b>Дата доставки:</b> {order.get('delivering_date', 'N/A')}\n")
+        parts.append(f"<b>Склад:</b> {html.escape(str(order.get('warehouse', {}).get('name', 'N/A')))}\n\n")
         
         # Информация о покупателе
         customer = order.get("customer", {})
         if customer:
-            text += f"<b>Покупатель:</b> {customer.get('name', 'N/A')}\n"
-            text += f"<b>Телефон:</b> {customer.get('phone', 'N/A')}\n\n"
+            parts.append(f"<b>Покупатель:</b> {html.escape(str(customer.get('name', 'N/A')))}\n")
+            parts.append(f"<b>Телефон:</b> {html.escape(str(customer.get('phone', 'N/A')))}\n\n")
         
         # Товары
         products = order.get("products", [])
         product_emojis = []  # Инициализируем список эмодзи товаров
         if products:
-            text += f"<b>Товары ({len(products)}):</b>\n"
-            
-            # Получаем изображения товаров через правильный API
-            sku_list = [str(product.get('sku', '')) for product in products if product.get('sku')]
+            parts.append(f"<b>Товары ({len(products)}):</b>\n")
+            
+            # Получаем детальную информацию и изображения товаров (один запрос, с кешем)
+            # SKU приводятся к строке один раз и дальше используются как ключи
+            skus = [str(product.get('sku', '')) for product in products]
+            sku_list = [sku for sku in skus if sku]
+            product_details = self._fetch_product_details(sku_list) if sku_list else {}
+            # Первое изображение товара: images, иначе primary_image
             images_data = {}
-            if sku_list:
-                try:
-                    logger.debug(f"Запрашиваем детали товаров для получения изображений: {sku_list}")
-                    url = f"{self.ozon_api.base_url}/v3/product/info/list"
-                    payload = {"sku": sku_list}
-                    response = requests.post(url, headers=self.ozon_api.headers, json=payload)
-                    response.raise_for_status()
-                    detailed_result = response.json()
-                    detailed_products = detailed_result.get("items", [])
-                    
-                    for product_detail in detailed_products:
-                        sku = str(product_detail.get('sku', ''))
-                        # Получаем изображения из правильного поля
-                        images = product_detail.get('images', [])
-                        if not images:
-                            # Пробуем получить primary_image
-                            primary_images = product_detail.get('primary_image', [])
-                            if primary_images:
-                                images = primary_images
-                        
-                        if images and len(images) > 0:
-                            images_data[sku] = images[0]  # Берем первое изображение
-                            logger.debug(f"Найдено изображение для товара {sku}: {images[0]}")
-                        else:
-                            logger.debug(f"Нет изображений для товара {sku}")
-                            
-                except Exception as e:
-                    logger.error(f"Ошибка при получении изображений: {e}")
-            
-            # Используем уже полученную детальную информацию о товарах
-            product_details = {}
-            for product_detail in detailed_products:
-                sku = str(product_detail.get('sku', ''))
-                product_details[sku] = product_detail
+            for sku, product_detail in product_details.items():
+                images = product_detail.get('images') or product_detail.get('primary_image')
+                if images:
+                    images_data[sku] = images[0]
             
             # Собираем фото товаров для отправки в одном сообщении
             product_photos = []
             product_emojis = []
             
-            for i, product in enumerate(products[:5]):  # Показываем первые 5 товаров
+            for product, sku in zip(products[:5], skus):  # Показываем первые 5 товаров
                 product_name = product.get('name', 'N/A')
                 quantity = product.get('quantity', 1)
-                sku = str(product.get('sku', ''))
                 
-                # Получаем цвет товара и тип товара
-                detailed_product = product_details.get(sku, {})
-                color = self.extract_color_from_product(detailed_product, product_name)
-                color_emoji = self.get_color_emoji(color.lower())
-                type_emoji = self.get_product_type_emoji(product_name)
+                # Эмодзи типа и цвета товара
+                main_emoji = self._emoji_for(sku, product_name, product_details.get(sku, {}))
                 
                 # Обрезаем название товара
-                short_name = product_name[:30] + "..." if len(product_name) > 30 else product_name
+                short_name = html.escape(_trunc(product_name, 30))
                 
-                # Объединяем эмодзи (тип + цвет)
-                main_emoji = type_emoji
-                if color_emoji:
-                    main_emoji = f"{type_emoji}{color_emoji}"
-                
-                text += f"• {main_emoji} <b>{short_name}</b> x{quantity}\n"
+                parts.append(f"• {main_emoji} <b>{short_name}</b> x{quantity}\n")
                 
                 # Собираем фото и эмодзи для отправки
-                if sku and str(sku) in images_data:
-                    try:
-                        logger.debug(f"Добавляем фото для товара {sku}: {images_data[str(sku)]}")
-                        product_photos.append(images_data[str(sku)])
-                        product_emojis.append(main_emoji)
-                    except Exception as e:
-                        logger.error(f"Ошибка при обработке фото товара {sku}: {e}")
+                photo = images_data.get(sku)
+                if photo:
+                    product_photos.append(photo)
                 else:
                     logger.debug(f"Нет изображения для товара {sku}")
-                    product_emojis.append(main_emoji)
+                product_emojis.append(main_emoji)
             
-            # Отправляем все фото товаров в одном сообщении
+            # Фото отправляются в фоне: Telegram скачивает их по URL несколько секунд,
+            # а текст с клавиатурой уходит пользователю сразу
             if product_photos:
-                try:
-                    logger.debug(f"Отправляем {len(product_photos)} фото товаров в одном сообщении")
-                    self.bot.send_media_group(
-                        chat_id=chat_id,
-                        media=[types.InputMediaPhoto(photo) for photo in product_photos]
-                    )
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке группы фото: {e}")
-                    # Если не удалось отправить группу, отправляем по одному
-                    for photo in product_photos:
-                        try:
-                            self.bot.send_photo(chat_id=chat_id, photo=photo)
-                        except Exception as e:
-                            logger.error(f"Ошибка при отправке отдельного фото: {e}")
+                _executor.submit(self._send_media_group_safe, chat_id, product_photos)
             
             if len(products) > 5:
-                text += f"... и еще {len(products) - 5} товаров\n"
+                parts.append(f"... и еще {len(products) - 5} товаров\n")
         
         keyboard = types.InlineKeyboardMarkup()
         
         # Кнопка для сборки заказа (если статус awaiting_packaging)
-        if order.get("status") == "awaiting_packaging":
+        if status == "awaiting_packaging":
             keyboard.row(types.InlineKeyboardButton(
                 "📦 Собрать заказ", 
                 callback_data=f"ship_{posting_number}"
             ))
         
         # Кнопка для получения этикетки (если статус awaiting_deliver)
-        elif order.get("status") == "awaiting_deliver":
+        elif status == "awaiting_deliver":
             keyboard.row(types.InlineKeyboardButton(
                 "🏷️ Этикетка", 
                 callback_data=f"download_label_{posting_number}"
@@ -1095,7 +1905,7 @@ class OzonBot:
         
         keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
         
-        self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
+        self._send(chat_id, "".join(parts), reply_markup=keyboard, parse_mode="HTML")
     
     def ship_order(self, chat_id: int, posting_number: str, original_message_id: int = None):
         """Собрать заказ"""
@@ -1107,9 +1917,8 @@ class OzonBot:
         
         if "error" in result:
             error_text = f"❌ Ошибка при получении деталей заказа: {result['error']}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
+            keyboard = self._back_to_main_kb
+            self._send(chat_id, error_text, reply_markup=keyboard)
             return
         
         order = result.get("result", {})
@@ -1131,9 +1940,8 @@ class OzonBot:
         
         if "error" in ship_result:
             error_text = f"❌ Ошибка при сборке заказа: {ship_result['error']}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
+            keyboard = self._back_to_main_kb
+            self._send(chat_id, error_text, reply_markup=keyboard)
             return
         
         # Удаляем сообщение о процессе сборки
@@ -1143,34 +1951,14 @@ class OzonBot:
             logger.error(f"Ошибка при удалении сообщения о процессе: {e}")
         
         # Удаляем исходное сообщение с кнопкой "Собрать заказ"
-        if original_message_id:
-            try:
-                self.bot.delete_message(chat_id, original_message_id)
-            except Exception as e:
-                logger.error(f"Ошибка при удалении исходного сообщения: {e}")
-        
-        # Заказ успешно собран - показываем полную информацию о заказе с кнопками для собранного заказа
-        # Получаем детали заказа для отображения
-        order_result = self.ozon_api.get_order_details(posting_number)
-        
-        if "error" in order_result:
-            # Если не удалось получить детали, показываем простое сообщение об успехе
-            text = f"✅ <b>Заказ {posting_number} успешно собран!</b>\n\n"
-            text += f"Теперь заказ готов к отгрузке. Вы можете получить этикетку для печати."
-            
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton(
-                "🏷️ Этикетка", 
-                callback_data=f"download_label_{posting_number}"
-            ))
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            
-            self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
-            return
-        
-        order = order_result.get("result", {})
-        products = order.get("products", [])
+        if original_message_id:
+            try:
+                self.bot.delete_message(chat_id, original_message_id)
+            except Exception as e:
+                logger.error(f"Ошибка при удалении исходного сообщения: {e}")
         
+        # Заказ успешно собран - показываем информацию о заказе с кнопками для собранного заказа
+        # Состав отправления при сборке не меняется: используем товары, полученные до сборки
         # Формируем текст с информацией о заказе
         text = f"✅ <b>Заказ {posting_number} успешно собран!</b>\n\n"
         text += f"📦 <b>Статус:</b> Готов к отгрузке\n"
@@ -1182,7 +1970,7 @@ class OzonBot:
                 product_name = product.get('name', 'N/A')
                 quantity = product.get('quantity', 1)
                 # Обрезаем название товара
-                short_name = product_name[:40] + "..." if len(product_name) > 40 else product_name
+                short_name = _trunc(product_name, 40)
                 text += f"• {short_name} x{quantity}\n"
             
             if len(products) > 3:
@@ -1208,7 +1996,7 @@ class OzonBot:
         
         keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
         
-        self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
+        self._send(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
     
     def show_labels_menu(self, chat_id: int):
         """Показать меню этикеток"""
@@ -1227,13 +2015,14 @@ class OzonBot:
         """Получить этикетку для одного заказа"""
         self.bot.send_message(chat_id, f"⏳ Генерирую этикетку для {posting_number}...")
         
+        # Этикетка и детали заказа не зависят друг от друга - запрашиваем параллельно
+        order_future = _executor.submit(self.ozon_api.get_order_details, posting_number)
         result = self.ozon_api.get_package_label([posting_number])
         
         if "error" in result:
             error_text = f"❌ Ошибка при получении этикетки: {result['error']}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
+            keyboard = self._back_to_main_kb
+            self._send(chat_id, error_text, reply_markup=keyboard)
             return
         
         # Проверяем, что получили файл
@@ -1242,8 +2031,9 @@ class OzonBot:
             file_name = result.get("file_name", f"label_{posting_number}.pdf")
             
             # Получаем информацию о заказе для названия товара
-            order_result = self.ozon_api.get_order_details(posting_number)
+            order_result = order_future.result()
             product_name = "Товар"
+            products = []
             
             if not order_result.get("error") and order_result.get("result", {}).get("products"):
                 products = order_result["result"]["products"]
@@ -1251,38 +2041,34 @@ class OzonBot:
                     product_name = products[0].get('name', 'Товар')
             
             # Генерируем умную этикетку
-            smart_label = self.generate_smart_label(file_content, product_name, posting_number, products)
+            smart_label = self._render_label(file_content, product_name, posting_number, products)
             
             if smart_label:
                 # Отправляем умную этикетку как PNG
                 smart_label.name = f"smart_label_{posting_number}.png"
                 
-                self.bot.send_document(
+                self._send_doc(
                     chat_id=chat_id,
                     document=smart_label,
                     caption=f"🏷️ Умная этикетка для заказа {posting_number}\n📦 {product_name}"
                 )
             else:
                 # Если не удалось сгенерировать умную этикетку, отправляем обычную PDF
-                from io import BytesIO
-                pdf_file = BytesIO(file_content)
-                pdf_file.name = f"label_{posting_number}.pdf"
-                
-                self.bot.send_document(
+                # telebot принимает bytes напрямую: без копии тела ответа в BytesIO
+                self._send_doc(
                     chat_id=chat_id,
-                    document=pdf_file,
+                    document=file_content,
+                    visible_file_name=f"label_{posting_number}.pdf",
                     caption=f"🏷️ Этикетка для заказа {posting_number}"
                 )
             
             # Возвращаемся в меню
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            self.bot.send_message(chat_id, "✅ Этикетка отправлена!", reply_markup=keyboard)
+            keyboard = self._back_to_main_kb
+            self._send(chat_id, "✅ Этикетка отправлена!", reply_markup=keyboard)
         else:
             error_text = f"❌ Не удалось получить этикетку. Ответ API: {result}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
+            keyboard = self._back_to_main_kb
+            self._send(chat_id, error_text, reply_markup=keyboard)
     
     def get_single_barcode(self, chat_id: int, posting_number: str):
         """Получить штрихкод для одного заказа"""
@@ -1292,9 +2078,8 @@ class OzonBot:
         
         if "error" in result:
             error_text = f"❌ Ошибка при получении штрихкода: {result['error']}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
+            keyboard = self._back_to_main_kb
+            self._send(chat_id, error_text, reply_markup=keyboard)
             return
         
         # Проверяем, что получили файл
@@ -1302,26 +2087,21 @@ class OzonBot:
             file_content = result["file_content"]
             file_name = result.get("file_name", f"barcode_{posting_number}.png")
             
-            # Отправляем изображение штрихкода
-            from io import BytesIO
-            barcode_file = BytesIO(file_content)
-            barcode_file.name = file_name
-            
-            self.bot.send_document(
+            # Отправляем изображение штрихкода (bytes из ответа API без промежуточного BytesIO)
+            self._send_doc(
                 chat_id=chat_id,
-                document=barcode_file,
+                document=file_content,
+                visible_file_name=file_name,
                 caption=f"📊 Штрихкод для заказа {posting_number}"
             )
             
             # Возвращаемся в меню
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            self.bot.send_message(chat_id, "✅ Штрихкод отправлен!", reply_markup=keyboard)
+            keyboard = self._back_to_main_kb
+            self._send(chat_id, "✅ Штрихкод отправлен!", reply_markup=keyboard)
         else:
             error_text = f"❌ Не удалось получить штрихкод. Ответ API: {result}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
+            keyboard = self._back_to_main_kb
+            self._send(chat_id, error_text, reply_markup=keyboard)
     
     def show_order_products(self, chat_id: int, posting_number: str):
         """Показать товары заказа с цветными смайликами"""
@@ -1331,8 +2111,7 @@ class OzonBot:
         
         if "error" in result:
             error_text = f"❌ Ошибка при получении деталей заказа: {result['error']}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
             return
         
@@ -1341,33 +2120,23 @@ class OzonBot:
         
         if not products:
             text = f"📦 <b>Товары заказа {posting_number}</b>\n\n❌ Товары не найдены"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
             return
         
         # Получаем детальную информацию о товарах для цветов
-        sku_list = [str(product.get('sku', '')) for product in products if product.get('sku')]
+        sku_list = list(dict.fromkeys(str(product['sku']) for product in products if product.get('sku')))
         product_details = {}
         
         if sku_list:
-            try:
-                url = f"{self.ozon_api.base_url}/v3/product/info/list"
-                payload = {"sku": sku_list}
-                response = requests.post(url, headers=self.ozon_api.headers, json=payload)
-                response.raise_for_status()
-                detailed_result = response.json()
-                detailed_products = detailed_result.get("items", [])
-                
-                for p in detailed_products:
-                    sku = str(p.get('sku', ''))
-                    product_details[sku] = p
-            except Exception as e:
-                logger.error(f"Ошибка при получении деталей товаров: {e}")
+            detailed_products = self.ozon_api.get_product_info_list(sku=sku_list).get("items", [])
+            product_details = {str(p.get('sku', '')): p for p in detailed_products}
         
-        text = f"📦 <b>Товары заказа {posting_number}</b>\n\n"
+        parts = [f"📦 <b>Товары заказа {posting_number}</b>\n\n"]
         
-        keyboard = types.InlineKeyboardMarkup()
+        # Строки клавиатуры собираются списком и передаются в разметку одним объектом
+        IKB = types.InlineKeyboardButton
+        rows = []
         
         for i, product in enumerate(products):
             product_name = product.get('name', 'N/A')
@@ -1380,131 +2149,49 @@ class OzonBot:
             color_emoji = self.get_color_emoji(color.lower())
             
             # Обрезаем название товара для кнопки
-            short_name = product_name[:25] + "..." if len(product_name) > 25 else product_name
+            short_name = _trunc(product_name, 25)
             
-            text += f"{color_emoji} <b>{short_name}</b> x{quantity}\n"
+            parts.append(f"{color_emoji} <b>{short_name}</b> x{quantity}\n")
             
             # Добавляем кнопку для каждого товара
-            keyboard.row(types.InlineKeyboardButton(
+            rows.append([IKB(
                 f"{color_emoji} {short_name}", 
                 callback_data=f"product_{sku}_{posting_number}"
-            ))
+            )])
         
-        keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+        rows.append([IKB("🔙 Главное меню", callback_data="main_menu")])
+        keyboard = types.InlineKeyboardMarkup(keyboard=rows)
         
-        self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
+        self.bot.send_message(chat_id, "".join(parts), reply_markup=keyboard, parse_mode="HTML")
+    
+    def _emoji_for(self, sku: str, product_name: str, detail: Optional[Dict[str, Any]]) -> str:
+        """
+        Эмодзи товара для экранов заказов: тип + цвет
+        detail=None - деталей нет, только тип; результат с деталями кешируется по (sku, название)
+        """
+        if detail is None:
+            return _type_emoji(product_name)
+        
+        key = (sku, product_name)
+        emoji = self._emoji_cache.get(key)
+        if emoji is not None:
+            return emoji
+        
+        color = self.extract_color_from_product(detail, product_name)
+        emoji = f"{_type_emoji(product_name)}{_color_emoji(color.lower())}"
+        if detail:
+            if len(self._emoji_cache) >= Config.PRODUCT_CACHE_SIZE:
+                self._emoji_cache.clear()
+            self._emoji_cache[key] = emoji
+        return emoji
     
     def get_product_type_emoji(self, product_name: str) -> str:
         """Получить смайлик по типу товара"""
-        if not product_name or product_name == 'N/A':
-            return '📦'
-        
-        name_lower = product_name.lower()
-        
-        # Словарь типов товаров и их эмодзи
-        product_type_map = {
-            # Чехлы и аксессуары для телефонов
-            'чехол': '📱', 'чехлы': '📱', 'case': '📱', 'cover': '📱',
-            'защитн': '🛡️', 'защита': '🛡️', 'protection': '🛡️',
-            'стекло': '🪟', 'стекла': '🪟', 'glass': '🪟',
-            'пленка': '🎞️', 'пленки': '🎞️', 'film': '🎞️',
-            
-            # Игрушки
-            'игрушка': '🧸', 'игрушки': '🧸', 'toy': '🧸', 'toys': '🧸',
-            'кукла': '👸', 'куклы': '👸', 'doll': '👸', 'dolls': '👸',
-            'машинка': '🚗', 'машинки': '🚗', 'car': '🚗', 'cars': '🚗',
-            'мяч': '⚽', 'мячи': '⚽', 'ball': '⚽', 'balls': '⚽',
-            'конструктор': '🧱', 'конструкторы': '🧱', 'constructor': '🧱',
-            'пазл': '🧩', 'пазлы': '🧩', 'puzzle': '🧩', 'puzzles': '🧩',
-            
-            # Одежда
-            'футболка': '👕', 'футболки': '👕', 't-shirt': '👕', 'tshirt': '👕',
-            'рубашка': '👔', 'рубашки': '👔', 'shirt': '👔', 'shirts': '👔',
-            'платье': '👗', 'платья': '👗', 'dress': '👗', 'dresses': '👗',
-            'брюки': '👖', 'брюк': '👖', 'pants': '👖', 'trousers': '👖',
-            'куртка': '🧥', 'куртки': '🧥', 'jacket': '🧥', 'jackets': '🧥',
-            'кроссовки': '👟', 'кроссовок': '👟', 'sneakers': '👟', 'shoes': '👟',
-            'ботинки': '👢', 'ботинок': '👢', 'boots': '👢',
-            'шапка': '🧢', 'шапки': '🧢', 'hat': '🧢', 'cap': '🧢',
-            
-            # Электроника
-            'наушники': '🎧', 'наушник': '🎧', 'headphones': '🎧', 'earphones': '🎧',
-            'зарядка': '🔌', 'зарядки': '🔌', 'charger': '🔌', 'charging': '🔌',
-            'кабель': '🔌', 'кабели': '🔌', 'cable': '🔌', 'cables': '🔌',
-            'аккумулятор': '🔋', 'аккумуляторы': '🔋', 'battery': '🔋', 'batteries': '🔋',
-            'динамик': '🔊', 'динамики': '🔊', 'speaker': '🔊', 'speakers': '🔊',
-            'микрофон': '🎤', 'микрофоны': '🎤', 'microphone': '🎤', 'mic': '🎤',
-            
-            # Дом и сад
-            'лампа': '💡', 'лампы': '💡', 'lamp': '💡', 'light': '💡',
-            'свеча': '🕯️', 'свечи': '🕯️', 'candle': '🕯️', 'candles': '🕯️',
-            'ваза': '🏺', 'вазы': '🏺', 'vase': '🏺', 'vases': '🏺',
-            'горшок': '🪴', 'горшки': '🪴', 'pot': '🪴', 'pots': '🪴',
-            'ковер': '🪞', 'ковры': '🪞', 'carpet': '🪞', 'rug': '🪞',
-            
-            # Спорт
-            'гантели': '🏋️', 'гантель': '🏋️', 'dumbbell': '🏋️', 'weights': '🏋️',
-            'скакалка': '🪢', 'скакалки': '🪢', 'rope': '🪢', 'jump rope': '🪢',
-            'велосипед': '🚲', 'велосипеды': '🚲', 'bicycle': '🚲', 'bike': '🚲',
-            'ролики': '🛼', 'ролик': '🛼', 'skates': '🛼', 'skate': '🛼',
-            
-            # Книги и канцелярия
-            'книга': '📚', 'книги': '📚', 'book': '📚', 'books': '📚',
-            'тетрадь': '📓', 'тетради': '📓', 'notebook': '📓', 'notebooks': '📓',
-            'ручка': '✏️', 'ручки': '✏️', 'pen': '✏️', 'pens': '✏️',
-            'карандаш': '✏️', 'карандаши': '✏️', 'pencil': '✏️', 'pencils': '✏️',
-            'маркер': '🖍️', 'маркеры': '🖍️', 'marker': '🖍️', 'markers': '🖍️',
-            
-            # Красота и здоровье
-            'крем': '🧴', 'кремы': '🧴', 'cream': '🧴', 'creams': '🧴',
-            'шампунь': '🧴', 'шампуни': '🧴', 'shampoo': '🧴', 'shampoos': '🧴',
-            'мыло': '🧼', 'мыла': '🧼', 'soap': '🧼', 'soaps': '🧼',
-            'зубная': '🦷', 'зубной': '🦷', 'tooth': '🦷', 'dental': '🦷',
-            'щетка': '🪥', 'щетки': '🪥', 'brush': '🪥', 'brushes': '🪥',
-            
-            # Кухня
-            'тарелка': '🍽️', 'тарелки': '🍽️', 'plate': '🍽️', 'plates': '🍽️',
-            'чашка': '☕', 'чашки': '☕', 'cup': '☕', 'cups': '☕',
-            'ложка': '🥄', 'ложки': '🥄', 'spoon': '🥄', 'spoons': '🥄',
-            'вилка': '🍴', 'вилки': '🍴', 'fork': '🍴', 'forks': '🍴',
-            'нож': '🔪', 'ножи': '🔪', 'knife': '🔪', 'knives': '🔪',
-            
-            # Автомобиль
-            'автомобиль': '🚗', 'автомобили': '🚗', 'car': '🚗', 'cars': '🚗',
-            'машина': '🚗', 'машины': '🚗', 'auto': '🚗', 'vehicle': '🚗',
-            'шина': '🛞', 'шины': '🛞', 'tire': '🛞', 'tyre': '🛞',
-            'диск': '🛞', 'диски': '🛞', 'wheel': '🛞', 'rim': '🛞',
-        }
-        
-        # Ищем совпадения в названии товара
-        for keyword, emoji in product_type_map.items():
-            if keyword in name_lower:
-                return emoji
-        
-        return '📦'  # По умолчанию коробка
+        return _type_emoji(product_name)
     
     def get_color_emoji(self, color: str) -> str:
         """Получить смайлик по цвету товара"""
-        color_map = {
-            'красный': '🔴', 'red': '🔴',
-            'синий': '🔵', 'blue': '🔵',
-            'зеленый': '🟢', 'green': '🟢',
-            'желтый': '🟡', 'yellow': '🟡',
-            'оранжевый': '🟠', 'orange': '🟠',
-            'фиолетовый': '🟣', 'purple': '🟣',
-            'розовый': '🩷', 'pink': '🩷',
-            'фуксия': '🟣', 'fuchsia': '🟣',
-            'коричневый': '🟤', 'brown': '🟤',
-            'черный': '⚫', 'black': '⚫',
-            'белый': '⚪', 'white': '⚪',
-            'серый': '🔘', 'gray': '🔘', 'grey': '🔘',
-            'золотой': '🟨', 'gold': '🟨',
-            'серебряный': '⚪', 'silver': '⚪',
-            'радужный': '🌈', 'радужная': '🌈', 'радужное': '🌈', 'rainbow': '🌈',
-            'разноцветный': '🌈', 'разноцветная': '🌈', 'разноцветное': '🌈', 'multicolor': '🌈'
-        }
-        
-        return color_map.get(color, '')  # Возвращаем пустую строку, если цвет не найден
+        return _color_emoji(color)
     
     def extract_color_from_product(self, product_data: dict, product_name: str) -> str:
         """Извлечь цвет товара из API или из названия"""
@@ -1517,51 +2204,7 @@ class OzonBot:
         if not product_name or product_name == 'N/A':
             return 'N/A'
         
-        name_lower = product_name.lower()
-        
-        # Список цветов для поиска (учитываем е/ё, й/и)
-        color_patterns = {
-            'красн': 'красный',
-            'син': 'синий', 
-            'голуб': 'голубой',
-            'зелен': 'зеленый',
-            'желт': 'желтый',
-            'оранж': 'оранжевый',
-            'фиолет': 'фиолетовый',
-            'розов': 'розовый',
-            'фукси': 'фуксия',
-            'коричнев': 'коричневый',
-            'черн': 'черный',
-            'бел': 'белый',
-            'сер': 'серый',
-            'золот': 'золотой',
-            'серебр': 'серебряный',
-            'радужн': 'радужный',
-            'разноцветн': 'разноцветный',
-            'multicolor': 'разноцветный',
-            'rainbow': 'радужный',
-            'red': 'красный',
-            'blue': 'синий',
-            'green': 'зеленый',
-            'yellow': 'желтый',
-            'orange': 'оранжевый',
-            'purple': 'фиолетовый',
-            'pink': 'розовый',
-            'fuchsia': 'фуксия',
-            'brown': 'коричневый',
-            'black': 'черный',
-            'white': 'белый',
-            'gray': 'серый',
-            'grey': 'серый',
-            'gold': 'золотой',
-            'silver': 'серебряный'
-        }
-        
-        for pattern, color in color_patterns.items():
-            if pattern in name_lower:
-                return color
-        
-        return 'N/A'
+        return _extract_color_from_name(product_name)
     
     def show_all_products_menu(self, chat_id: int, page: int = 0):
         """Показать все товары на продаже"""
@@ -1571,8 +2214,7 @@ class OzonBot:
         
         if "error" in result:
             error_text = f"❌ Ошибка при получении товаров: {result['error']}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
             return
         
@@ -1580,8 +2222,7 @@ class OzonBot:
         
         if not products:
             text = "📦 <b>Все товары</b>\n\n❌ Товары не найдены"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
             return
         
@@ -1592,35 +2233,30 @@ class OzonBot:
         end_idx = min(start_idx + items_per_page, len(products))
         page_products = products[start_idx:end_idx]
         
-        text = f"📦 <b>Все товары на продаже ({len(products)})</b>\n"
-        text += f"📄 Страница {page + 1} из {total_pages}\n\n"
+        parts = [f"📦 <b>Все товары на продаже ({len(products)})</b>\n"]
+        parts.append(f"📄 Страница {page + 1} из {total_pages}\n\n")
         
-        keyboard = types.InlineKeyboardMarkup()
+        # Строки клавиатуры собираются списком и передаются в разметку одним объектом
+        IKB = types.InlineKeyboardButton
+        rows = []
         
         # Получаем детальную информацию о товарах на текущей странице
-        product_ids = [int(p.get('product_id', 0)) for p in page_products if p.get('product_id')]
+        product_ids = list(dict.fromkeys(int(p['product_id']) for p in page_products if p.get('product_id')))
         
         if product_ids:
-            url = f"{self.ozon_api.base_url}/v3/product/info/list"
-            payload = {
-                "product_id": product_ids
-            }
+            detailed_products = self.ozon_api.get_product_info_list(product_id=product_ids).get("items", [])
             
-            try:
-                response = requests.post(url, headers=self.ozon_api.headers, json=payload)
-                response.raise_for_status()
-                detailed_result = response.json()
-                detailed_products = detailed_result.get("items", [])
-                
-                # Создаем словарь для быстрого поиска
-                product_details = {str(p.get('id', '')): p for p in detailed_products}
-                
-            except Exception as e:
-                logger.error(f"Ошибка при получении деталей товаров: {e}")
-                product_details = {}
+            # Создаем словарь для быстрого поиска
+            product_details = {str(p.get('id', '')): p for p in detailed_products}
         else:
             product_details = {}
         
+        # Карточки следующей страницы загружаются в фоне и кладутся в кеш OzonAPI,
+        # поэтому переход на неё не ждёт запроса к API
+        next_ids = [p.get('product_id') for p in products[end_idx:end_idx + items_per_page] if p.get('product_id')]
+        if next_ids:
+            _executor.submit(self.ozon_api.get_product_info_list, product_id=next_ids)
+        
         # Добавляем товары на текущей странице
         for product in page_products:
             product_id = str(product.get('product_id', ''))
@@ -1639,27 +2275,28 @@ class OzonBot:
                 main_emoji = f"{type_emoji}{color_emoji}"
             
             # Обрезаем название для кнопки
-            short_name = product_name[:20] + "..." if len(product_name) > 20 else product_name
+            short_name = _trunc(product_name, 20)
             button_text = f"{main_emoji} {short_name}"
             
-            keyboard.row(types.InlineKeyboardButton(
+            rows.append([IKB(
                 button_text,
                 callback_data=f"item_detail_{product_id}"
-            ))
+            )])
         
         # Добавляем навигацию
         nav_buttons = []
         if page > 0:
-            nav_buttons.append(types.InlineKeyboardButton("⬅️", callback_data=f"products_page_{page-1}"))
+            nav_buttons.append(IKB("⬅️", callback_data=f"products_page_{page-1}"))
         if page < total_pages - 1:
-            nav_buttons.append(types.InlineKeyboardButton("➡️", callback_data=f"products_page_{page+1}"))
+            nav_buttons.append(IKB("➡️", callback_data=f"products_page_{page+1}"))
         
         if nav_buttons:
-            keyboard.row(*nav_buttons)
+            rows.append(nav_buttons)
         
-        keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+        rows.append([IKB("🔙 Главное меню", callback_data="main_menu")])
+        keyboard = types.InlineKeyboardMarkup(keyboard=rows)
         
-        self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
+        self.bot.send_message(chat_id, "".join(parts), reply_markup=keyboard, parse_mode="HTML")
     
     def show_products_by_status(self, chat_id: int, status: str):
         """Показать товары по статусу заказа"""
@@ -1673,8 +2310,7 @@ class OzonBot:
         
         if "error" in result:
             error_text = f"❌ Ошибка при получении заказов: {result['error']}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
             return
         
@@ -1682,13 +2318,12 @@ class OzonBot:
         
         if not orders:
             text = f"📦 <b>Товары {status_text}</b>\n\n❌ Заказы не найдены"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
             return
         
-        # Собираем все товары из всех заказов
-        all_products = {}
+        # Собираем все товары из всех заказов (название и цвет - из первого заказа с этим SKU)
+        all_products = defaultdict(lambda: {'name': '', 'total_quantity': 0, 'color': '', 'orders': []})
         for order in orders:
             posting_number = order.get("posting_number", "")
             products = order.get("products", [])
@@ -1696,26 +2331,20 @@ class OzonBot:
             for product in products:
                 sku = product.get('sku', '')
                 if sku:
-                    product_name = product.get('name', 'N/A')
-                    quantity = product.get('quantity', 1)
-                    color = product.get('color', '').lower()
-                    
-                    if sku not in all_products:
-                        all_products[sku] = {
-                            'name': product_name,
-                            'total_quantity': 0,
-                            'color': color,
-                            'orders': []
-                        }
-                    
-                    all_products[sku]['total_quantity'] += quantity
-                    all_products[sku]['orders'].append(posting_number)
+                    info = all_products[sku]
+                    if not info['orders']:
+                        info['name'] = product.get('name', 'N/A')
+                        info['color'] = product.get('color', '').lower()
+                    info['total_quantity'] += product.get('quantity', 1)
+                    info['orders'].append(posting_number)
         
-        text = f"📦 <b>Товары {status_text}</b>\n\n"
+        parts = [f"📦 <b>Товары {status_text}</b>\n\n"]
         
-        keyboard = types.InlineKeyboardMarkup()
+        # Строки клавиатуры собираются списком и передаются в разметку одним объектом
+        IKB = types.InlineKeyboardButton
+        rows = []
         
-        for sku, product_info in list(all_products.items())[:10]:  # Показываем первые 10 товаров
+        for sku, product_info in islice(all_products.items(), 10):  # Показываем первые 10 товаров
             product_name = product_info['name']
             total_quantity = product_info['total_quantity']
             color = product_info['color']
@@ -1724,60 +2353,53 @@ class OzonBot:
             color_emoji = self.get_color_emoji(color)
             
             # Обрезаем название товара для кнопки
-            short_name = product_name[:20] + "..." if len(product_name) > 20 else product_name
+            short_name = _trunc(product_name, 20)
             
-            text += f"{color_emoji} <b>{short_name}</b> x{total_quantity}\n"
+            parts.append(f"{color_emoji} <b>{short_name}</b> x{total_quantity}\n")
             
             # Добавляем кнопку для каждого товара
-            keyboard.row(types.InlineKeyboardButton(
+            rows.append([IKB(
                 f"{color_emoji} {short_name}", 
                 callback_data=f"product_info_{sku}"
-            ))
+            )])
         
         if len(all_products) > 10:
-            text += f"\n... и еще {len(all_products) - 10} товаров"
+            parts.append(f"\n... и еще {len(all_products) - 10} товаров")
         
-        keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+        rows.append([IKB("🔙 Главное меню", callback_data="main_menu")])
+        keyboard = types.InlineKeyboardMarkup(keyboard=rows)
         
-        self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
+        self.bot.send_message(chat_id, "".join(parts), reply_markup=keyboard, parse_mode="HTML")
     
     def show_product_details(self, chat_id: int, product_id: str):
         """Показать детали товара"""
         self.bot.send_message(chat_id, f"⏳ Загружаю детали товара {product_id}...")
         
-        # Получаем детали товара через правильный API
-        url = f"{self.ozon_api.base_url}/v3/product/info/list"
-        payload = {
-            "product_id": [int(product_id)]
-        }
-        
         try:
-            response = requests.post(url, headers=self.ozon_api.headers, json=payload)
-            response.raise_for_status()
-            
-            # Логируем ответ для отладки
-            logger.debug(f"Ответ API для товара {product_id}: {response.status_code}")
-            logger.debug(f"Содержимое ответа: {response.text[:500]}...")
+            # Получаем детали товара через правильный API (с кешем карточек)
+            result = self.ozon_api.get_product_info_list(product_id=[int(product_id)])
             
-            result = response.json()
+            if "error" in result:
+                text = f"❌ Ошибка при получении товара: {result['error']}"
+                keyboard = self._back_to_main_kb
+                self.bot.send_message(chat_id, text, reply_markup=keyboard)
+                return
             
-            # Логируем тип и содержимое result
-            logger.debug(f"Тип result: {type(result)}")
-            logger.debug(f"Содержимое result: {result}")
+            # Логируем тип и содержимое result (%-форматирование: строка собирается только при DEBUG)
+            logger.debug("Тип result: %s", type(result))
+            logger.debug("Содержимое result: %.500r", result)
             
             # Проверяем, что result - это словарь
             if not isinstance(result, dict):
                 logger.error(f"Неожиданный тип результата: {type(result)}, значение: {result}")
                 text = f"📦 <b>Товар {product_id}</b>\n\n❌ Ошибка формата ответа API"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
                 return
             
             if not result.get("items"):
                 text = f"📦 <b>Товар {product_id}</b>\n\n❌ Товар не найден"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
                 return
             
@@ -1785,8 +2407,7 @@ class OzonBot:
             items = result.get("items", [])
             if not items or len(items) == 0:
                 text = f"📦 <b>Товар {product_id}</b>\n\n❌ Товар не найден"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
                 return
             
@@ -1796,52 +2417,45 @@ class OzonBot:
             if not isinstance(product, dict):
                 logger.error(f"Product не является словарем: {type(product)}, значение: {product}")
                 text = f"📦 <b>Товар {product_id}</b>\n\n❌ Ошибка формата данных товара"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
                 return
             
-            logger.debug(f"Product получен успешно: {type(product)}")
-            logger.debug(f"Product содержимое: {product}")
+            logger.debug("Product получен успешно: %s", type(product))
+            logger.debug("Product содержимое: %r", product)
             
-            # Безопасно получаем поля товара
-            product_name = product.get('name', 'N/A') if isinstance(product, dict) else 'N/A'
-            logger.debug(f"product_name получен: {product_name}")
+            # Поля товара (product уже проверен на dict выше)
+            product_name = product.get('name', 'N/A')
+            logger.debug("product_name получен: %s", product_name)
             
-            sku = product.get('sku', 'N/A') if isinstance(product, dict) else 'N/A'
-            logger.debug(f"sku получен: {sku}")
+            sku = product.get('sku', 'N/A')
+            logger.debug("sku получен: %s", sku)
             
-            offer_id = product.get('offer_id', 'N/A') if isinstance(product, dict) else 'N/A'
-            logger.debug(f"offer_id получен: {offer_id}")
+            offer_id = product.get('offer_id', 'N/A')
+            logger.debug("offer_id получен: %s", offer_id)
             
             # Получаем цвет из характеристик
             color = "N/A"
-            if isinstance(product, dict):
-                color_image = product.get('color_image', [])
-                if color_image:
-                    color = color_image[0] if isinstance(color_image, list) else str(color_image)
+            color_image = product.get('color_image', [])
+            if color_image:
+                color = color_image[0] if isinstance(color_image, list) else str(color_image)
             
             # Получаем цену
-            price = "N/A"
-            if isinstance(product, dict):
-                if 'marketing_price' in product:
-                    price = product['marketing_price']
-                elif 'price' in product:
-                    price = product['price']
+            price = product.get('marketing_price', product.get('price', 'N/A'))
             
             # Получаем остатки
             stock = "N/A"
-            if isinstance(product, dict) and 'stocks' in product and product['stocks']:
-                stocks_data = product['stocks']
+            stocks_data = product.get('stocks')
+            if stocks_data:
                 if isinstance(stocks_data, dict) and 'stocks' in stocks_data:
                     # Новый формат API
                     stock_items = stocks_data['stocks']
                     if isinstance(stock_items, list):
-                        total_stock = sum(stock_item.get('present', 0) for stock_item in stock_items)
+                        total_stock = sum(_GET_PRESENT(item) for item in stock_items if 'present' in item)
                         stock = str(total_stock)
                 elif isinstance(stocks_data, list):
                     # Старый формат API
-                    total_stock = sum(stock_item.get('present', 0) for stock_item in stocks_data)
+                    total_stock = sum(_GET_PRESENT(item) for item in stocks_data if 'present' in item)
                     stock = str(total_stock)
             
             # Получаем эмодзи для типа товара и цвета
@@ -1854,34 +2468,22 @@ class OzonBot:
                 main_emoji = f"{type_emoji}{color_emoji}"
             
             # Получаем дополнительную информацию
-            old_price = "N/A"
-            currency = "RUB"
+            old_price = product.get('old_price', 'N/A')
+            currency = product.get('currency_code', 'RUB')
             status = "N/A"
-            created_at = "N/A"
-            images = []
-            
-            if isinstance(product, dict):
-                old_price = product.get('old_price', 'N/A')
-                currency = product.get('currency_code', 'RUB')
-                status_info = product.get('statuses', {})
-                if isinstance(status_info, dict):
-                    status = status_info.get('status_name', 'N/A')
-                created_at = product.get('created_at', 'N/A')
-                if created_at != 'N/A':
-                    try:
-                        from datetime import datetime
-                        dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                        created_at = dt.strftime('%d.%m.%Y %H:%M')
-                    except:
-                        pass
-                
-                # Получаем изображения товара
-                images = product.get('images', [])
-                if not images:
-                    # Пробуем получить primary_image
-                    primary_images = product.get('primary_image', [])
-                    if primary_images:
-                        images = primary_images
+            status_info = product.get('statuses', {})
+            if isinstance(status_info, dict):
+                status = status_info.get('status_name', 'N/A')
+            created_at = product.get('created_at', 'N/A')
+            if created_at != 'N/A':
+                try:
+                    dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+                    created_at = dt.strftime('%d.%m.%Y %H:%M')
+                except:
+                    pass
+            
+            # Получаем изображения товара (images, иначе primary_image)
+            images = product.get('images') or product.get('primary_image') or []
             
             text = f"{main_emoji} <b>Товар {product_id}</b>\n\n"
             text += f"{main_emoji} <b>Название:</b> {product_name}\n"
@@ -1902,83 +2504,49 @@ class OzonBot:
             keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
             
             # Отправляем сообщение с информацией и фотографиями в одном сообщении
-            if images and len(images) > 0:
+            if images and len(images) == 1:
+                # Одно фото: подпись и клавиатура уходят одним запросом
                 try:
-                    # Создаем медиагруппу с фотографиями
-                    media_group = []
-                    
-                    # Первая фотография с текстом
-                    first_photo = types.InputMediaPhoto(
-                        media=images[0],
-                        caption=text,
-                        parse_mode="HTML"
-                    )
-                    media_group.append(first_photo)
-                    
-                    # Остальные фотографии без подписей (максимум 9, так как первая уже есть)
-                    for image_url in images[1:10]:  # До 10 фотографий всего
-                        media_group.append(types.InputMediaPhoto(media=image_url))
-                    
-                    # Отправляем медиагруппу
-                    sent_messages = self.bot.send_media_group(chat_id, media_group)
-                    
-                    # Добавляем клавиатуру к первому сообщению
-                    if sent_messages and len(sent_messages) > 0:
-                        try:
-                            self.bot.edit_message_reply_markup(
-                                chat_id=chat_id,
-                                message_id=sent_messages[0].message_id,
-                                reply_markup=keyboard
-                            )
-                        except Exception as e:
-                            logger.error(f"Ошибка при добавлении клавиатуры: {e}")
-                            # Если не удалось добавить клавиатуру, отправляем отдельное сообщение с кнопками
-                            self.bot.send_message(chat_id, "Выберите действие:", reply_markup=keyboard)
-                        
+                    self.bot.send_photo(chat_id, images[0], caption=text, parse_mode="HTML", reply_markup=keyboard)
                 except Exception as e:
-                    logger.error(f"Ошибка при отправке медиагруппы: {e}")
-                    # Если не удалось отправить медиагруппу, отправляем обычное сообщение
+                    logger.error(f"Ошибка при отправке фото товара: {e}")
                     self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
+            elif images:
+                # Несколько фото: медиагруппа и клавиатура отправляются в фоне
+                _executor.submit(self._send_product_gallery, chat_id, images, text, keyboard)
             else:
                 # Если нет фотографий, отправляем только текст
                 self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
-                logger.debug(f"Нет изображений для товара {product_id}")
+                logger.debug("Нет изображений для товара %s", product_id)
             
         except Exception as e:
             logger.error(f"Ошибка при получении товара: {e}")
             text = f"❌ Ошибка при получении товара: {e}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, text, reply_markup=keyboard)
     
     def get_product_barcode_by_id(self, chat_id: int, product_id: str):
         """Получить штрихкод товара с красивым изображением"""
         self.bot.send_message(chat_id, f"⏳ Получаю штрихкод для товара {product_id}...")
         
-        # Сначала пробуем найти товар по SKU
-        url = f"{self.ozon_api.base_url}/v3/product/info/list"
-        payload = {
-            "sku": [int(product_id)]
-        }
-        
         try:
-            response = requests.post(url, headers=self.ozon_api.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
+            # Поиск по SKU и по product_id идут параллельно; приоритет у SKU, как и раньше
+            by_sku = _executor.submit(self.ozon_api.get_product_info_list, sku=[int(product_id)])
+            by_product_id = _executor.submit(self.ozon_api.get_product_info_list, product_id=[int(product_id)])
             
-            # Если не найден по SKU, пробуем по product_id
-            if not result.get("items"):
-                payload = {
-                    "product_id": [int(product_id)]
-                }
-                response = requests.post(url, headers=self.ozon_api.headers, json=payload)
-                response.raise_for_status()
-                result = response.json()
+            result = by_sku.result()
+            if result.get("items"):
+                by_product_id.cancel()
+            else:
+                # Если не найден по SKU, берём результат по product_id
+                result = by_product_id.result()
+            
+            if "error" in result:
+                raise requests.exceptions.RequestException(result["error"])
             
             if not result.get("items"):
                 text = f"📊 <b>Штрихкод товара {product_id}</b>\n\n❌ Товар не найден ни по SKU, ни по Product ID"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
                 return
             
@@ -1989,15 +2557,15 @@ class OzonBot:
             
             if not barcodes:
                 text = f"📊 <b>Штрихкод товара {product_id}</b>\n\n❌ Штрихкоды не найдены"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
                 return
             
             # Генерируем изображения для каждого штрихкода
-            for i, barcode in enumerate(barcodes, 1):
-                barcode_img = self.generate_barcode_image(barcode, product_name, sku, 1, "")
-                
+            barcode_images = self._render_barcodes(
+                "generate_barcode_image", [(barcode, product_name, sku, 1, "") for barcode in barcodes]
+            )
+            for i, (barcode, barcode_img) in enumerate(zip(barcodes, barcode_images), 1):
                 if barcode_img:
                     # Отправляем изображение штрихкода
                     barcode_img.name = f"barcode_{product_id}_{i}.png"
@@ -2018,125 +2586,150 @@ class OzonBot:
                     self.bot.send_message(chat_id, text, parse_mode="HTML")
             
             # Возвращаемся в меню
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, "✅ Штрихкоды отправлены!", reply_markup=keyboard)
             
         except Exception as e:
             logger.error(f"Ошибка при получении штрихкода: {e}")
             text = f"❌ Ошибка при получении штрихкода: {e}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, text, reply_markup=keyboard)
     
     def get_order_barcodes(self, chat_id: int, posting_number: str):
         """Получить штрихкоды всех товаров заказа"""
         self.bot.send_message(chat_id, f"⏳ Получаю штрихкоды для всех товаров заказа {posting_number}...")
         
-        # Получаем детали заказа
-        result = self.ozon_api.get_order_details(posting_number)
-        
-        if "error" in result:
-            error_text = f"❌ Ошибка при получении деталей заказа: {result['error']}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-            self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
-            return
-        
-        order = result.get("result", {})
+        # Заказ и карточки его товаров могли быть получены недавно (например, для комбинированного файла)
+        state = self._order_state.get(posting_number)
+        if state is not None:
+            order, products_by_sku = state
+        else:
+            # Получаем детали заказа
+            result = self.ozon_api.get_order_details(posting_number)
+            
+            if "error" in result:
+                error_text = f"❌ Ошибка при получении деталей заказа: {result['error']}"
+                keyboard = self._back_to_main_kb
+                self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
+                return
+            
+            order = result.get("result", {})
         products = order.get("products", [])
         
         if not products:
             text = f"📊 <b>Штрихкоды заказа {posting_number}</b>\n\n❌ Товары не найдены"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
             return
         
         # Получаем детальную информацию о товарах для получения штрихкодов
-        sku_list = [str(product.get('sku', '')) for product in products if product.get('sku')]
+        sku_list = list(dict.fromkeys(str(product['sku']) for product in products if product.get('sku')))
         
         if not sku_list:
             text = f"📊 <b>Штрихкоды заказа {posting_number}</b>\n\n❌ SKU товаров не найдены"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
             return
         
         try:
-            url = f"{self.ozon_api.base_url}/v3/product/info/list"
-            payload = {"sku": sku_list}
-            response = requests.post(url, headers=self.ozon_api.headers, json=payload)
-            response.raise_for_status()
-            detailed_result = response.json()
-            detailed_products = detailed_result.get("items", [])
+            if state is None:
+                detailed_result = self.ozon_api.get_product_info_list(sku=sku_list)
+                if "error" in detailed_result:
+                    raise requests.exceptions.RequestException(detailed_result["error"])
+                detailed_products = detailed_result.get("items", [])
+                
+                # Создаем словарь для быстрого поиска товаров по SKU
+                products_by_sku = {str(p['sku']): p for p in detailed_products if p.get('sku')}
+                self._order_state.set(posting_number, (order, products_by_sku))
+            
+            # SKU каждой позиции приводим к строке один раз и сразу находим её карточку
+            order_items = [
+                (product, sku, products_by_sku.get(sku))
+                for product in products
+                for sku in (str(product.get('sku', '')),)
+            ]
             
-            # Создаем словарь для быстрого поиска товаров по SKU
-            products_by_sku = {str(p.get('sku', '')): p for p in detailed_products}
+            # Генерируем изображения всех штрихкодов заказа заранее (параллельно)
+            jobs = [
+                (barcode, product.get('name', 'N/A'), sku, product.get('quantity', 1), posting_number)
+                for product, sku, detailed_product in order_items
+                if detailed_product is not None
+                for barcode in detailed_product.get('barcodes', [])
+            ]
+            rendered = iter(zip(jobs, self._render_barcodes("generate_barcode_image", jobs)))
             
-            # Генерируем штрихкоды для каждого товара
+            # Сообщения копятся, чтобы итог и клавиатура ушли вместе с последним из них
+            outgoing = []
             barcodes_sent = 0
             
-            for product in products:
-                sku = str(product.get('sku', ''))
+            for product, sku, detailed_product in order_items:
+                if detailed_product is None:
+                    continue
                 product_name = product.get('name', 'N/A')
                 quantity = product.get('quantity', 1)
+                barcodes = detailed_product.get('barcodes', [])
                 
-                if sku in products_by_sku:
-                    detailed_product = products_by_sku[sku]
-                    barcodes = detailed_product.get('barcodes', [])
-                    
-                    if barcodes:
-                        # Генерируем изображения для каждого штрихкода
-                        for i, barcode in enumerate(barcodes, 1):
-                            barcode_img = self.generate_barcode_image(barcode, product_name, sku, quantity, posting_number)
-                            
-                            if barcode_img:
-                                # Отправляем изображение штрихкода
-                                barcode_img.name = f"barcode_{posting_number}_{sku}_{i}.png"
-                                
-                                caption = f"📊 Штрихкод {i} для товара из заказа {posting_number}\n📦 {product_name}\n🏷️ SKU: {sku}\n📊 Штрихкод: {barcode}\n📦 Количество: {quantity}"
-                                self.bot.send_document(
-                                    chat_id=chat_id,
-                                    document=barcode_img,
-                                    caption=caption
-                                )
-                                barcodes_sent += 1
-                            else:
-                                # Если не удалось сгенерировать изображение, отправляем текстом
-                                text = f"📊 <b>Штрихкод {i} товара из заказа {posting_number}</b>\n\n"
-                                text += f"📦 <b>Название:</b> {product_name}\n"
-                                text += f"🏷️ <b>SKU:</b> {sku}\n"
-                                text += f"📊 <b>Штрихкод:</b> {barcode}\n"
-                                text += f"📦 <b>Количество:</b> {quantity}\n"
-                                
-                                self.bot.send_message(chat_id, text, parse_mode="HTML")
-                                barcodes_sent += 1
-                    else:
-                        # Если нет штрихкодов
-                        text = f"📊 <b>Товар без штрихкода</b>\n\n"
-                        text += f"📦 <b>Название:</b> {product_name}\n"
-                        text += f"🏷️ <b>SKU:</b> {sku}\n"
-                        text += f"📦 <b>Количество:</b> {quantity}\n"
-                        text += f"❌ <b>Штрихкоды не найдены</b>\n"
+                if barcodes:
+                    # Генерируем изображения для каждого штрихкода
+                    for i, barcode in enumerate(barcodes, 1):
+                        job, barcode_img = next(rendered)
                         
-                        self.bot.send_message(chat_id, text, parse_mode="HTML")
-            
-            # Возвращаемся в меню
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 К заказу", callback_data=f"order_{posting_number}"))
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                        if barcode_img:
+                            # Отправляем изображение штрихкода
+                            barcode_img.name = f"barcode_{posting_number}_{sku}_{i}.png"
+                            
+                            caption = f"📊 Штрихкод {i} для товара из заказа {posting_number}\n📦 {product_name}\n🏷️ SKU: {sku}\n📊 Штрихкод: {barcode}\n📦 Количество: {quantity}"
+                            outgoing.append((
+                                self._send_barcode_doc,
+                                (("generate_barcode_image", *job), chat_id, barcode_img),
+                                {"caption": caption}
+                            ))
+                            barcodes_sent += 1
+                        else:
+                            # Если не удалось сгенерировать изображение, отправляем текстом
+                            text = f"📊 <b>Штрихкод {i} товара из заказа {posting_number}</b>\n\n"
+                            text += f"📦 <b>Название:</b> {product_name}\n"
+                            text += f"🏷️ <b>SKU:</b> {sku}\n"
+                            text += f"📊 <b>Штрихкод:</b> {barcode}\n"
+                            text += f"📦 <b>Количество:</b> {quantity}\n"
+                            
+                            outgoing.append((self._send, (chat_id, text), {"parse_mode": "HTML"}))
+                            barcodes_sent += 1
+                else:
+                    # Если нет штрихкодов
+                    text = f"📊 <b>Товар без штрихкода</b>\n\n"
+                    text += f"📦 <b>Название:</b> {product_name}\n"
+                    text += f"🏷️ <b>SKU:</b> {sku}\n"
+                    text += f"📦 <b>Количество:</b> {quantity}\n"
+                    text += f"❌ <b>Штрихкоды не найдены</b>\n"
+                    
+                    outgoing.append((self._send, (chat_id, text), {"parse_mode": "HTML"}))
             
             if barcodes_sent > 0:
-                self.bot.send_message(chat_id, f"✅ Отправлено {barcodes_sent} штрихкодов для заказа {posting_number}!", reply_markup=keyboard)
+                summary = f"✅ Отправлено {barcodes_sent} штрихкодов для заказа {posting_number}!"
+            else:
+                summary = f"❌ Штрихкоды не найдены для заказа {posting_number}"
+            
+            # Итог и возврат в меню дописываем к последнему сообщению вместо отдельного
+            keyboard = _order_back_kb(posting_number)
+            if outgoing:
+                send, args, kwargs = outgoing[-1]
+                if "caption" in kwargs:
+                    kwargs["caption"] = f"{kwargs['caption']}\n\n{summary}"
+                else:
+                    args = (args[0], f"{args[1]}\n{summary}")
+                kwargs["reply_markup"] = keyboard
+                outgoing[-1] = (send, args, kwargs)
             else:
-                self.bot.send_message(chat_id, f"❌ Штрихкоды не найдены для заказа {posting_number}", reply_markup=keyboard)
+                outgoing.append((self._send, (chat_id, summary), {"reply_markup": keyboard}))
+            
+            for send, args, kwargs in outgoing:
+                send(*args, **kwargs)
             
         except Exception as e:
             logger.error(f"Ошибка при получении штрихкодов заказа: {e}")
             text = f"❌ Ошибка при получении штрихкодов заказа: {e}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, text, reply_markup=keyboard)
     
     def get_combined_barcode_label(self, chat_id: int, posting_number: str):
@@ -2144,33 +2737,47 @@ class OzonBot:
         self.bot.send_message(chat_id, f"⏳ Создаю комбинированный файл для заказа {posting_number}...")
         
         try:
-            # Получаем детали заказа
-            result = self.ozon_api.get_order_details(posting_number)
-            
-            if "error" in result:
-                error_text = f"❌ Ошибка при получении деталей заказа: {result['error']}"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-                self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
-                return
-            
-            order = result.get("result", {})
+            # Заказ и карточки его товаров могли быть получены недавно (например, для штрихкодов заказа)
+            state = self._order_state.get(posting_number)
+            if state is not None:
+                order, products_by_sku = state
+            else:
+                # Получаем детали заказа
+                result = self.ozon_api.get_order_details(posting_number)
+                
+                if "error" in result:
+                    error_text = f"❌ Ошибка при получении деталей заказа: {result['error']}"
+                    keyboard = self._back_to_main_kb
+                    self.bot.send_message(chat_id, error_text, reply_markup=keyboard)
+                    return
+                
+                order = result.get("result", {})
             products = order.get("products", [])
             
             if not products:
                 text = f"❌ Товары не найдены для заказа {posting_number}"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard)
                 return
             
+            # Этикетка и информация о товарах не зависят друг от друга - этикетку запрашиваем параллельно
+            label_future = _executor.submit(self.ozon_api.get_package_label, [posting_number])
+            
+            sku_list = list(dict.fromkeys(str(product['sku']) for product in products if product.get('sku')))
+            if state is None and sku_list:
+                detailed_result = self.ozon_api.get_product_info_list(sku=sku_list)
+                if "error" in detailed_result:
+                    raise requests.exceptions.RequestException(detailed_result["error"])
+                
+                products_by_sku = {str(p['sku']): p for p in detailed_result.get("items", []) if p.get('sku')}
+                self._order_state.set(posting_number, (order, products_by_sku))
+            
             # Получаем умную этикетку заказа
-            label_result = self.ozon_api.get_package_label([posting_number])
+            label_result = label_future.result()
             
             if "error" in label_result or "file_content" not in label_result:
                 text = f"❌ Не удалось получить этикетку для заказа {posting_number}"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard)
                 return
             
@@ -2180,35 +2787,21 @@ class OzonBot:
                 product_name = products[0].get('name', 'Товар')
             
             # Генерируем умную этикетку
-            smart_label = self.generate_smart_label(label_result["file_content"], product_name, posting_number, products)
+            smart_label = self._render_label(label_result["file_content"], product_name, posting_number, products)
             
             if not smart_label:
                 text = f"❌ Не удалось сгенерировать умную этикетку для заказа {posting_number}"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard)
                 return
             
-            # Получаем штрихкоды товаров
-            sku_list = [str(product.get('sku', '')) for product in products if product.get('sku')]
-            
+            # Проверяем штрихкоды товаров
             if not sku_list:
                 text = f"❌ SKU товаров не найдены для заказа {posting_number}"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard)
                 return
             
-            # Получаем детальную информацию о товарах
-            url = f"{self.ozon_api.base_url}/v3/product/info/list"
-            payload = {"sku": sku_list}
-            response = requests.post(url, headers=self.ozon_api.headers, json=payload)
-            response.raise_for_status()
-            detailed_result = response.json()
-            detailed_products = detailed_result.get("items", [])
-            
-            products_by_sku = {str(p.get('sku', '')): p for p in detailed_products}
-            
             # Создаем комбинированное изображение
             combined_image = self.create_combined_barcode_label_image(
                 posting_number, 
@@ -2224,37 +2817,35 @@ class OzonBot:
                 caption = f"📊📦 Комбинированный файл для заказа {posting_number}\n"
                 caption += f"📦 Содержит: штрихкоды товаров + этикетка заказа"
                 
-                self.bot.send_document(
+                self._send_doc(
                     chat_id=chat_id,
                     document=combined_image,
-                    caption=caption
+                    caption=caption,
+                    disable_notification=True
                 )
                 
                 # Возвращаемся в меню
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 К заказу", callback_data=f"order_{posting_number}"))
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = _order_back_kb(posting_number)
                 
-                self.bot.send_message(chat_id, "✅ Комбинированный файл отправлен!", reply_markup=keyboard)
+                self._send(chat_id, "✅ Комбинированный файл отправлен!", reply_markup=keyboard)
             else:
                 text = f"❌ Не удалось создать комбинированный файл для заказа {posting_number}"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard)
             
         except Exception as e:
             logger.error(f"Ошибка при создании комбинированного файла: {e}")
             text = f"❌ Ошибка при создании комбинированного файла: {e}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, text, reply_markup=keyboard)
     
     def create_combined_barcode_label_image(self, posting_number: str, products: list, products_by_sku: dict, smart_label_bytesio):
         """Создать комбинированное изображение штрихкодов + умной этикетки"""
+        if Image is None:
+            logger.error("Библиотека PIL не установлена")
+            return None
+        
         try:
-            from PIL import Image, ImageDraw, ImageFont
-            from io import BytesIO
-            
             # Конвертируем умную этикетку из BytesIO в PIL Image
             smart_label_bytesio.seek(0)
             smart_label_img = Image.open(smart_label_bytesio)
@@ -2262,32 +2853,31 @@ class OzonBot:
             # Получаем размеры умной этикетки
             label_width, label_height = smart_label_img.size
             
-            # Создаем штрихкоды для товаров
-            barcode_images = []
+            # Берем первый штрихкод каждого товара
+            jobs = []
             product_names = []
             
             for product in products:
                 sku = str(product.get('sku', ''))
-                product_name = product.get('name', 'N/A')
-                quantity = product.get('quantity', 1)
+                detailed_product = products_by_sku.get(sku)
+                if detailed_product is None:
+                    continue
                 
-                if sku in products_by_sku:
-                    detailed_product = products_by_sku[sku]
-                    barcodes = detailed_product.get('barcodes', [])
-                    
-                    if barcodes:
-                        # Берем первый штрихкод
-                        barcode = barcodes[0]
-                        
-                        # Генерируем изображение штрихкода для комбинированного изображения
-                        barcode_img = self.generate_barcode_image_for_combined(barcode, product_name, sku)
-                        
-                        if barcode_img:
-                            # Конвертируем BytesIO в PIL Image
-                            barcode_img.seek(0)
-                            barcode_pil = Image.open(barcode_img)
-                            barcode_images.append(barcode_pil)
-                            product_names.append(f"{product_name} x{quantity}")
+                barcodes = detailed_product.get('barcodes', [])
+                if barcodes:
+                    product_name = product.get('name', 'N/A')
+                    jobs.append((barcodes[0], product_name, sku))
+                    product_names.append(f"{product_name} x{product.get('quantity', 1)}")
+            
+            # Генерируем изображения штрихкодов параллельно и конвертируем BytesIO в PIL Image
+            barcode_images = []
+            rendered_names = []
+            for barcode_img, name in zip(self._render_barcodes("generate_barcode_image_for_combined", jobs), product_names):
+                if barcode_img:
+                    barcode_img.seek(0)
+                    barcode_images.append(Image.open(barcode_img))
+                    rendered_names.append(name)
+            product_names = rendered_names
             
             if not barcode_images:
                 logger.error("Не удалось создать штрихкоды")
@@ -2305,8 +2895,9 @@ class OzonBot:
             total_width = label_width  # Используем точную ширину этикетки без лишних отступов
             total_height = label_height + total_barcode_height + 20  # Минимальные отступы сверху и снизу
             
-            # Создаем итоговое изображение
-            combined_img = Image.new('RGB', (total_width, total_height), 'white')
+            # Создаем итоговое изображение: этикетка и штрихкоды черно-белые,
+            # 8-битные оттенки серого втрое меньше RGB и быстрее кодируются
+            combined_img = Image.new('L', (total_width, total_height), 255)
             
             # Размещаем умную этикетку сверху по центру
             label_x = 0  # Этикетка занимает всю ширину
@@ -2320,20 +2911,26 @@ class OzonBot:
                 barcode_x = (total_width - barcode_img.width) // 2
                 combined_img.paste(barcode_img, (barcode_x, current_y))
                 current_y += barcode_img.height + padding
+                barcode_img.close()
+            smart_label_img.close()
+            
+            # Включаем умную обрезку для удаления лишнего пространства
+            combined_img = self.smart_crop_image(combined_img)
             
-            # Конвертируем в bytes с максимальным качеством
+            # Конвертируем в bytes: PNG кодируется один раз, уже после обрезки (уровень сжатия 3 - быстрый zlib)
             img_bytes = BytesIO()
-            combined_img.save(img_bytes, format='PNG', quality=100, optimize=False)  # Максимальное качество
+            combined_img.save(img_bytes, format='PNG', compress_level=3, optimize=False)
+            
+            # Слишком большой файл долго загружается в Telegram - уменьшаем по большей стороне
+            if img_bytes.getbuffer().nbytes > Config.COMBINED_IMAGE_MAX_BYTES:
+                max_side = Config.COMBINED_IMAGE_MAX_SIDE
+                combined_img.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+                img_bytes = BytesIO()
+                combined_img.save(img_bytes, format='PNG', compress_level=3, optimize=False)
             img_bytes.seek(0)
             
-            # Включаем умную обрезку для удаления лишнего пространства
-            img_bytes = self.smart_crop_image(img_bytes)
-            
             return img_bytes
             
-        except ImportError:
-            logger.error("Библиотека PIL не установлена")
-            return None
         except Exception as e:
             logger.error(f"Ошибка при создании комбинированного изображения: {e}")
             return None
@@ -2342,21 +2939,15 @@ class OzonBot:
         """Показать меню для изменения остатка товара"""
         self.bot.send_message(chat_id, f"⏳ Загружаю информацию о товаре {product_id}...")
         
-        # Получаем информацию о товаре
-        url = f"{self.ozon_api.base_url}/v3/product/info/list"
-        payload = {
-            "product_id": [int(product_id)]
-        }
-        
         try:
-            response = requests.post(url, headers=self.ozon_api.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
+            # Получаем информацию о товаре
+            result = self.ozon_api.get_product_info_list(product_id=[int(product_id)])
+            if "error" in result:
+                raise requests.exceptions.RequestException(result["error"])
             
             if not result.get("items"):
                 text = f"❌ Товар {product_id} не найден"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard)
                 return
             
@@ -2364,16 +2955,13 @@ class OzonBot:
             product_name = product.get('name', 'N/A')
             offer_id = product.get('offer_id', '')
             sku = str(product.get('sku', ''))
+            if offer_id:
+                # Для update_product_stock: остаток обновляется по offer_id без повторного запроса карточки
+                self._offer_ids.set(str(product_id), offer_id)
             
-            # Получаем текущие остатки FBS
-            fbs_stocks = self.ozon_api.get_fbs_stocks([sku])
-            current_stock = 0
-            
-            if not fbs_stocks.get("error") and fbs_stocks.get("result"):
-                for stock_info in fbs_stocks["result"]:
-                    if str(stock_info.get('sku', '')) == sku:
-                        current_stock = stock_info.get('present', 0)
-                        break
+            # Получаем текущий остаток FBS
+            stock_info = self.ozon_api.get_fbs_stock(sku)
+            current_stock = 0 if "error" in stock_info else stock_info.get('present', 0)
             
             # Получаем эмодзи для товара
             type_emoji = self.get_product_type_emoji(product_name)
@@ -2387,18 +2975,13 @@ class OzonBot:
             
             keyboard = types.InlineKeyboardMarkup()
             
-            # Кнопки с популярными значениями остатков
-            stock_values = [0, 1, 5, 10, 20, 50, 100]
-            for i in range(0, len(stock_values), 2):
-                row_buttons = []
-                for j in range(2):
-                    if i + j < len(stock_values):
-                        value = stock_values[i + j]
-                        row_buttons.append(types.InlineKeyboardButton(
-                            f"{value}", 
-                            callback_data=f"update_stock_{product_id}_{value}"
-                        ))
-                keyboard.row(*row_buttons)
+            # Кнопки с популярными значениями остатков, по две в ряд
+            stock_buttons = [
+                types.InlineKeyboardButton(f"{value}", callback_data=f"update_stock_{product_id}_{value}")
+                for value in _STOCK_PRESETS
+            ]
+            for i in range(0, len(stock_buttons), 2):
+                keyboard.row(*stock_buttons[i:i + 2])
             
             # Кнопка для ввода произвольного значения
             keyboard.row(types.InlineKeyboardButton("✏️ Ввести вручную", callback_data=f"manual_stock_{product_id}"))
@@ -2409,41 +2992,37 @@ class OzonBot:
         except Exception as e:
             logger.error(f"Ошибка при получении информации о товаре: {e}")
             text = f"❌ Ошибка при получении информации о товаре: {e}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, text, reply_markup=keyboard)
     
     def update_product_stock(self, chat_id: int, product_id: str, new_stock: int):
         """Обновить остаток товара"""
-        self.bot.send_message(chat_id, f"⏳ Обновляю остаток товара {product_id} до {new_stock}...")
-        
-        # Получаем информацию о товаре
-        url = f"{self.ozon_api.base_url}/v3/product/info/list"
-        payload = {
-            "product_id": [int(product_id)]
-        }
-        
-        try:
-            response = requests.post(url, headers=self.ozon_api.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
-            
-            if not result.get("items"):
-                text = f"❌ Товар {product_id} не найден"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-                self.bot.send_message(chat_id, text, reply_markup=keyboard)
-                return
-            
-            product = result["items"][0]
-            offer_id = product.get('offer_id', '')
-            
-            if not offer_id:
-                text = f"❌ Не найден Offer ID для товара {product_id}"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
-                self.bot.send_message(chat_id, text, reply_markup=keyboard)
-                return
+        self.bot.send_message(chat_id, f"⏳ Обновляю остаток товара {product_id} до {new_stock}...")
+        
+        try:
+            # Offer ID обычно уже известен из меню изменения остатка
+            offer_id = self._offer_ids.get(str(product_id))
+            if offer_id is None:
+                # Получаем информацию о товаре
+                result = self.ozon_api.get_product_info_list(product_id=[int(product_id)])
+                if "error" in result:
+                    raise requests.exceptions.RequestException(result["error"])
+                
+                if not result.get("items"):
+                    text = f"❌ Товар {product_id} не найден"
+                    keyboard = self._back_to_main_kb
+                    self.bot.send_message(chat_id, text, reply_markup=keyboard)
+                    return
+                
+                product = result["items"][0]
+                offer_id = product.get('offer_id', '')
+                
+                if not offer_id:
+                    text = f"❌ Не найден Offer ID для товара {product_id}"
+                    keyboard = self._back_to_main_kb
+                    self.bot.send_message(chat_id, text, reply_markup=keyboard)
+                    return
+                self._offer_ids.set(str(product_id), offer_id)
             
             # Обновляем остаток через API
             # Используем стандартный warehouse_id для FBS (обычно это 1020003080073000)
@@ -2453,8 +3032,7 @@ class OzonBot:
             
             if "error" in update_result:
                 text = f"❌ Ошибка при обновлении остатка: {update_result['error']}"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard)
                 return
             
@@ -2463,6 +3041,7 @@ class OzonBot:
             if result_items and len(result_items) > 0:
                 item = result_items[0]
                 if item.get("updated", False):
+                    self.ozon_api.invalidate_product_info(product_id)
                     text = f"✅ <b>Остаток успешно обновлен!</b>\n\n"
                     text += f"📦 Товар: {product_id}\n"
                     text += f"📋 Offer ID: {offer_id}\n"
@@ -2482,24 +3061,18 @@ class OzonBot:
         except Exception as e:
             logger.error(f"Ошибка при обновлении остатка: {e}")
             text = f"❌ Ошибка при обновлении остатка: {e}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, text, reply_markup=keyboard)
     
     def show_product_from_order(self, chat_id: int, sku: str, posting_number: str):
         """Показать детали товара из заказа"""
         self.bot.send_message(chat_id, f"⏳ Загружаю детали товара {sku}...")
         
-        # Получаем информацию о товаре по SKU
-        url = f"{self.ozon_api.base_url}/v3/product/info/list"
-        payload = {
-            "sku": [sku]
-        }
-        
         try:
-            response = requests.post(url, headers=self.ozon_api.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
+            # Получаем информацию о товаре по SKU
+            result = self.ozon_api.get_product_info_list(sku=[sku])
+            if "error" in result:
+                raise requests.exceptions.RequestException(result["error"])
             
             if not result.get("items"):
                 text = f"📦 <b>Товар {sku}</b>\n\n❌ Товар не найден"
@@ -2534,45 +3107,18 @@ class OzonBot:
     
     def generate_barcode_image_for_combined(self, barcode: str, product_name: str, sku: str):
         """Генерировать ОГРОМНЫЙ штрихкод для комбинированного изображения с увеличенным текстом"""
+        if Image is None or Code128 is None:
+            logger.error("Библиотеки PIL и python-barcode не установлены")
+            return None
+        
         try:
-            from PIL import Image, ImageDraw, ImageFont
-            from barcode import Code128
-            from barcode.writer import ImageWriter
-            from io import BytesIO
-            
-            # Создаем штрихкод Code128 с автоподгонкой под ширину 1202 пикселя
-            code = Code128(barcode, writer=ImageWriter())
-            
             # СТРОГО ОГРАНИЧИВАЕМ ШИРИНУ ДО 1202 ПИКСЕЛЕЙ!
-            MAX_WIDTH = 1202
-            
-            # Настройки для качественного штрихкода с хорошей контрастностью
-            options = {
-                'module_width': 1.0,  # Увеличенный размер модуля для лучшей читаемости
-                'module_height': 50.0,  # Увеличенная высота штрихкода
-                'quiet_zone': 4.0,  # Нормальные тихие зоны для контрастности
-                'font_size': 0,  # Убираем встроенный текст, будем добавлять свой
-                'text_distance': 0,  # Убираем расстояние до текста
-                'background': 'white',
-                'foreground': 'black',
-                'write_text': False,  # Не показываем встроенный текст
-            }
-            
-            # Генерируем изображение штрихкода с настройками
-            barcode_img = code.render(writer_options=options)
+            MAX_WIDTH = _COMBINED_BARCODE_MAX_WIDTH
             
-            # Получаем размеры штрихкода
+            # Полоса штрихов зависит только от значения штрихкода - берём готовую из кеша
+            barcode_img = _combined_barcode_strip(barcode)
             width, height = barcode_img.size
             
-            # Если штрихкод все еще слишком широкий, масштабируем его с сохранением качества
-            if width > MAX_WIDTH:
-                scale_factor = MAX_WIDTH / width
-                new_width = MAX_WIDTH
-                new_height = int(height * scale_factor)
-                # Используем высококачественное масштабирование для сохранения контрастности
-                barcode_img = barcode_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                width, height = new_width, new_height
-            
             # Создаем изображение для комбинированного файла - используем максимальную ширину
             text_height = 300  # Уменьшенная высота для текста
             padding_horizontal = 0  # НЕ увеличиваем ширину - используем оригинальную
@@ -2580,8 +3126,8 @@ class OzonBot:
             img_width = MAX_WIDTH  # Используем максимальную ширину для лучшего качества
             img_height = height + text_height + padding_vertical * 2
             
-            # Создаем изображение с высоким разрешением
-            img = Image.new('RGB', (img_width, img_height), 'white')
+            # Создаем изображение с высоким разрешением (оттенки серого: содержимое черно-белое)
+            img = Image.new('L', (img_width, img_height), 255)
             
             # Вставляем штрихкод по центру изображения для равномерного распределения
             barcode_x = (img_width - width) // 2  # Центрируем штрихкод
@@ -2590,129 +3136,6 @@ class OzonBot:
             # Добавляем текст с улучшенным форматированием
             draw = ImageDraw.Draw(img)
             
-            def draw_text_with_smart_fit(draw, text, x, y, max_width, max_height, font_family="arial", color='black'):
-                """ИСПРАВЛЕННАЯ функция - БОЛЬШОЙ текст и БЕЗ отступов с контролем переполнения"""
-                
-                # Пробуем БОЛЬШИЕ размеры шрифта
-                font_sizes = [35, 30, 25, 20, 18, 16, 14, 12, 10]
-                
-                for font_size in font_sizes:
-                    try:
-                        # Создаем шрифт
-                        font = ImageFont.truetype(font_family, font_size)
-                    except:
-                        try:
-                            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", font_size)
-                        except:
-                            font = ImageFont.load_default()
-                    
-                    # Разбиваем текст на строки с контролем переполнения
-                    words = text.split()
-                    lines = []
-                    current_line = ""
-                    
-                    for word in words:
-                        test_line = current_line + (" " if current_line else "") + word
-                        test_width = draw.textlength(test_line, font=font)
-                        
-                        # СТРОГО контролируем ширину - не даем тексту выходить за границы!
-                        if test_width <= max_width - 20:  # Оставляем запас 20 пикселей для безопасности
-                            current_line = test_line
-                        else:
-                            if current_line:
-                                lines.append(current_line)
-                                current_line = word
-                            else:
-                                # Если даже одно слово не помещается, обрезаем его
-                                if draw.textlength(word, font=font) > max_width - 20:
-                                    # Обрезаем слово до максимальной ширины
-                                    truncated_word = word
-                                    while draw.textlength(truncated_word + "...", font=font) > max_width - 20 and len(truncated_word) > 3:
-                                        truncated_word = truncated_word[:-1]
-                                    lines.append(truncated_word + "...")
-                                    current_line = ""
-                                else:
-                                    current_line = word
-                    
-                    if current_line:
-                        lines.append(current_line)
-                    
-                    # Проверяем, помещается ли текст по высоте
-                    line_height = font_size  # БЕЗ отступов между строками!
-                    total_height = len(lines) * line_height
-                    
-                    # Если помещается - рисуем СРАЗУ
-                    if total_height <= max_height and len(lines) <= 3:  # До 3 строк
-                        for i, line in enumerate(lines):
-                            line_width = draw.textlength(line, font=font)
-                            # Центрируем БЕЗ отступов
-                            line_x = x + (max_width - line_width) // 2
-                            line_y = y + i * font_size  # БЕЗ отступов!
-                            draw.text((line_x, line_y), line, fill=color, font=font)
-                        return True
-                
-                # Если ничего не подошло - рисуем БОЛЬШИМ шрифтом
-                try:
-                    font = ImageFont.truetype(font_family, 16)
-                except:
-                    try:
-                        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 16)
-                    except:
-                        font = ImageFont.load_default()
-                
-                words = text.split()
-                lines = []
-                current_line = ""
-                
-                for word in words:
-                    test_line = current_line + (" " if current_line else "") + word
-                    test_width = draw.textlength(test_line, font=font)
-                    
-                    if test_width <= max_width:
-                        current_line = test_line
-                    else:
-                        if current_line:
-                            lines.append(current_line)
-                            current_line = word
-                        else:
-                            lines.append(word)
-                
-                if current_line:
-                    lines.append(current_line)
-                
-                # Рисуем с БОЛЬШИМ шрифтом БЕЗ отступов
-                for i, line in enumerate(lines[:2]):  # Максимум 2 строки
-                    line_width = draw.textlength(line, font=font)
-                    line_x = x + (max_width - line_width) // 2
-                    line_y = y + i * 16  # БЕЗ отступов!
-                    draw.text((line_x, line_y), line, fill=color, font=font)
-                
-                return True
-            
-            def wrap_text_to_fit(text, font, max_width, padding=5):
-                """Разбивает текст на строки, чтобы он поместился в заданную ширину"""
-                words = text.split()
-                lines = []
-                current_line = ""
-                
-                for word in words:
-                    test_line = current_line + (" " if current_line else "") + word
-                    test_width = draw.textlength(test_line, font=font)
-                    
-                    if test_width <= max_width - padding:
-                        current_line = test_line
-                    else:
-                        if current_line:
-                            lines.append(current_line)
-                            current_line = word
-                        else:
-                            lines.append(word)
-                
-                if current_line:
-                    lines.append(current_line)
-                
-                return lines
-            
             # Подготавливаем тексты без эмодзи
             barcode_text = f"Штрихкод: {barcode}"
             sku_text = f"SKU: {sku}"
@@ -2723,7 +3146,7 @@ class OzonBot:
             text_height = 250  # Меньше места, но БОЛЬШЕ текст
             
             # Рисуем штрихкод с БОЛЬШИМ текстом
-            draw_text_with_smart_fit(
+            _draw_combined_barcode_text(
                 draw, barcode_text, 
                 0, text_start_y, 
                 width, text_height // 3,
@@ -2731,7 +3154,7 @@ class OzonBot:
             )
             
             # Рисуем SKU с БОЛЬШИМ текстом
-            draw_text_with_smart_fit(
+            _draw_combined_barcode_text(
                 draw, sku_text, 
                 0, text_start_y + text_height // 3, 
                 width, text_height // 3,
@@ -2739,7 +3162,7 @@ class OzonBot:
             )
             
             # Рисуем название товара с БОЛЬШИМ текстом
-            draw_text_with_smart_fit(
+            _draw_combined_barcode_text(
                 draw, product_text, 
                 0, text_start_y + 2 * text_height // 3, 
                 width, text_height // 3,
@@ -2750,14 +3173,11 @@ class OzonBot:
             
             # Конвертируем в bytes с максимальным качеством для термопринтера
             img_bytes = BytesIO()
-            img.save(img_bytes, format='PNG', quality=100, optimize=False)  # Максимальное качество без оптимизации
+            img.save(img_bytes, format='PNG', compress_level=Config.BARCODE_PNG_COMPRESS_LEVEL, optimize=False)  # Без потерь, быстрое сжатие
             img_bytes.seek(0)
             
             return img_bytes
             
-        except ImportError:
-            logger.error("Библиотеки PIL и python-barcode не установлены")
-            return None
         except Exception as e:
             logger.error(f"Ошибка при генерации изображения штрихкода: {e}")
             return None
@@ -2768,8 +3188,7 @@ class OzonBot:
             return 'Товар'
         
         # Убираем эмодзи и специальные символы
-        import re
-        clean_name = re.sub(r'[^\w\s]', '', product_name)
+        clean_name = _CLEAN_NAME_RE.sub('', product_name)
         
         # Разбиваем на слова
         words = clean_name.split()
@@ -2797,121 +3216,17 @@ class OzonBot:
     
     def shorten_product_name_for_barcode(self, product_name: str, max_length: int = 20) -> str:
         """Сократить название товара для штрихкода с сохранением цвета"""
-        if not product_name or product_name == 'N/A':
-            return 'Товар'
-        
-        # Убираем эмодзи, но сохраняем все остальное включая цвета
-        import re
-        clean_name = re.sub(r'[^\w\s\-]', '', product_name)
-        
-        # Если название короткое, возвращаем как есть
-        if len(clean_name) <= max_length:
-            return clean_name
-        
-        # Разбиваем на слова
-        words = clean_name.split()
-        
-        if not words:
-            return clean_name[:max_length]
-        
-        # Сначала пытаемся найти цвет в названии
-        color_words = ['красный', 'синий', 'голубой', 'зеленый', 'желтый', 'оранжевый', 
-                      'фиолетовый', 'розовый', 'фуксия', 'коричневый', 'черный', 'белый', 
-                      'серый', 'золотой', 'серебряный', 'радужный', 'разноцветный']
-        
-        color_found = None
-        for word in words:
-            if word.lower() in color_words:
-                color_found = word
-                break
-        
-        # Если цвет найден, стараемся его сохранить
-        if color_found:
-            # Убираем цвет из списка слов
-            words_without_color = [w for w in words if w.lower() != color_found.lower()]
-            
-            # Берем слова по порядку, пока не достигнем максимальной длины минус цвет
-            result = ""
-            color_length = len(color_found) + 1  # +1 для пробела
-            
-            for word in words_without_color:
-                test_result = result + (" " if result else "") + word
-                if len(test_result) + color_length <= max_length:
-                    result = test_result
-                else:
-                    break
-            
-            # Добавляем цвет в конец
-            if result:
-                return f"{result} {color_found}"
-            else:
-                return color_found
-        
-        # Если цвет не найден, используем старую логику с улучшенными сокращениями
-        result = ""
-        for word in words:
-            test_result = result + (" " if result else "") + word
-            if len(test_result) <= max_length:
-                result = test_result
-            else:
-                break
-        
-        # Если ничего не получилось, создаем сокращения с точками
-        if not result:
-            # Создаем сокращения слов с точками
-            shortened_words = []
-            current_length = 0
-            
-            for word in words:
-                if len(word) > 4:  # Сокращаем только длинные слова
-                    # Берем первые 3-4 символа + точка
-                    short_word = word[:3] + "."
-                    if current_length + len(short_word) + 1 <= max_length:
-                        shortened_words.append(short_word)
-                        current_length += len(short_word) + 1
-                    else:
-                        break
-                else:
-                    # Короткие слова оставляем как есть
-                    if current_length + len(word) + 1 <= max_length:
-                        shortened_words.append(word)
-                        current_length += len(word) + 1
-                    else:
-                        break
-            
-            result = " ".join(shortened_words)
-        
-        # Если все еще ничего не получилось, берем первые символы
-        if not result:
-            result = clean_name[:max_length]
-        
-        return result
+        return _shorten_name_for_barcode(product_name, max_length)
     
     def generate_barcode_image(self, barcode: str, product_name: str, sku: str, quantity: int = 1, posting_number: str = ""):
         """Генерировать улучшенное изображение штрихкода с высоким качеством для универсального сканирования"""
+        if Image is None or Code128 is None:
+            logger.error("Библиотеки PIL и python-barcode не установлены")
+            return None
+        
         try:
-            from PIL import Image, ImageDraw, ImageFont
-            from barcode import Code128
-            from barcode.writer import ImageWriter
-            from io import BytesIO
-            
-            # Создаем штрихкод Code128 с улучшенными параметрами
-            code = Code128(barcode, writer=ImageWriter())
-            
-            # Настройки для комбинированного изображения - большой штрихкод как на этикетке
-            options = {
-                'module_width': 0.8,  # Значительно увеличиваем для размера как на этикетке
-                'module_height': 40.0,  # Увеличиваем высоту в 2 раза
-                'quiet_zone': 6.0,  # Большие тихие зоны
-                'font_size': 0,  # Убираем встроенный текст, будем добавлять свой
-                'text_distance': 0,  # Убираем расстояние до текста
-                'background': 'white',
-                'foreground': 'black',
-                'write_text': False,  # Не показываем встроенный текст
-            }
-            
-            # Генерируем изображение штрихкода с настройками
-            barcode_img = code.render(writer_options=options)
+            # Создаем штрихкод Code128 с улучшенными параметрами (одинаковые штрихкоды берутся из кеша)
+            barcode_img = _render_code128(barcode, _BARCODE_OPTIONS)
             
             # Получаем размеры штрихкода
             width, height = barcode_img.size
@@ -2923,152 +3238,15 @@ class OzonBot:
             img_width = width  # Сохраняем оригинальную ширину штрихкода
             img_height = height + text_height + padding_vertical * 2
             
-            # Создаем изображение с высоким разрешением
-            img = Image.new('RGB', (img_width, img_height), 'white')
+            # Создаем изображение с высоким разрешением (холст переиспользуется: ниже он только сохраняется в PNG)
+            img = _blank_canvas(img_width, img_height)
             
             # Вставляем штрихкод без горизонтальных отступов (используем всю ширину)
             img.paste(barcode_img, (0, padding_vertical))
 
             # Добавляем текст с улучшенным форматированием
             draw = ImageDraw.Draw(img)
-            
-            # ОЧЕНЬ маленькие шрифты для строгого соблюдения границ штрихкода
-            try:
-                # Используем четкие шрифты очень маленького размера
-                font_large = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 12)
-                font_medium = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 10)
-                font_small = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 8)
-            except:
-                try:
-                    font_large = ImageFont.truetype("arial.ttf", 12)
-                    font_medium = ImageFont.truetype("arial.ttf", 10)
-                    font_small = ImageFont.truetype("arial.ttf", 8)
-                except:
-                    try:
-                        font_large = ImageFont.truetype("LiberationSans-Bold.ttf", 12)
-                        font_medium = ImageFont.truetype("LiberationSans-Regular.ttf", 10)
-                        font_small = ImageFont.truetype("LiberationSans-Regular.ttf", 8)
-                    except:
-                        # Используем стандартные шрифты
-                        font_large = ImageFont.load_default()
-                        font_medium = ImageFont.load_default()
-                        font_small = ImageFont.load_default()
-
-            # Умная адаптация текста под размеры изображения
-            def wrap_text_to_fit(text, font, max_width, padding=5):
-                """Разбивает текст на строки, чтобы он поместился в заданную ширину"""
-                words = text.split()
-                lines = []
-                current_line = ""
-                
-                for word in words:
-                    test_line = current_line + (" " if current_line else "") + word
-                    test_width = draw.textlength(test_line, font=font)
-                    
-                    if test_width <= max_width - padding:
-                        current_line = test_line
-                    else:
-                        if current_line:
-                            lines.append(current_line)
-                            current_line = word
-                        else:
-                            lines.append(word)
-                
-                if current_line:
-                    lines.append(current_line)
-                
-                return lines
-            
-            def draw_text_with_smart_fit(draw, text, x, y, max_width, max_height, font_family="arial", color='black'):
-                """ИСПРАВЛЕННАЯ функция - БОЛЬШОЙ текст и БЕЗ отступов"""
-                
-                # Пробуем БОЛЬШИЕ размеры шрифта
-                font_sizes = [40, 35, 30, 25, 20, 18, 16, 14, 12, 10]
-                
-                for font_size in font_sizes:
-                    try:
-                        # Создаем шрифт
-                        font = ImageFont.truetype(font_family, font_size)
-                    except:
-                        try:
-                            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", font_size)
-                        except:
-                            font = ImageFont.load_default()
-                    
-                    # Разбиваем текст на строки БЕЗ отступов
-                    words = text.split()
-                    lines = []
-                    current_line = ""
-                    
-                    for word in words:
-                        test_line = current_line + (" " if current_line else "") + word
-                        test_width = draw.textlength(test_line, font=font)
-                        
-                        # Используем ВСЮ ширину - БЕЗ отступов!
-                        if test_width <= max_width:
-                            current_line = test_line
-                        else:
-                            if current_line:
-                                lines.append(current_line)
-                                current_line = word
-                            else:
-                                lines.append(word)
-                    
-                    if current_line:
-                        lines.append(current_line)
-                    
-                    # Проверяем, помещается ли текст по высоте
-                    line_height = font_size  # БЕЗ отступов между строками!
-                    total_height = len(lines) * line_height
-                    
-                    # Если помещается - рисуем СРАЗУ
-                    if total_height <= max_height and len(lines) <= 3:  # До 3 строк
-                        for i, line in enumerate(lines):
-                            line_width = draw.textlength(line, font=font)
-                            # Центрируем БЕЗ отступов
-                            line_x = x + (max_width - line_width) // 2
-                            line_y = y + i * font_size  # БЕЗ отступов!
-                            draw.text((line_x, line_y), line, fill=color, font=font)
-                        return True
-                
-                # Если ничего не подошло - рисуем БОЛЬШИМ шрифтом
-                try:
-                    font = ImageFont.truetype(font_family, 18)
-                except:
-                    try:
-                        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 18)
-                    except:
-                        font = ImageFont.load_default()
-                
-                words = text.split()
-                lines = []
-                current_line = ""
-                
-                for word in words:
-                    test_line = current_line + (" " if current_line else "") + word
-                    test_width = draw.textlength(test_line, font=font)
-                    
-                    if test_width <= max_width:
-                        current_line = test_line
-                    else:
-                        if current_line:
-                            lines.append(current_line)
-                            current_line = word
-                        else:
-                            lines.append(word)
-                
-                if current_line:
-                    lines.append(current_line)
-                
-                # Рисуем с БОЛЬШИМ шрифтом БЕЗ отступов
-                for i, line in enumerate(lines[:2]):  # Максимум 2 строки
-                    line_width = draw.textlength(line, font=font)
-                    line_x = x + (max_width - line_width) // 2
-                    line_y = y + i * 18  # БЕЗ отступов!
-                    draw.text((line_x, line_y), line, fill=color, font=font)
-                
-                return True
-            
+
             # Подготавливаем тексты без эмодзи
             barcode_text = f"Штрихкод: {barcode}"
             sku_text = f"SKU: {sku}"
@@ -3081,7 +3259,7 @@ class OzonBot:
             text_height = 150  # Еще меньше места для текста
             
             # Рисуем штрихкод с БОЛЬШИМ текстом
-            draw_text_with_smart_fit(
+            _draw_barcode_text(
                 draw, barcode_text, 
                 0, text_start_y, 
                 img_width, text_height // 3,
@@ -3089,7 +3267,7 @@ class OzonBot:
             )
             
             # Рисуем SKU с БОЛЬШИМ текстом
-            draw_text_with_smart_fit(
+            _draw_barcode_text(
                 draw, sku_text, 
                 0, text_start_y + text_height // 3, 
                 img_width, text_height // 3,
@@ -3097,7 +3275,7 @@ class OzonBot:
             )
             
             # Рисуем название товара с БОЛЬШИМ текстом
-            draw_text_with_smart_fit(
+            _draw_barcode_text(
                 draw, product_text, 
                 0, text_start_y + 2 * text_height // 3, 
                 img_width, text_height // 3,
@@ -3108,47 +3286,85 @@ class OzonBot:
             
             # Конвертируем в bytes с максимальным качеством для термопринтера
             img_bytes = BytesIO()
-            img.save(img_bytes, format='PNG', quality=100, optimize=False)  # Максимальное качество без оптимизации
+            img.save(img_bytes, format='PNG', compress_level=Config.BARCODE_PNG_COMPRESS_LEVEL, optimize=False)  # Без потерь, быстрое сжатие
             img_bytes.seek(0)
             
             return img_bytes
             
-        except ImportError:
-            logger.error("Библиотеки PIL и python-barcode не установлены")
-            return None
         except Exception as e:
             logger.error(f"Ошибка при генерации изображения штрихкода: {e}")
             return None
     
+    def _render_label(self, pdf_content: bytes, product_name: str, posting_number: str, products_info: list = None):
+        """Умная этикетка из пула процессов; при сбое пула рендерим в текущем потоке"""
+        pool = _get_render_pool()
+        if pool is not None:
+            try:
+                png = pool.submit(
+                    _render_smart_label, pdf_content, product_name, posting_number, products_info
+                ).result(timeout=Config.LABEL_RENDER_TIMEOUT)
+                return BytesIO(png) if png else None
+            except Exception as e:
+                logger.error(f"Ошибка рендера этикетки в пуле процессов: {e}")
+        return self.generate_smart_label(pdf_content, product_name, posting_number, products_info)
+    
+    def _render_barcodes(self, method: str, jobs: list) -> list:
+        """
+        Сгенерировать штрихкоды (BytesIO или None на каждый набор аргументов)
+        Готовые PNG берутся из кеша, остальные рендерятся параллельно в пуле процессов
+        """
+        keys = [(method, *job) for job in jobs]
+        pngs = {key: self._barcode_png_cache.get(key) for key in keys}
+        missing = [key for key, png in pngs.items() if png is None]
+        
+        pool = _get_render_pool()
+        rendered = None
+        if pool is not None and len(missing) > 1:
+            try:
+                futures = [pool.submit(_render_barcode, *key) for key in missing]
+                rendered = [future.result(timeout=Config.LABEL_RENDER_TIMEOUT) for future in futures]
+            except Exception as e:
+                logger.error(f"Ошибка генерации штрихкодов в пуле процессов: {e}")
+        if rendered is None:
+            render = getattr(self, method)
+            rendered = [
+                barcode_img.getvalue() if barcode_img else None
+                for barcode_img in (render(*key[1:]) for key in missing)
+            ]
+        
+        for key, png in zip(missing, rendered):
+            pngs[key] = png
+            if png:
+                self._barcode_png_cache.set(key, png)
+        # Новый BytesIO на каждый штрихкод: вызывающий код задаёт ему name и позицию чтения
+        return [BytesIO(pngs[key]) if pngs[key] else None for key in keys]
+    
     def generate_smart_label(self, pdf_content: bytes, product_name: str, posting_number: str, products_info: list = None):
         """Умная генерация этикетки: конвертация PDF в PNG, поворот против часовой стрелки, добавление названия товара"""
+        if Image is None:
+            logger.error("Библиотека PIL не установлена")
+            return None
+        
         try:
-            from PIL import Image, ImageDraw, ImageFont
-            from io import BytesIO
-            
-            # Открываем PDF из bytes
-            pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
-            
-            if pdf_document.page_count == 0:
-                logger.error("PDF не содержит страниц")
-                return None
-            
-            # Получаем первую страницу
-            page = pdf_document[0]
-            
-            # Конвертируем PDF этикетки в изображение с высоким разрешением
-            mat = fitz.Matrix(4.0, 4.0)  # Умеренное увеличение разрешения
-            pix = page.get_pixmap(matrix=mat)
-            
-            # Конвертируем в PIL Image
-            img_data = pix.tobytes("png")
-            pdf_img = Image.open(BytesIO(img_data))
-            
-            # Закрываем PDF документ
-            pdf_document.close()
+            # Открываем PDF из bytes (документ закрывается при любом выходе из блока)
+            with fitz.open(stream=pdf_content, filetype="pdf") as pdf_document:
+                if pdf_document.page_count == 0:
+                    logger.error("PDF не содержит страниц")
+                    return None
+                
+                # Получаем первую страницу
+                page = pdf_document[0]
+                
+                # Конвертируем PDF этикетки в изображение с высоким разрешением
+                mat = fitz.Matrix(4.0, 4.0)  # Умеренное увеличение разрешения
+                # Этикетка черно-белая: рисуем сразу в оттенках серого без альфа-канала (байт на пиксель)
+                pix = page.get_pixmap(matrix=mat, colorspace=fitz.csGRAY, alpha=False)
+                
+                # Конвертируем в PIL Image напрямую из пикселей, без промежуточного PNG
+                pdf_img = Image.frombytes('L', (pix.width, pix.height), pix.samples, 'raw', 'L', pix.stride)
             
-            # Поворачиваем против часовой стрелки (на 90 градусов)
-            rotated_img = pdf_img.rotate(90, expand=True)
+            # Поворачиваем против часовой стрелки (на 90 градусов): transpose переставляет пиксели без интерполяции
+            rotated_img = pdf_img.transpose(Image.Transpose.ROTATE_90)
             
             # Получаем размеры повернутого изображения
             pdf_width, pdf_height = rotated_img.size
@@ -3162,8 +3378,8 @@ class OzonBot:
             text_height = 200  # Уменьшенное место для текста
             total_height = pdf_height + text_height
             
-            # Создаем итоговое изображение
-            final_img = Image.new('RGB', (pdf_width, total_height), 'white')
+            # Создаем итоговое изображение (оттенки серого: этикетка черно-белая)
+            final_img = Image.new('L', (pdf_width, total_height), 255)
             
             # Вставляем повернутое изображение PDF
             final_img.paste(rotated_img, (0, 0))
@@ -3171,162 +3387,6 @@ class OzonBot:
             # Добавляем текст с названием товара
             draw = ImageDraw.Draw(final_img)
             
-            # ОЧЕНЬ маленькие шрифты для строгого соблюдения границ PDF
-            try:
-                # Используем четкие шрифты очень маленького размера
-                font_large = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 16)
-                font_medium = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 14)
-                font_small = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 12)
-            except:
-                try:
-                    # Альтернативные шрифты
-                    font_large = ImageFont.truetype("arial.ttf", 16)
-                    font_medium = ImageFont.truetype("arial.ttf", 14)
-                    font_small = ImageFont.truetype("arial.ttf", 12)
-                except:
-                    try:
-                        # Еще один вариант
-                        font_large = ImageFont.truetype("LiberationSans-Bold.ttf", 16)
-                        font_medium = ImageFont.truetype("LiberationSans-Regular.ttf", 14)
-                        font_small = ImageFont.truetype("LiberationSans-Regular.ttf", 12)
-                    except:
-                        # Используем стандартные шрифты с большим размером
-                        font_large = ImageFont.load_default()
-                        font_medium = ImageFont.load_default()
-                        font_small = ImageFont.load_default()
-            
-            def draw_text_with_smart_fit(draw, text, x, y, max_width, max_height, font_family="arial", color='black'):
-                """ИСПРАВЛЕННАЯ функция - БОЛЬШОЙ текст и БЕЗ отступов с контролем переполнения"""
-                
-                # Пробуем БОЛЬШИЕ размеры шрифта
-                font_sizes = [50, 45, 40, 35, 30, 25, 20, 18, 16, 14, 12]
-                
-                for font_size in font_sizes:
-                    try:
-                        # Создаем шрифт
-                        font = ImageFont.truetype(font_family, font_size)
-                    except:
-                        try:
-                            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", font_size)
-                        except:
-                            font = ImageFont.load_default()
-                    
-                    # Разбиваем текст на строки с контролем переполнения
-                    words = text.split()
-                    lines = []
-                    current_line = ""
-                    
-                    for word in words:
-                        test_line = current_line + (" " if current_line else "") + word
-                        test_width = draw.textlength(test_line, font=font)
-                        
-                        # СТРОГО контролируем ширину - не даем тексту выходить за границы!
-                        if test_width <= max_width - 20:  # Оставляем запас 20 пикселей для безопасности
-                            current_line = test_line
-                        else:
-                            if current_line:
-                                lines.append(current_line)
-                                current_line = word
-                            else:
-                                # Если даже одно слово не помещается, обрезаем его
-                                if draw.textlength(word, font=font) > max_width - 20:
-                                    # Обрезаем слово до максимальной ширины
-                                    truncated_word = word
-                                    while draw.textlength(truncated_word + "...", font=font) > max_width - 20 and len(truncated_word) > 3:
-                                        truncated_word = truncated_word[:-1]
-                                    lines.append(truncated_word + "...")
-                                    current_line = ""
-                                else:
-                                    current_line = word
-                    
-                    if current_line:
-                        lines.append(current_line)
-                    
-                    # Проверяем, помещается ли текст по высоте
-                    line_height = font_size  # БЕЗ отступов между строками!
-                    total_height = len(lines) * line_height
-                    
-                    # Если помещается - рисуем СРАЗУ
-                    if total_height <= max_height and len(lines) <= 4:  # До 4 строк
-                        for i, line in enumerate(lines):
-                            line_width = draw.textlength(line, font=font)
-                            # Центрируем БЕЗ отступов
-                            line_x = x + (max_width - line_width) // 2
-                            line_y = y + i * font_size  # БЕЗ отступов!
-                            draw.text((line_x, line_y), line, fill=color, font=font)
-                        return True
-                
-                # Если ничего не подошло - рисуем БОЛЬШИМ шрифтом
-                try:
-                    font = ImageFont.truetype(font_family, 20)
-                except:
-                    try:
-                        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 20)
-                    except:
-                        font = ImageFont.load_default()
-                
-                words = text.split()
-                lines = []
-                current_line = ""
-                
-                for word in words:
-                    test_line = current_line + (" " if current_line else "") + word
-                    test_width = draw.textlength(test_line, font=font)
-                    
-                    # СТРОГО контролируем ширину - не даем тексту выходить за границы!
-                    if test_width <= max_width - 10:  # Оставляем небольшой запас
-                        current_line = test_line
-                    else:
-                        if current_line:
-                            lines.append(current_line)
-                            current_line = word
-                        else:
-                            # Если даже одно слово не помещается, обрезаем его
-                            if draw.textlength(word, font=font) > max_width - 10:
-                                # Обрезаем слово до максимальной ширины
-                                truncated_word = word
-                                while draw.textlength(truncated_word + "...", font=font) > max_width - 10 and len(truncated_word) > 3:
-                                    truncated_word = truncated_word[:-1]
-                                lines.append(truncated_word + "...")
-                            else:
-                                lines.append(word)
-                
-                if current_line:
-                    lines.append(current_line)
-                
-                # Рисуем с БОЛЬШИМ шрифтом БЕЗ отступов
-                for i, line in enumerate(lines[:3]):  # Максимум 3 строки
-                    line_width = draw.textlength(line, font=font)
-                    line_x = x + (max_width - line_width) // 2
-                    line_y = y + i * 20  # БЕЗ отступов!
-                    draw.text((line_x, line_y), line, fill=color, font=font)
-                
-                return True
-            
-            def wrap_text_to_fit(text, font, max_width, padding=5):
-                """Разбивает текст на строки, чтобы он поместился в заданную ширину"""
-                words = text.split()
-                lines = []
-                current_line = ""
-                
-                for word in words:
-                    test_line = current_line + (" " if current_line else "") + word
-                    test_width = draw.textlength(test_line, font=font)
-                    
-                    if test_width <= max_width - padding:
-                        current_line = test_line
-                    else:
-                        if current_line:
-                            lines.append(current_line)
-                            current_line = word
-                        else:
-                            lines.append(word)
-                
-                if current_line:
-                    lines.append(current_line)
-                
-                return lines
-            
             # Подготавливаем текст без эмодзи
             if products_info and len(products_info) > 0:
                 # Создаем информацию о товарах
@@ -3335,39 +3395,15 @@ class OzonBot:
                 if len(products_info) == 1:
                     # Один товар - показываем с цветом словами
                     product = products_info[0]
-                    full_name = product.get('name', 'Товар')
-                    color = self.extract_color_from_product({}, full_name)
-                    
-                    # Создаем короткое название с цветом словами
-                    if color != 'N/A' and color.lower() in full_name.lower():
-                        # Если цвет найден в названии, создаем короткое название
-                        short_name = self.shorten_product_name_for_barcode(full_name.replace(color.lower(), ''), 25).strip()
-                        if short_name:
-                            display_name = f"{short_name} {color}"
-                        else:
-                            display_name = color
-                    else:
-                        display_name = self.shorten_product_name_for_barcode(full_name, 30)
+                    display_name = _label_display_name(product.get('name', 'Товар'), 25, 30)
                     
                     product_text = f"Заказ {total_items} товар: {display_name}"
                 elif len(products_info) <= 3:
                     # Несколько товаров - показываем все с цветами словами
                     product_names = []
                     for p in products_info:
-                        # Извлекаем цвет из названия товара
-                        full_name = p.get('name', 'Товар')
-                        color = self.extract_color_from_product({}, full_name)
-                        
-                        # Создаем короткое название с цветом словами
-                        if color != 'N/A' and color.lower() in full_name.lower():
-                            # Если цвет найден в названии, создаем короткое название
-                            short_name = self.shorten_product_name_for_barcode(full_name.replace(color.lower(), ''), 6).strip()
-                            if short_name:
-                                display_name = f"{short_name} {color}"
-                            else:
-                                display_name = color
-                        else:
-                            display_name = self.shorten_product_name_for_barcode(full_name, 8)
+                        # Короткое название с цветом словами
+                        display_name = _label_display_name(p.get('name', 'Товар'), 6, 8)
                         
                         quantity = p.get('quantity', 1)
                         product_names.append(f"{display_name} x{quantity}")
@@ -3378,19 +3414,8 @@ class OzonBot:
                     # Много товаров - показываем первые 2 с цветами словами и общее количество
                     product_names = []
                     for p in products_info[:2]:
-                        # Извлекаем цвет из названия товара
-                        full_name = p.get('name', 'Товар')
-                        color = self.extract_color_from_product({}, full_name)
-                        
-                        # Создаем короткое название с цветом словами
-                        if color != 'N/A' and color.lower() in full_name.lower():
-                            short_name = self.shorten_product_name_for_barcode(full_name.replace(color.lower(), ''), 6).strip()
-                            if short_name:
-                                display_name = f"{short_name} {color}"
-                            else:
-                                display_name = color
-                        else:
-                            display_name = self.shorten_product_name_for_barcode(full_name, 8)
+                        # Короткое название с цветом словами
+                        display_name = _label_display_name(p.get('name', 'Товар'), 6, 8)
                         
                         quantity = p.get('quantity', 1)
                         product_names.append(f"{display_name} x{quantity}")
@@ -3400,20 +3425,7 @@ class OzonBot:
                     product_text = f"Заказ {total_items} товаров: {products_str} +{remaining}"
             else:
                 # Fallback к старому формату с цветом
-                # Извлекаем цвет из названия товара
-                color = self.extract_color_from_product({}, product_name)
-                
-                # Создаем короткое название с цветом словами
-                if color != 'N/A' and color.lower() in product_name.lower():
-                    # Если цвет найден в названии, создаем короткое название
-                    short_name = self.shorten_product_name_for_barcode(product_name.replace(color.lower(), ''), 10).strip()
-                    if short_name:
-                        product_text = f"Заказ: {short_name} {color}"
-                    else:
-                        product_text = f"Заказ: {color}"
-                else:
-                    short_name = self.shorten_product_name_for_barcode(product_name, 15)
-                    product_text = f"Заказ: {short_name}"
+                product_text = f"Заказ: {_label_display_name(product_name, 10, 15)}"
             
             order_text = f"Заказ: {posting_number}"
             
@@ -3422,7 +3434,7 @@ class OzonBot:
             text_height = 400  # Достаточно места для текста
             
             # Рисуем название товара с УМНОЙ автоподгонкой
-            draw_text_with_smart_fit(
+            _draw_label_text(
                 draw, product_text, 
                 0, text_start_y, 
                 pdf_width, text_height // 2,
@@ -3430,120 +3442,71 @@ class OzonBot:
             )
             
             # Рисуем номер заказа с УМНОЙ автоподгонкой
-            draw_text_with_smart_fit(
+            _draw_label_text(
                 draw, order_text, 
                 0, text_start_y + text_height // 2, 
                 pdf_width, text_height // 2,
                 font_family="arial"
             )
             
-            # Конвертируем в bytes
+            # Включаем умную обрезку для удаления лишнего пространства
+            final_img = self.smart_crop_image(final_img)
+            
+            # Конвертируем в bytes: PNG кодируется один раз, уже после обрезки
             img_bytes = BytesIO()
-            final_img.save(img_bytes, format='PNG')
+            final_img.save(img_bytes, format='PNG', compress_level=Config.LABEL_PNG_COMPRESS_LEVEL, optimize=False)
             img_bytes.seek(0)
             
-            # Включаем умную обрезку для удаления лишнего пространства
-            img_bytes = self.smart_crop_image(img_bytes)
-            
             return img_bytes
             
-        except ImportError:
-            logger.error("Библиотеки PIL или PyMuPDF не установлены")
-            return None
         except Exception as e:
             logger.error(f"Ошибка при генерации умной этикетки: {e}")
             return None
 
-    def smart_crop_image(self, img_bytes):
-        """Умная обрезка изображения - убираем пустое пространство справа и слева"""
+    def smart_crop_image(self, img):
+        """
+        Умная обрезка изображения - убираем пустое пространство справа и слева
+        Принимает и возвращает PIL Image: в PNG изображение кодирует вызывающий, один раз
+        """
         try:
-            from PIL import Image
-            from io import BytesIO
-            
-            # Открываем изображение
-            img_bytes.seek(0)
-            img = Image.open(img_bytes)
-            
             # Получаем размеры
             width, height = img.size
             
-            # Находим левую границу содержимого
-            left_boundary = 0
-            for x in range(width):
-                has_content = False
-                for y in range(0, height, max(1, height // 20)):
-                    pixel = img.getpixel((x, y))
-                    if isinstance(pixel, tuple) and len(pixel) >= 3:
-                        r, g, b = pixel[:3]
-                        if r < 250 or g < 250 or b < 250:
-                            has_content = True
-                            break
-                    elif isinstance(pixel, int) and pixel < 250:
-                        has_content = True
-                        break
-                
-                if has_content:
-                    left_boundary = max(0, x - 10)  # Добавляем небольшой отступ
-                    break
+            # Содержимое - пиксели темнее 250: маска считается в C одной таблицей по оттенкам серого
+            gray = img if img.mode == 'L' else img.convert('L')
+            # Рамка ненулевых пикселей маски - границы содержимого (None, если изображение пустое)
+            bbox = gray.point(_CONTENT_MASK_LUT).getbbox()
             
-            # Находим правую границу содержимого
+            # Находим левую и правую границы содержимого (с небольшим отступом)
+            left_boundary = 0
             right_boundary = width
-            for x in range(width - 1, -1, -1):
-                has_content = False
-                for y in range(0, height, max(1, height // 20)):
-                    pixel = img.getpixel((x, y))
-                    if isinstance(pixel, tuple) and len(pixel) >= 3:
-                        r, g, b = pixel[:3]
-                        if r < 250 or g < 250 or b < 250:
-                            has_content = True
-                            break
-                    elif isinstance(pixel, int) and pixel < 250:
-                        has_content = True
-                        break
-                
-                if has_content:
-                    right_boundary = min(width, x + 10)  # Добавляем небольшой отступ
-                    break
+            if bbox is not None:
+                left_boundary = max(0, bbox[0] - 10)
+                right_boundary = min(width, bbox[2] - 1 + 10)
             
             # Обрезаем изображение только если есть что обрезать
             if left_boundary > 0 or right_boundary < width - 10:
-                cropped_img = img.crop((left_boundary, 0, right_boundary, height))
-                
-                # Сохраняем обрезанное изображение
-                new_img_bytes = BytesIO()
-                cropped_img.save(new_img_bytes, format='PNG', quality=100, optimize=False)
-                new_img_bytes.seek(0)
-                return new_img_bytes
-            else:
-                # Если нечего обрезать, возвращаем оригинал
-                img_bytes.seek(0)
-                return img_bytes
+                return img.crop((left_boundary, 0, right_boundary, height))
+            return img
             
         except Exception as e:
             logger.error(f"Ошибка при умной обрезке изображения: {e}")
             # В случае ошибки возвращаем оригинал
-            img_bytes.seek(0)
-            return img_bytes
+            return img
     
     def get_real_product_barcode(self, chat_id: int, sku: str):
         """Получить настоящий штрихкод товара через API"""
         self.bot.send_message(chat_id, f"⏳ Получаю штрихкод для товара {sku}...")
 
-        # Сначала получаем информацию о товаре по SKU
-        url = f"{self.ozon_api.base_url}/v3/product/info/list"
-        payload = {
-            "sku": [sku]
-        }
-
         try:
-            response = requests.post(url, headers=self.ozon_api.headers, json=payload)
-            response.raise_for_status()
-            result = response.json()
+            # Сначала получаем информацию о товаре по SKU (общая сессия OzonAPI и кеш карточек)
+            result = self.ozon_api.get_product_info_list(sku=[sku])
+            if "error" in result:
+                raise requests.exceptions.RequestException(result["error"])
 
             if not result.get("items"):
                 text = f"📊 <b>Штрихкод товара {sku}</b>\n\n❌ Товар не найден"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
                 return
 
@@ -3554,25 +3517,22 @@ class OzonBot:
 
             if not barcodes:
                 text = f"📊 <b>Штрихкод товара {sku}</b>\n\n❌ Штрихкоды не найдены"
-                keyboard = types.InlineKeyboardMarkup()
-                keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+                keyboard = self._back_to_main_kb
                 self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
                 return
 
             # Генерируем изображения для каждого штрихкода
-            for i, barcode in enumerate(barcodes, 1):
-                barcode_img = self.generate_barcode_image(barcode, product_name, sku, 1, "")
-                
+            barcode_images = self._render_barcodes(
+                "generate_barcode_image", [(barcode, product_name, sku, 1, "") for barcode in barcodes]
+            )
+            documents = []
+            for i, (barcode, barcode_img) in enumerate(zip(barcodes, barcode_images), 1):
                 if barcode_img:
-                    # Отправляем изображение штрихкода
+                    # Изображения штрихкодов отправляются вместе, медиагруппой
                     barcode_img.name = f"barcode_{sku}_{i}.png"
                     
                     caption = f"📊 Штрихкод {i} для товара {sku}\n📦 {product_name}\n🏷️ {barcode}"
-                    self.bot.send_document(
-                        chat_id=chat_id,
-                        document=barcode_img,
-                        caption=caption
-                    )
+                    documents.append((barcode_img, caption))
                 else:
                     # Если не удалось сгенерировать изображение, отправляем текстом
                     text = f"📊 <b>Штрихкод {i} товара {sku}</b>\n\n"
@@ -3581,17 +3541,18 @@ class OzonBot:
                     text += f"📊 <b>Штрихкод:</b> {barcode}\n"
                     
                     self.bot.send_message(chat_id, text, parse_mode="HTML")
+            
+            if documents:
+                self._send_document_group(chat_id, documents)
 
             # Возвращаемся в меню
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, "✅ Штрихкоды отправлены!", reply_markup=keyboard)
 
         except Exception as e:
             logger.error(f"Ошибка при получении штрихкода: {e}")
             text = f"❌ Ошибка при получении штрихкода: {e}"
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+            keyboard = self._back_to_main_kb
             self.bot.send_message(chat_id, text, reply_markup=keyboard)
     
     def show_notifications_menu(self, chat_id: int):
@@ -3614,9 +3575,11 @@ class OzonBot:
     
     def show_stats(self, chat_id: int):
         """Показать статистику"""
-        # Получаем статистику по заказам
-        packaging_result = self.ozon_api.get_orders_for_packaging(limit=1000)
-        delivery_result = self.ozon_api.get_orders_awaiting_deliver(limit=1000)
+        # Получаем статистику по заказам (оба запроса независимы - выполняем параллельно)
+        packaging_future = _executor.submit(self.ozon_api.get_orders_for_packaging, limit=1000)
+        delivery_future = _executor.submit(self.ozon_api.get_orders_awaiting_deliver, limit=1000)
+        packaging_result = packaging_future.result()
+        delivery_result = delivery_future.result()
         
         packaging_count = 0
         delivery_count = 0
@@ -3633,8 +3596,7 @@ class OzonBot:
         text += f"🔔 Обработано уведомлений: <b>{self.order_monitor.get_processed_orders_count()}</b>\n\n"
         text += f"📅 Обновлено: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
         
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.row(types.InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu"))
+        keyboard = self._back_to_main_kb
         
         self.bot.send_message(chat_id, text, reply_markup=keyboard, parse_mode="HTML")
     
@@ -3671,15 +3633,19 @@ class OzonBot:
     
     def show_monitoring_status(self, chat_id: int):
         """Показать статус мониторинга"""
-        status = "🟢 Активен" if self.order_monitor.is_running else "🔴 Остановлен"
-        processed_count = self.order_monitor.get_processed_orders_count()
+        monitor = self.order_monitor
+        status = "🟢 Активен" if monitor.is_running else "🔴 Остановлен"
+        processed_count = monitor.get_processed_orders_count()
+        last_check = monitor.last_check_at.strftime('%H:%M:%S') if monitor.last_check_at else "—"
+        next_check = monitor.next_check_at.strftime('%H:%M:%S') if monitor.next_check_at else "—"
         
         text = (
             f"📊 <b>Статус мониторинга</b>\n\n"
             f"Состояние: {status}\n"
             f"Обработано заказов: {processed_count}\n"
-            f"Интервал проверки: 5 минут\n"
-            f"Последняя проверка: {datetime.now().strftime('%H:%M:%S')}"
+            f"Интервал проверки: {monitor.check_interval // 60} мин.\n"
+            f"Последняя проверка: {last_check}\n"
+            f"Следующая проверка: {next_check}"
         )
         
         keyboard = types.InlineKeyboardMarkup()
@@ -3702,7 +3668,82 @@ class OzonBot:
         self.order_monitor.start_monitoring()
         
         # Запускаем бота
-        self.bot.polling(none_stop=True)
+        if Config.WEBHOOK_URL:
+            self.run_webhook()
+        else:
+            # Длинный опрос: соединение ждёт обновления до TG_LONG_POLL_TIMEOUT секунд вместо частых коротких запросов
+            self.bot.infinity_polling(
+                skip_pending=True,
+                timeout=Config.TG_POLL_TIMEOUT,
+                long_polling_timeout=Config.TG_LONG_POLL_TIMEOUT,
+                allowed_updates=_ALLOWED_UPDATES,
+            )
+    
+    def run_webhook(self):
+        """
+        Приём обновлений через вебхук вместо long polling
+        Встроенный HTTP-сервер рассчитан на работу за reverse proxy с TLS
+        """
+        bot = self.bot
+        secret = Config.WEBHOOK_SECRET
+        webhook_path = urlparse(Config.WEBHOOK_URL).path or "/"
+        
+        class WebhookHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != webhook_path or (
+                        secret and self.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret):
+                    self.send_response(403)
+                    self.end_headers()
+                    return
+                
+                length = int(self.headers.get("Content-Length", 0))
+                update = types.Update.de_json(self.rfile.read(length).decode("utf-8"))
+                # Обработчики выполняются в пуле потоков telebot, ответ Telegram отдаём сразу
+                bot.process_new_updates([update])
+                self.send_response(200)
+                self.end_headers()
+            
+            def log_message(self, format, *args):
+                logger.debug("Webhook: " + format, *args)
+        
+        bot.remove_webhook()
+        bot.set_webhook(url=Config.WEBHOOK_URL, secret_token=secret or None, allowed_updates=_ALLOWED_UPDATES)
+        
+        server = ThreadingHTTPServer((Config.WEBHOOK_LISTEN, int(Config.WEBHOOK_PORT)), WebhookHandler)
+        logger.info("Вебхук слушает %s:%s%s", Config.WEBHOOK_LISTEN, Config.WEBHOOK_PORT, webhook_path)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+# Экземпляр для рендера внутри процесса пула (создаётся один раз на процесс)
+_label_renderer: Optional[OzonBot] = None
+
+# Методы генерации штрихкодов, которые можно вызывать в процессе пула
+_BARCODE_RENDERERS = frozenset(("generate_barcode_image", "generate_barcode_image_for_combined"))
+
+def _get_label_renderer() -> OzonBot:
+    """
+    Экземпляр бота для рендера в процессе пула (связанные методы не сериализуются)
+    Методы рендера не обращаются к API и Telegram, поэтому __init__ бота не вызывается
+    """
+    global _label_renderer
+    if _label_renderer is None:
+        _label_renderer = OzonBot.__new__(OzonBot)
+    return _label_renderer
+
+def _render_smart_label(pdf_content: bytes, product_name: str, posting_number: str,
+                        products_info: list = None) -> Optional[bytes]:
+    """Рендер умной этикетки в процессе пула"""
+    smart_label = _get_label_renderer().generate_smart_label(pdf_content, product_name, posting_number, products_info)
+    return smart_label.getvalue() if smart_label else None
+
+def _render_barcode(method: str, *args) -> Optional[bytes]:
+    """Рендер PNG штрихкода в процессе пула указанным методом генерации"""
+    if method not in _BARCODE_RENDERERS:
+        raise ValueError(f"Неизвестный метод генерации штрихкода: {method}")
+    barcode_img = getattr(_get_label_renderer(), method)(*args)
+    return barcode_img.getvalue() if barcode_img else None
 
 def main():
     """Главная функция"""